@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import codecs
+import collections
+import json
+import multiprocessing
+import os
+import os.path
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import timeit
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shallow_appify import fastcopy, icon  # noqa: E402
+from shallow_appify import shallow_appify  # noqa: E402
+from shallow_appify._version import __version__  # noqa: E402
+from shallow_appify.plugins.util import binary_replace, prefix_scan  # noqa: E402
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+RESULTS_FORMAT_VERSION = 1
+OLD_PREFIX = '/Users/builder/Projects/MyApp/dist/MyApp.app'
+NEW_PREFIX = '/Applications/MyApp.app'
+MACHO_HEADER = struct.pack('<I', 0xfeedfacf)
+SCALES = ('small', 'medium', 'large')
+
+# Each benchmark generates its workload with `setup(work_dir_path, **params)` and measures `run(workload)`. Setup
+# is called for every repetition since most benchmarks modify their workload.
+Benchmark = collections.namedtuple('Benchmark', ('setup', 'run', 'params'))
+# `bytes` and `files` are the amount of data processed by one run and used to compute the throughput
+Workload = collections.namedtuple('Workload', ('args', 'bytes', 'files'))
+
+
+def create_random_data(rng, size):
+    return bytearray(rng.getrandbits(8) for _ in range(min(size, 4096))) * (size // 4096 + 1)
+
+
+def create_source_tree(root_path, rng, file_count, depth, file_size):
+    # Distributes `file_count` files over a directory tree with `depth` levels and four subdirectories per level
+    dir_paths = [root_path]
+    level_dir_paths = [root_path]
+    for level in range(depth):
+        level_dir_paths = [
+            os.path.join(dir_path, 'package_{level}_{i}'.format(level=level, i=i))
+            for dir_path in level_dir_paths for i in range(4)
+        ]
+        dir_paths.extend(level_dir_paths)
+    for dir_path in dir_paths:
+        os.makedirs(dir_path)
+    line = 'value = compute(value, {0!r})  # synthetic source line\n'.format(OLD_PREFIX)
+    content = (line * (file_size // len(line) + 1))[:file_size]
+    for i in range(file_count):
+        with codecs.open(os.path.join(rng.choice(dir_paths), 'module_{i}.py'.format(i=i)), 'w', 'utf-8') as f:
+            f.write(content)
+    return file_count * file_size, file_count
+
+
+def create_binary_blob(file_path, rng, size, prefix_distance):
+    # Embeds NUL-terminated paths below the old prefix every `prefix_distance` bytes like in a linked library
+    data = create_random_data(rng, size)[:size]
+    data[:4] = MACHO_HEADER
+    embedded_path = '{prefix}/lib/libpython.dylib\0'.format(prefix=OLD_PREFIX).encode('ascii')
+    for offset in range(4096, size - len(embedded_path), prefix_distance):
+        data[offset:offset + len(embedded_path)] = embedded_path
+    with open(file_path, 'wb') as f:
+        f.write(data)
+    return size
+
+
+def create_conda_env(env_path, rng, text_file_count, binary_file_count, binary_file_size):
+    # A fake environment with prefixed shebangs and configuration files, prefixed libraries and unrelated modules
+    total_size = 0
+    for dir_name in ('bin', 'lib', 'lib/python3/site-packages', 'etc'):
+        os.makedirs(os.path.join(env_path, dir_name))
+    for i in range(text_file_count):
+        if i % 4 == 0:
+            file_path = os.path.join(env_path, 'bin', 'script_{i}'.format(i=i))
+            content = '#!{prefix}/Contents/Resources/conda_env/bin/python\nimport sys\nsys.exit(main())\n'.format(
+                prefix=OLD_PREFIX
+            )
+        elif i % 4 == 1:
+            file_path = os.path.join(env_path, 'etc', 'config_{i}.cfg'.format(i=i))
+            content = 'prefix = {prefix}\n'.format(prefix=OLD_PREFIX) + 'option = value\n' * 64
+        else:
+            file_path = os.path.join(env_path, 'lib/python3/site-packages', 'module_{i}.py'.format(i=i))
+            content = 'def function_{i}(value):\n    return value * {i}\n'.format(i=i) * 32
+        with codecs.open(file_path, 'w', 'utf-8') as f:
+            f.write(content)
+        total_size += len(content)
+    for i in range(binary_file_count):
+        total_size += create_binary_blob(
+            os.path.join(env_path, 'lib', 'lib{i}.dylib'.format(i=i)), rng, binary_file_size, 256 * 1024
+        )
+    return total_size, text_file_count + binary_file_count
+
+
+def create_icon_master(file_path, rng, size):
+    # Gradients with some noise compress like typical artwork instead of like uniform or random images
+    channels = [
+        Image.linear_gradient('L').resize((size, size)),
+        Image.linear_gradient('L').rotate(90).resize((size, size)),
+        Image.effect_noise((size, size), 48),
+        Image.radial_gradient('L').resize((size, size))
+    ]
+    Image.merge('RGBA', channels).save(file_path)
+    return os.path.getsize(file_path)
+
+
+def setup_binary_replace(work_dir_path, rng, size):
+    blob_path = os.path.join(work_dir_path, 'blob.dylib')
+    create_binary_blob(blob_path, rng, size, 1024 * 1024)
+    return Workload((blob_path, ), size, 1)
+
+
+def run_binary_replace(blob_path):
+    binary_replace.binary_replace(blob_path, OLD_PREFIX, NEW_PREFIX)
+
+
+def setup_prefix_scan(work_dir_path, rng, text_file_count, binary_file_count, binary_file_size):
+    env_path = os.path.join(work_dir_path, 'conda_env')
+    total_size, file_count = create_conda_env(env_path, rng, text_file_count, binary_file_count, binary_file_size)
+    return Workload((env_path, ), total_size, file_count)
+
+
+def run_prefix_scan(env_path):
+    prefix_scan.replace_prefix(env_path, OLD_PREFIX, NEW_PREFIX)
+
+
+def setup_copy_source(work_dir_path, rng, file_count, depth, file_size):
+    source_path = os.path.join(work_dir_path, 'source')
+    total_size, file_count = create_source_tree(source_path, rng, file_count, depth, file_size)
+    return Workload((source_path, os.path.join(work_dir_path, 'MacOS')), total_size, file_count)
+
+
+def run_copy_source(source_path, target_path):
+    fastcopy.copy_tree(source_path, target_path)
+
+
+def setup_create_icon_set(work_dir_path, rng, size):
+    icon_path = os.path.join(work_dir_path, 'icon.png')
+    return Workload((icon_path, ), create_icon_master(icon_path, rng, size), 1)
+
+
+def run_create_icon_set(icon_path):
+    icon.create_icns(icon_path, use_cache=False)
+
+
+def setup_info_plist(work_dir_path, rng, render_count):
+    executable_path = os.path.join(work_dir_path, 'source', 'main.py')
+    arguments = (
+        'MyApp', '1.2.3', 'de.example', executable_path, os.path.dirname(executable_path), 'Icon.icns', False, None
+    )
+    content_size = len(shallow_appify.serialize_info_plist(shallow_appify.create_info_plist(*arguments)))
+    return Workload((arguments, render_count), content_size * render_count, render_count)
+
+
+def run_info_plist(arguments, render_count):
+    for _ in range(render_count):
+        shallow_appify.serialize_info_plist(shallow_appify.create_info_plist(*arguments))
+
+
+MiB = 1024 * 1024
+BENCHMARKS = collections.OrderedDict(
+    (
+        (
+            'binary_replace',
+            Benchmark(
+                setup_binary_replace, run_binary_replace, {
+                    'small': {
+                        'size': 16 * MiB
+                    },
+                    'medium': {
+                        'size': 128 * MiB
+                    },
+                    'large': {
+                        'size': 512 * MiB
+                    }
+                }
+            )
+        ),
+        (
+            'prefix_scan',
+            Benchmark(
+                setup_prefix_scan, run_prefix_scan, {
+                    'small': {
+                        'text_file_count': 500,
+                        'binary_file_count': 10,
+                        'binary_file_size': 1 * MiB
+                    },
+                    'medium': {
+                        'text_file_count': 5000,
+                        'binary_file_count': 50,
+                        'binary_file_size': 2 * MiB
+                    },
+                    'large': {
+                        'text_file_count': 20000,
+                        'binary_file_count': 200,
+                        'binary_file_size': 4 * MiB
+                    }
+                }
+            )
+        ),
+        (
+            'copy_source',
+            Benchmark(
+                setup_copy_source, run_copy_source, {
+                    'small': {
+                        'file_count': 200,
+                        'depth': 2,
+                        'file_size': 4096
+                    },
+                    'medium': {
+                        'file_count': 2000,
+                        'depth': 4,
+                        'file_size': 16384
+                    },
+                    'large': {
+                        'file_count': 20000,
+                        'depth': 6,
+                        'file_size': 16384
+                    }
+                }
+            )
+        ),
+        (
+            'create_icon_set',
+            Benchmark(
+                setup_create_icon_set, run_create_icon_set, {
+                    'small': {
+                        'size': 1024
+                    },
+                    'medium': {
+                        'size': 2048
+                    },
+                    'large': {
+                        'size': 4096
+                    }
+                }
+            )
+        ),
+        (
+            'info_plist',
+            Benchmark(
+                setup_info_plist, run_info_plist, {
+                    'small': {
+                        'render_count': 100
+                    },
+                    'medium': {
+                        'render_count': 1000
+                    },
+                    'large': {
+                        'render_count': 10000
+                    }
+                }
+            )
+        ),
+    )
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='''
+    Runs the shallow-appify benchmarks on synthetic workloads and reports the
+    throughput of every hot path. Results can be stored as JSON and compared
+    with the results of another release.'''
+    )
+    parser.add_argument(
+        '-b',
+        '--benchmarks',
+        dest='benchmarks',
+        action='store',
+        nargs='+',
+        choices=list(BENCHMARKS),
+        default=list(BENCHMARKS),
+        help='Benchmarks to run (default: all).'
+    )
+    parser.add_argument(
+        '-s',
+        '--scales',
+        dest='scales',
+        action='store',
+        nargs='+',
+        choices=SCALES,
+        default=['small', 'medium'],
+        help='Workload scales to run (default: small medium).'
+    )
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        dest='repeat',
+        action='store',
+        type=int,
+        default=3,
+        help='Number of measured runs of each benchmark; the fastest run is reported (default: 3).'
+    )
+    parser.add_argument(
+        '-o', '--output', dest='output_path', action='store', help='Stores the results as JSON in the given file.'
+    )
+    parser.add_argument(
+        '-c',
+        '--compare',
+        dest='baseline_path',
+        action='store',
+        help='Compares the results with the results stored in the given JSON file.'
+    )
+    parser.add_argument(
+        '-w',
+        '--work-directory',
+        dest='work_dir_path',
+        action='store',
+        help='Directory for the generated workloads (default: a temporary directory).'
+    )
+    return parser.parse_args()
+
+
+def run_benchmark(benchmark, params, repeat, work_dir_path):
+    run_times = []
+    for i in range(repeat):
+        run_dir_path = tempfile.mkdtemp(dir=work_dir_path)
+        try:
+            # The same seed generates the same workload on every run and every machine
+            workload = benchmark.setup(run_dir_path, random.Random(0), **params)
+            start_time = timeit.default_timer()
+            benchmark.run(*workload.args)
+            run_times.append(timeit.default_timer() - start_time)
+        finally:
+            shutil.rmtree(run_dir_path)
+    best_time = min(run_times)
+    return {
+        'params': params,
+        'bytes': workload.bytes,
+        'files': workload.files,
+        'best_time': best_time,
+        'median_time': sorted(run_times)[len(run_times) // 2],
+        'mb_per_s': workload.bytes / MiB / best_time,
+        'files_per_s': workload.files / best_time
+    }
+
+
+def read_results(results_path):
+    with codecs.open(results_path, 'r', 'utf-8') as f:
+        results = json.load(f)
+    return dict(((result['benchmark'], result['scale']), result) for result in results['results'])
+
+
+def print_results(results, baseline_results=None):
+    header = '{benchmark:<16} {scale:<7} {time:>10} {mb_per_s:>10} {files_per_s:>12}'.format(
+        benchmark='benchmark', scale='scale', time='time', mb_per_s='MB/s', files_per_s='files/s'
+    )
+    if baseline_results is not None:
+        header += ' {speedup:>8}'.format(speedup='speedup')
+    print(header)
+    for result in results:
+        line = '{benchmark:<16} {scale:<7} {best_time:>9.3f}s {mb_per_s:>10.1f} {files_per_s:>12.1f}'.format(**result)
+        if baseline_results is not None:
+            baseline_result = baseline_results.get((result['benchmark'], result['scale']))
+            if baseline_result is not None and baseline_result['params'] == result['params']:
+                line += ' {speedup:>7.2f}x'.format(speedup=baseline_result['best_time'] / result['best_time'])
+            else:
+                line += ' {speedup:>8}'.format(speedup='-')
+        print(line)
+
+
+def main():
+    args = parse_args()
+    baseline_results = read_results(args.baseline_path) if args.baseline_path is not None else None
+    work_dir_path = tempfile.mkdtemp(prefix='shallow_appify_benchmarks_', dir=args.work_dir_path)
+    results = []
+    try:
+        for benchmark_name in args.benchmarks:
+            for scale in args.scales:
+                benchmark = BENCHMARKS[benchmark_name]
+                print('running {benchmark} ({scale})'.format(benchmark=benchmark_name, scale=scale), file=sys.stderr)
+                result = run_benchmark(benchmark, benchmark.params[scale], args.repeat, work_dir_path)
+                result.update({'benchmark': benchmark_name, 'scale': scale})
+                results.append(result)
+    finally:
+        shutil.rmtree(work_dir_path)
+    print_results(results, baseline_results)
+    if args.output_path is not None:
+        with codecs.open(args.output_path, 'w', 'utf-8') as f:
+            json.dump(
+                {
+                    'format_version': RESULTS_FORMAT_VERSION,
+                    'shallow_appify_version': __version__,
+                    'python_version': platform.python_version(),
+                    'platform': platform.platform(),
+                    'cpu_count': multiprocessing.cpu_count(),
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'results': results
+                },
+                f,
+                indent=4,
+                sort_keys=True
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -35,7 +35,13 @@ setup(
         str("shallow_appify"): ["dmg_background.png"]  # setuptools needs byte strings as keys when running Python 2.x
     },
     install_requires=["Jinja2", "Pillow"],
-    entry_points={"console_scripts": ["shallow-appify = shallow_appify.shallow_appify:main",]},
+    entry_points={
+        "console_scripts": [
+            "shallow-appify = shallow_appify.shallow_appify:main",
+            "shallow-appify-batch = shallow_appify.batch:main",
+            "shallow-appify-startup-report = shallow_appify.plugins.util.startup_report:main",
+        ]
+    },
     author="Ingo Heimbach",
     author_email="i.heimbach@fz-juelich.de",
     description="Converts any executable to a non-self-contained mac app bundle which depends on system libraries.",
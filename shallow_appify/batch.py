@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import codecs
+import functools
+import json
+import logging
+import os
+import os.path
+import sys
+import time
+import traceback
+from . import icon
+from . import scheduler
+from . import shallow_appify
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+# Builds with the conda environment cache enabled whose values of these options are identical share the environment
+# created by the first of them, so the others only start when the first one is finished
+ENVIRONMENT_OPTIONS = (
+    'conda', 'conda-channels', 'conda-prune', 'conda-prune-exclude', 'conda-prune-keep', 'conda-dedup',
+    'extension-makefile'
+)
+# Options whose values are paths relative to the manifest directory
+PATH_OPTIONS = shallow_appify.EXECUTABLE_CONFIG_KEYS + (
+    'executable-directory', 'icon', 'output', 'trace', 'extra-plist', 'conda', 'extension-makefile'
+)
+
+
+class ManifestError(Exception):
+    pass
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='''
+    Creates several app bundles from a JSON or TOML manifest. The manifest
+    contains a list "apps" of build specifications and optional "defaults"
+    that are merged into every specification. The keys of a specification are
+    the long command line options of shallow-appify (e.g. "icon", "output",
+    "hidden", "conda") and "executable" for the executable path. Relative
+    paths are resolved relative to the manifest directory.'''
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        dest='jobs',
+        action='store',
+        type=int,
+        help='Number of app bundles that are built concurrently (default: "jobs" of the manifest or the number of '
+        'CPUs).'
+    )
+    parser.add_argument('manifest_path', action='store', type=os.path.abspath, help='Path to the build manifest.')
+    args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('argument -j/--jobs: must be at least 1')
+    return args
+
+
+def read_manifest(manifest_path):
+    if os.path.splitext(manifest_path)[1] == '.toml':
+        if tomllib is None:
+            raise ManifestError('Reading TOML manifests requires Python 3.11 or newer.')
+        with open(manifest_path, 'rb') as f:
+            manifest = tomllib.load(f)
+    else:
+        with codecs.open(manifest_path, 'r', 'utf-8') as f:
+            manifest = json.load(f)
+    if not isinstance(manifest.get('apps'), list):
+        raise ManifestError('The manifest {path} contains no list of "apps".'.format(path=manifest_path))
+    defaults = manifest.get('defaults', {})
+    specs = []
+    for app_spec in manifest['apps']:
+        spec = dict((key.replace('_', '-'), value) for key, value in defaults.items())
+        spec.update((key.replace('_', '-'), value) for key, value in app_spec.items())
+        specs.append(spec)
+    jobs = manifest.get('jobs')
+    if jobs is not None and (not isinstance(jobs, int) or isinstance(jobs, bool) or jobs < 1):
+        raise ManifestError('The "jobs" of the manifest {path} must be a positive integer.'.format(path=manifest_path))
+    return specs, jobs
+
+
+def resolve_spec_paths(working_dir_path, spec):
+    # Builds run on threads of this process, so paths are made absolute instead of changing the working directory
+    spec = dict(spec)
+    for option in PATH_OPTIONS:
+        if spec.get(option):
+            spec[option] = os.path.join(working_dir_path, spec[option])
+    if not spec.get('output'):
+        executable_paths = [spec[key] for key in shallow_appify.EXECUTABLE_CONFIG_KEYS if key in spec]
+        if executable_paths:
+            spec['output'] = os.path.join(
+                working_dir_path, '{basename_without_ext}.app'.format(
+                    basename_without_ext=os.path.splitext(os.path.basename(executable_paths[0]))[0]
+                )
+            )
+    return spec
+
+
+def get_spec_name(spec):
+    return spec.get('output') or os.path.basename('{}'.format(spec.get('executable', '?')))
+
+
+def build(working_dir_path, spec):
+    # Runs on a worker thread; all state of a build is kept by `build_app`, so builds do not interfere
+    start_time = time.time()
+    try:
+        shallow_appify.build_app(resolve_spec_paths(working_dir_path, spec))
+    except Exception as e:
+        logging.debug(traceback.format_exc())
+        return False, '{type}: {message}'.format(type=type(e).__name__, message=e), time.time() - start_time
+    return True, None, time.time() - start_time
+
+
+def render_icon(icon_path):
+    # Renders the icon into the icon cache, so all builds using it find it there
+    try:
+        icon.create_icns(icon_path)
+    except IOError:
+        pass  # reported by the build itself
+
+
+def run_builds(working_dir_path, specs, jobs=None):
+    def is_conda_cache_enabled(spec):
+        try:
+            return int(spec.get('conda-cache-size') or 0) > 0
+        except (TypeError, ValueError):
+            return False
+
+    def get_environment_key(spec):
+        if not spec.get('conda') or not is_conda_cache_enabled(spec):
+            return None
+        return json.dumps([spec.get(option) for option in ENVIRONMENT_OPTIONS], sort_keys=True)
+
+    # Every distinct icon is rendered once, concurrently with the builds that do not need it. A build that shares its
+    # environment with a previous build waits for that build only and uses the environment it stored in the cache.
+    task_graph = scheduler.TaskGraph()
+    icon_paths = set(os.path.join(working_dir_path, spec['icon']) for spec in specs if spec.get('icon'))
+    for icon_path in sorted(icon_paths):
+        task_graph.add(
+            'render_icon {path}'.format(path=icon_path),
+            functools.partial(render_icon, icon_path),
+            outputs=('icon {path}'.format(path=icon_path), ),
+            output_path=icon_path
+        )
+    first_build_outputs = {}
+    for i, spec in enumerate(specs):
+        build_output = 'build {index:d}'.format(index=i)
+        inputs = []
+        if spec.get('icon'):
+            inputs.append('icon {path}'.format(path=os.path.join(working_dir_path, spec['icon'])))
+        environment_key = get_environment_key(spec)
+        if environment_key in first_build_outputs:
+            inputs.append(first_build_outputs[environment_key])
+        elif environment_key is not None:
+            first_build_outputs[environment_key] = build_output
+        task_graph.add(
+            build_output,
+            functools.partial(build, working_dir_path, spec),
+            inputs=inputs,
+            outputs=(build_output, ),
+            output_path=get_spec_name(spec)
+        )
+    task_graph.run(jobs)
+    return [task_graph.get_result('build {index:d}'.format(index=i)) for i in range(len(specs))]
+
+
+def print_results(specs, results, total_time):
+    names = [get_spec_name(spec) for spec in specs]
+    name_width = max([len('app')] + [len(name) for name in names])
+    print('{name:<{width}}  {status:<6}  {time:>9}'.format(name='app', width=name_width, status='status', time='time'))
+    for name, (success, message, duration) in zip(names, results):
+        print(
+            '{name:<{width}}  {status:<6}  {time:>8.2f}s{message}'.format(
+                name=name,
+                width=name_width,
+                status='ok' if success else 'failed',
+                time=duration,
+                message='  ' + message if message else ''
+            )
+        )
+    print('{count} apps built in {time:.2f}s'.format(count=sum(1 for result in results if result[0]), time=total_time))
+
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+    try:
+        specs, manifest_jobs = read_manifest(args.manifest_path)
+    except (IOError, ValueError, ManifestError) as e:
+        print('ERROR: {message}'.format(message=e), file=sys.stderr)
+        sys.exit(1)
+    results = run_builds(os.path.dirname(args.manifest_path), specs, args.jobs or manifest_jobs)
+    print_results(specs, results, time.time() - start_time)
+    if not all(success for success, _, _ in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
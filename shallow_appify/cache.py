@@ -0,0 +1,162 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import contextlib
+import errno
+import hashlib
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+CACHE_DIR_ENVIRONMENT_VARIABLE = 'SHALLOW_APPIFY_CACHE_DIR'
+
+
+def get_cache_dir(*subdirs):
+    if CACHE_DIR_ENVIRONMENT_VARIABLE in os.environ:
+        cache_root_path = os.environ[CACHE_DIR_ENVIRONMENT_VARIABLE]
+    elif sys.platform == 'darwin':
+        cache_root_path = os.path.expanduser('~/Library/Caches/shallow-appify')
+    else:
+        cache_root_path = os.path.join(
+            os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'shallow-appify'
+        )
+    cache_dir_path = os.path.join(cache_root_path, *subdirs)
+    try:
+        os.makedirs(cache_dir_path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    return cache_dir_path
+
+
+def hash_file(file_path, hash_object=None):
+    hash_object = hash_object or hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hash_object.update(chunk)
+    return hash_object
+
+
+def write_file_atomically(file_path, data):
+    # Concurrent builds never see partially written cache entries
+    fd, tmp_file_path = tempfile.mkstemp(dir=os.path.dirname(file_path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_file_path, file_path)
+    except Exception:
+        os.remove(tmp_file_path)
+        raise
+
+
+def get_tree_size(root_path):
+    total_size = 0
+    for current_root_path, _, filenames in os.walk(root_path):
+        for filename in filenames:
+            total_size += os.lstat(os.path.join(current_root_path, filename)).st_size
+    return total_size
+
+
+class DirectoryCache(object):
+    # A cache of directory trees in the user cache directory; when the total size exceeds `max_size` bytes, the least
+    # recently used entries are removed.
+    _SIZE_FILENAME = '.size'
+
+    def __init__(self, name, max_size=None):
+        self._cache_dir_path = get_cache_dir(name)
+        self._max_size = max_size
+
+    def _entry_path(self, key):
+        return os.path.join(self._cache_dir_path, key)
+
+    def _lock(self, key, exclusive):
+        # Entries are pinned with a shared lock while they are used and only evicted with an exclusive lock. Returns the
+        # open lock file or `None` if the exclusive lock is held elsewhere. `flock` locks are released when a process
+        # dies, so crashed builds leave no stale pins. Lock files are never removed: a removed lock file could be
+        # recreated while another build still holds a lock on the old one.
+        lock_file = open(os.path.join(self._cache_dir_path, '.{key}.lock'.format(key=key)), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB if exclusive else fcntl.LOCK_SH)
+            except (IOError, OSError) as e:
+                lock_file.close()
+                if exclusive and e.errno in (errno.EAGAIN, errno.EACCES):
+                    return None
+                raise
+        return lock_file
+
+    @contextlib.contextmanager
+    def use(self, key):
+        # Yields the entry path or `None` if the entry does not exist; the entry cannot be evicted by any build before
+        # the context is left
+        lock_file = self._lock(key, exclusive=False)
+        try:
+            entry_path = self._entry_path(key)
+            if os.path.isdir(entry_path):
+                # The modification time of an entry is its last usage time
+                os.utime(entry_path, None)
+            else:
+                entry_path = None
+            yield entry_path
+        finally:
+            lock_file.close()
+
+    def store(self, key, fill_entry):
+        # `fill_entry` populates a temporary directory which is moved to its final location when complete, so
+        # concurrent builds never see partially written entries
+        tmp_entry_path = tempfile.mkdtemp(prefix='.{key}-'.format(key=key), dir=self._cache_dir_path)
+        try:
+            fill_entry(tmp_entry_path)
+            with open(os.path.join(tmp_entry_path, self._SIZE_FILENAME), 'w') as f:
+                f.write('{size:d}'.format(size=get_tree_size(tmp_entry_path)))
+            os.rename(tmp_entry_path, self._entry_path(key))
+        except OSError:
+            if not os.path.isdir(self._entry_path(key)):
+                raise
+            # another build stored the same entry in the meantime
+        finally:
+            if os.path.exists(tmp_entry_path):
+                shutil.rmtree(tmp_entry_path)
+        self.evict()
+
+    def evict(self):
+        if self._max_size is None:
+            return
+        entries = []
+        for key in os.listdir(self._cache_dir_path):
+            entry_path = self._entry_path(key)
+            if key.startswith('.') or not os.path.isdir(entry_path):
+                continue
+            try:
+                with open(os.path.join(entry_path, self._SIZE_FILENAME), 'r') as f:
+                    size = int(f.read())
+            except (IOError, OSError, ValueError):
+                size = get_tree_size(entry_path)
+            entries.append((os.path.getmtime(entry_path), key, size))
+        total_size = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total_size <= self._max_size:
+                break
+            lock_file = self._lock(key, exclusive=True)
+            if lock_file is None:
+                # the entry is in use by another build
+                continue
+            try:
+                if os.path.isdir(self._entry_path(key)):
+                    shutil.rmtree(self._entry_path(key))
+            finally:
+                lock_file.close()
+            total_size -= size
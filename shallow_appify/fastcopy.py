@@ -0,0 +1,160 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import ctypes
+import ctypes.util
+import errno
+import multiprocessing
+import os
+import os.path
+import shutil
+import sys
+from multiprocessing.pool import ThreadPool
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+FICLONE = 0x40049409  # Linux ioctl to create a copy-on-write clone (btrfs, xfs)
+_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# Errors which indicate that a copy method is not supported for the given files
+_UNSUPPORTED_ERRNOS = tuple(
+    getattr(errno, name)
+    for name in ('ENOSYS', 'ENOTSUP', 'EOPNOTSUPP', 'EXDEV', 'EINVAL', 'ENOTTY', 'EPERM', 'EMLINK', 'EBADF')
+    if hasattr(errno, name)
+)
+
+_clonefile = None
+
+
+def _get_clonefile():
+    global _clonefile
+
+    if _clonefile is None:
+        try:
+            _clonefile = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True).clonefile
+            _clonefile.argtypes = (ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint32)
+        except (AttributeError, OSError):
+            _clonefile = False
+    return _clonefile
+
+
+def _clone_file(source_path, target_path):
+    # APFS clones share the data blocks of the source until one of the files is modified
+    clonefile = _get_clonefile()
+    if not clonefile:
+        return False
+    return clonefile(source_path.encode('utf-8'), target_path.encode('utf-8'), 0) == 0
+
+
+def _kernel_copy(source_file, target_file):
+    # Returns `False` if no kernel side copy method is available, so the caller can fall back to a buffered copy
+    source_fd, target_fd = source_file.fileno(), target_file.fileno()
+    if fcntl is not None and sys.platform.startswith('linux'):
+        try:
+            fcntl.ioctl(target_fd, FICLONE, source_fd)
+            return True
+        except (IOError, OSError) as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    copy_functions = []
+    if hasattr(os, 'copy_file_range'):
+        copy_functions.append(lambda offset: os.copy_file_range(source_fd, target_fd, _COPY_CHUNK_SIZE, offset, offset))
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        copy_functions.append(lambda offset: os.sendfile(target_fd, source_fd, offset, _COPY_CHUNK_SIZE))
+    for copy_function in copy_functions:
+        offset = 0
+        try:
+            while True:
+                copied_byte_count = copy_function(offset)
+                if copied_byte_count == 0:
+                    return True
+                offset += copied_byte_count
+        except OSError as e:
+            if offset > 0 or e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    return False
+
+
+def copy_file(source_path, target_path, hardlink=False):
+    # Copies data and metadata like `shutil.copy2`; tries a hard link (if requested), a copy-on-write clone and
+    # kernel side copies before falling back to a buffered copy
+    if os.path.isdir(target_path):
+        target_path = os.path.join(target_path, os.path.basename(source_path))
+    if hardlink:
+        try:
+            os.link(source_path, target_path)
+            return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    if sys.platform == 'darwin':
+        if _clone_file(source_path, target_path):
+            return
+        # `shutil.copyfile` uses `fcopyfile` on macOS
+        shutil.copyfile(source_path, target_path)
+    else:
+        with open(source_path, 'rb') as source_file, open(target_path, 'wb') as target_file:
+            if not _kernel_copy(source_file, target_file):
+                shutil.copyfileobj(source_file, target_file, _COPY_CHUNK_SIZE)
+    shutil.copystat(source_path, target_path)
+
+
+def copy_tree(source_path, target_path, symlinks=False, hardlink=False, preserve_hardlinks=False, num_workers=None):
+    # Works like `shutil.copytree`, but files are copied concurrently with `copy_file`. `hardlink` is either a boolean
+    # or a callable that decides for each path relative to `source_path` if the file may be hard linked. With
+    # `preserve_hardlinks`, files that are hard linked to each other within the source tree (e.g. by the deduplication
+    # of a conda environment) are hard linked in the target tree as well; source trees of users are copied without, so
+    # a file of the bundle never changes together with another one.
+    def should_hardlink(relative_path):
+        return hardlink(relative_path) if callable(hardlink) else hardlink
+
+    def copy(paths):
+        source_file_path, target_file_path, relative_path = paths
+        copy_file(source_file_path, target_file_path, should_hardlink(relative_path))
+
+    os.makedirs(target_path)
+    copied_dir_paths = [(source_path, target_path)]
+    file_paths = []
+    first_target_file_paths = {}
+    linked_file_paths = []
+    for current_root_path, dirnames, filenames in os.walk(source_path, followlinks=not symlinks):
+        current_relative_path = os.path.relpath(current_root_path, source_path)
+        current_target_path = os.path.normpath(os.path.join(target_path, current_relative_path))
+        for name in dirnames + filenames:
+            source_item_path = os.path.join(current_root_path, name)
+            target_item_path = os.path.join(current_target_path, name)
+            if symlinks and os.path.islink(source_item_path):
+                os.symlink(os.readlink(source_item_path), target_item_path)
+            elif name in dirnames:
+                os.mkdir(target_item_path)
+                copied_dir_paths.append((source_item_path, target_item_path))
+            else:
+                relative_item_path = os.path.normpath(os.path.join(current_relative_path, name))
+                stat_result = os.stat(source_item_path)
+                if preserve_hardlinks and stat_result.st_nlink > 1:
+                    inode = (stat_result.st_dev, stat_result.st_ino)
+                    if inode in first_target_file_paths:
+                        linked_file_paths.append((first_target_file_paths[inode], target_item_path))
+                        continue
+                    first_target_file_paths[inode] = target_item_path
+                file_paths.append((source_item_path, target_item_path, relative_item_path))
+    pool = ThreadPool(num_workers or 2 * multiprocessing.cpu_count())
+    try:
+        for _ in pool.imap_unordered(copy, file_paths, chunksize=8):
+            pass
+    finally:
+        pool.close()
+        pool.join()
+    for first_target_file_path, target_file_path in linked_file_paths:
+        copy_file(first_target_file_path, target_file_path, hardlink=True)
+    # Directory times are set last since creating their contents modifies them
+    for source_dir_path, target_dir_path in reversed(copied_dir_paths):
+        shutil.copystat(source_dir_path, target_dir_path)
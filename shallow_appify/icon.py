@@ -0,0 +1,102 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import io
+import multiprocessing
+import os.path
+import struct
+from multiprocessing.pool import ThreadPool
+from PIL import Image
+from . import cache
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+# Increase when the generated icons change, so outdated cache entries are not used anymore
+ICNS_FORMAT_VERSION = 2
+# PNG encoded icon types in the order `iconutil` writes them; `icp4` and `icp5` are the PNG capable types for 16 and 32
+# pixels (`ic04` and `ic05` hold ARGB data)
+ICNS_PNG_TYPES = (
+    (b'icp4', 16),
+    (b'icp5', 32),
+    (b'ic11', 32),
+    (b'ic12', 64),
+    (b'ic07', 128),
+    (b'ic13', 256),
+    (b'ic08', 256),
+    (b'ic14', 512),
+    (b'ic09', 512),
+    (b'ic10', 1024),
+)
+
+
+def encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def create_icns_data(size_to_png_data):
+    chunks = [
+        icon_type + struct.pack('>I', len(size_to_png_data[size]) + 8) + size_to_png_data[size]
+        for icon_type, size in ICNS_PNG_TYPES
+    ]
+    return b'icns' + struct.pack('>I', sum(len(chunk) for chunk in chunks) + 8) + b''.join(chunks)
+
+
+def downscale(image, size):
+    # Integer reduction (box filter) is only used down to twice the target size, the final step is always done with a
+    # Lanczos filter to keep the quality of a direct resize
+    reduction_factor = min(image.size) // (2 * size)
+    if reduction_factor >= 2 and hasattr(image, 'reduce'):
+        image = image.reduce(reduction_factor)
+    return image.resize((size, size), Image.LANCZOS)
+
+
+def iter_downscaled_images(image, sizes):
+    # Every distinct size is computed once from the next larger result, so only the largest size is derived from the
+    # full resolution image. `image` is rebound on every step, so the full resolution image can be freed as soon as
+    # the largest size has been produced.
+    for size in sorted(set(sizes), reverse=True):
+        image = downscale(image, size)
+        yield size, image
+
+
+def render_icns(icon_path, num_workers=None):
+    sizes = [size for _, size in ICNS_PNG_TYPES]
+    original_icon = Image.open(icon_path)
+    # Lets the JPEG decoder scale down while loading; this is a no-op for other formats
+    original_icon.draft(original_icon.mode, (2 * max(sizes), 2 * max(sizes)))
+    if original_icon.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+        original_icon = original_icon.convert('RGBA')
+    # PNG compression releases the GIL, so the images are encoded concurrently while smaller sizes are computed
+    pool = ThreadPool(num_workers or min(len(set(sizes)), multiprocessing.cpu_count()))
+    try:
+        downscaled_images = iter_downscaled_images(original_icon, sizes)
+        # The generator holds the only remaining reference to the full resolution image
+        del original_icon
+        pending_png_data = [(size, pool.apply_async(encode_png, (image, ))) for size, image in downscaled_images]
+        size_to_png_data = dict((size, png_data.get()) for size, png_data in pending_png_data)
+    finally:
+        pool.close()
+        pool.join()
+    return create_icns_data(size_to_png_data)
+
+
+def create_icns(icon_path, use_cache=True):
+    if not use_cache:
+        return render_icns(icon_path)
+    source_hash = cache.hash_file(icon_path).hexdigest()
+    cached_icns_path = os.path.join(
+        cache.get_cache_dir('icons'), '{hash}-{version}.icns'.format(hash=source_hash, version=ICNS_FORMAT_VERSION)
+    )
+    if os.path.isfile(cached_icns_path):
+        with open(cached_icns_path, 'rb') as f:
+            return f.read()
+    icns_data = render_icns(icon_path)
+    cache.write_file_atomically(cached_icns_path, icns_data)
+    return icns_data
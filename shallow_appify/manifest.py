@@ -0,0 +1,140 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import codecs
+import json
+import multiprocessing
+import os
+import os.path
+from multiprocessing.pool import ThreadPool
+from . import cache
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+MANIFEST_FILENAME = '.shallow_appify_manifest.json'
+MANIFEST_VERSION = 1
+
+
+class Manifest(object):
+    # Records the state of all files copied into a bundle and the inputs of generated bundle files, so an update only
+    # needs to redo the work whose inputs changed
+
+    def __init__(self, files=None, inputs=None):
+        # `files` maps relative paths to `[size, mtime, sha256]`, `inputs` maps names of generated files to hashes
+        self.files = files if files is not None else {}
+        self.inputs = inputs if inputs is not None else {}
+
+    @classmethod
+    def read(cls, manifest_path):
+        if not os.path.isfile(manifest_path):
+            return None
+        with codecs.open(manifest_path, 'r', 'utf-8') as f:
+            manifest_content = json.load(f)
+        if manifest_content.get('version') != MANIFEST_VERSION:
+            return None
+        return cls(manifest_content['files'], manifest_content['inputs'])
+
+    def write(self, manifest_path):
+        with codecs.open(manifest_path, 'w', 'utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.files, 'inputs': self.inputs}, f, sort_keys=True)
+
+
+def stat_entry(file_path):
+    stat_result = os.stat(file_path)
+    return [stat_result.st_size, stat_result.st_mtime]
+
+
+def file_entry(file_path):
+    return stat_entry(file_path) + [cache.hash_file(file_path).hexdigest()]
+
+
+def is_file_unchanged(file_path, entry):
+    # The content hash is only computed when size or modification time differ from the recorded values
+    if entry is None or not os.path.isfile(file_path):
+        return False
+    if stat_entry(file_path) == entry[:2]:
+        return True
+    return cache.hash_file(file_path).hexdigest() == entry[2]
+
+
+def list_source_files(source_path):
+    # Symbolic links are followed like in `fastcopy.copy_tree`
+    if os.path.isfile(source_path):
+        return {os.path.basename(source_path): source_path}
+    source_files = {}
+    for current_root_path, _, filenames in os.walk(source_path, followlinks=True):
+        for filename in filenames:
+            file_path = os.path.join(current_root_path, filename)
+            source_files[os.path.relpath(file_path, source_path)] = file_path
+    return source_files
+
+
+def create_file_entries(source_files, num_workers=None):
+    pool = ThreadPool(num_workers or multiprocessing.cpu_count())
+    try:
+        relative_paths = sorted(source_files)
+        entries = pool.map(file_entry, [source_files[relative_path] for relative_path in relative_paths])
+    finally:
+        pool.close()
+        pool.join()
+    return dict(zip(relative_paths, entries))
+
+
+def diff_files(source_files, file_entries):
+    # Returns the relative paths of changed (or new) and removed files and new entries for all files whose size or
+    # modification time differ from the recorded values (changed files and files with an unchanged content hash)
+    changed_paths = []
+    new_entries = {}
+    for relative_path, file_path in source_files.items():
+        entry = file_entries.get(relative_path)
+        if entry is not None and stat_entry(file_path) == entry[:2]:
+            continue
+        new_entries[relative_path] = file_entry(file_path)
+        if entry is None or new_entries[relative_path][2] != entry[2]:
+            changed_paths.append(relative_path)
+    removed_paths = [relative_path for relative_path in file_entries if relative_path not in source_files]
+    return sorted(changed_paths), sorted(removed_paths), new_entries
+
+
+def get_compiled_file_paths(file_path):
+    # Legacy `.pyc` files next to the source are importable without it, so they must not outlive their source file
+    base_path, ext = os.path.splitext(file_path)
+    if ext != '.py':
+        return []
+    dir_path, module_name = os.path.split(base_path)
+    compiled_file_paths = [base_path + '.pyc', base_path + '.pyo']
+    cache_dir_path = os.path.join(dir_path, '__pycache__')
+    if os.path.isdir(cache_dir_path):
+        compiled_file_paths.extend(
+            os.path.join(cache_dir_path, filename) for filename in os.listdir(cache_dir_path)
+            if filename.startswith(module_name + '.') and os.path.splitext(filename)[1] in ('.pyc', '.pyo')
+        )
+    return compiled_file_paths
+
+
+def remove_files(root_path, relative_paths, kept_relative_paths=()):
+    # Removes files of a copied source tree together with their compiled python files (unless they are source files
+    # themselves) and all directories below `root_path` that became empty
+    kept_relative_paths = set(kept_relative_paths)
+    dir_paths = set()
+    for relative_path in relative_paths:
+        file_path = os.path.join(root_path, relative_path)
+        for current_file_path in [file_path] + get_compiled_file_paths(file_path):
+            if current_file_path != file_path and \
+               os.path.relpath(current_file_path, root_path) in kept_relative_paths:
+                continue
+            if os.path.lexists(current_file_path):
+                os.remove(current_file_path)
+                dir_paths.add(os.path.dirname(current_file_path))
+    root_path = os.path.abspath(root_path)
+    for dir_path in sorted(dir_paths, key=len, reverse=True):
+        dir_path = os.path.abspath(dir_path)
+        while dir_path != root_path and dir_path.startswith(root_path + os.sep) and \
+                os.path.isdir(dir_path) and not os.listdir(dir_path):
+            os.rmdir(dir_path)
+            dir_path = os.path.dirname(dir_path)
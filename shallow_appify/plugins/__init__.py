@@ -6,13 +6,30 @@ from __future__ import division
 from __future__ import absolute_import
 
 import importlib
-import pkgutil
+import json
+import os
+import os.path
+import sys
+import threading
+from .. import cache, trace
 
 __author__ = 'Ingo Heimbach'
 __email__ = 'i.heimbach@fz-juelich.de'
 
-_modules = None
-_ext2module = None
+# Plugins are only imported when an executable with their file extension is bundled. The command line arguments of a
+# plugin may be defined in a separate lightweight module, so building the argument parser does not import the plugin
+# and its dependencies. Third-party plugins are registered with entry points in this group (the entry point name is
+# the file extension, the value the plugin module) or with `register_plugin`.
+ENTRY_POINT_GROUP = 'shallow_appify.plugins'
+_ENTRY_POINTS_CACHE_FILENAME = 'entry_points.json'
+
+# file extension -> (plugin module, command line arguments module)
+_BUILTIN_PLUGINS = {
+    'py': ('.python', '.python_arguments'),
+}
+
+_registry = None
+_registry_lock = threading.Lock()
 
 
 def _normalize_ext(f):
@@ -27,23 +44,92 @@ def _normalize_ext(f):
 def _check_ext_availability(f):
     @_normalize_ext
     def g(file_ext, *args, **kwargs):
-        if _ext2module is not None:
-            if file_ext in _ext2module:
-                return f(file_ext, *args, **kwargs)
-            else:
-                return NotImplemented
+        if file_ext in _get_registry():
+            return f(file_ext, *args, **kwargs)
         else:
-            raise NotInitializedError
+            return NotImplemented
 
     return g
 
 
-class NotInitializedError(Exception):
-    pass
+def _query_entry_points():
+    try:
+        from importlib import metadata
+    except ImportError:
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            return []
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        entry_points = entry_points.select(group=ENTRY_POINT_GROUP)
+    else:
+        entry_points = entry_points.get(ENTRY_POINT_GROUP, [])
+    return [[entry_point.name, entry_point.value] for entry_point in entry_points]
+
+
+def _get_entry_points_cache_key():
+    # Installing or removing a distribution changes the modification time of its directory on the module search path
+    return [[path, os.stat(path).st_mtime] for path in sys.path if path and os.path.isdir(path)]
+
+
+def _iter_entry_points():
+    # Querying the entry points reads the metadata of all installed distributions, so the result is cached between
+    # runs as pairs of entry point name and value
+    cache_path = os.path.join(cache.get_cache_dir('plugins'), _ENTRY_POINTS_CACHE_FILENAME)
+    cache_key = _get_entry_points_cache_key()
+    try:
+        with open(cache_path, 'rb') as f:
+            cache_content = json.loads(f.read().decode('utf-8'))
+        if cache_content['key'] == cache_key:
+            return cache_content['entry_points']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+    entry_points = _query_entry_points()
+    try:
+        cache_content = {'key': cache_key, 'entry_points': entry_points}
+        cache.write_file_atomically(cache_path, json.dumps(cache_content).encode('utf-8'))
+    except (IOError, OSError):
+        pass
+    return entry_points
+
+
+def _get_registry():
+    global _registry
+
+    # The registry is filled completely before it is published, so concurrent builds never see a partial registry
+    with _registry_lock:
+        if _registry is None:
+            registry = {}
+            for entry_point_name, entry_point_value in _iter_entry_points():
+                # Only the module part of the entry point value is used, so the plugin needs not be imported here
+                module_name = entry_point_value.split(':')[0].strip()
+                registry[entry_point_name.lstrip('.')] = (module_name, module_name)
+            for file_ext, (module_name, arguments_module_name) in _BUILTIN_PLUGINS.items():
+                registry.setdefault(file_ext, (__name__ + module_name, __name__ + arguments_module_name))
+            _registry = registry
+    return _registry
+
+
+def _get_plugin(file_ext):
+    return importlib.import_module(_get_registry()[file_ext][0])
+
+
+@_normalize_ext
+def register_plugin(file_ext, module_name, arguments_module_name=None):
+    # Registers (or replaces) the plugin for the given file extension; `arguments_module_name` defaults to the plugin
+    # module
+    _get_registry()[file_ext] = (module_name, arguments_module_name or module_name)
 
 
 def add_plugin_command_line_arguments(parser):
-    for module in _modules.values():
+    added_module_names = set()
+    for file_ext in sorted(_get_registry()):
+        arguments_module_name = _get_registry()[file_ext][1]
+        if arguments_module_name in added_module_names:
+            continue
+        added_module_names.add(arguments_module_name)
+        module = importlib.import_module(arguments_module_name)
         arguments = module.get_command_line_arguments()
         for name_or_flags, kwargs in arguments:
             if 'help' in kwargs:
@@ -57,44 +143,100 @@ def add_plugin_command_line_arguments(parser):
 
 @_check_ext_availability
 def parse_command_line_arguments(file_ext, arguments):
-    return _ext2module[file_ext].parse_command_line_arguments(arguments)
+    return _get_plugin(file_ext).parse_command_line_arguments(arguments)
 
 
 @_check_ext_availability
 def pre_create_app(file_ext, **arguments):
-    return _ext2module[file_ext].pre_create_app(**arguments)
+    with trace.stage('pre_create_app', category='plugin'):
+        return _get_plugin(file_ext).pre_create_app(**arguments)
 
 
-@_normalize_ext
+@_check_ext_availability
 def setup_startup(
-    file_ext, app_path, executable_path, app_executable_path, executable_root_path, macos_path, resources_path
+    file_ext,
+    app_path,
+    executable_path,
+    app_executable_path,
+    executable_root_path,
+    macos_path,
+    resources_path,
+    info_plist=None,
+    **plugin_arguments
 ):
-    if _ext2module is not None:
-        if file_ext in _ext2module:
-            return _ext2module[file_ext].setup_startup(
-                app_path, executable_path, app_executable_path, executable_root_path, macos_path, resources_path
-            )
-        else:
-            return NotImplemented
-    else:
-        raise NotInitializedError
+    # The plugin arguments (as returned by `parse_command_line_arguments`) hold the plugin configuration of the build
+    with trace.stage('setup_startup', app_path, category='plugin'):
+        return _get_plugin(file_ext).setup_startup(
+            app_path,
+            executable_path,
+            app_executable_path,
+            executable_root_path,
+            macos_path,
+            resources_path,
+            info_plist=info_plist,
+            **plugin_arguments
+        )
 
 
 @_check_ext_availability
-def post_create_app(file_ext, **arguments):
-    return _ext2module[file_ext].post_create_app(**arguments)
-
+def add_startup_tasks(
+    file_ext,
+    task_graph,
+    app_path,
+    executable_path,
+    app_executable_path,
+    executable_root_path,
+    macos_path,
+    resources_path,
+    info_plist=None,
+    **plugin_arguments
+):
+    # Plugins may split their startup setup into several tasks of the build task graph (e.g. to run them concurrently
+    # with the source copy); the task with the output "startup" must return the new bundle executable path. Plugins
+    # without `add_startup_tasks` run `setup_startup` as a single task after the source copy.
+    plugin = _get_plugin(file_ext)
+    if hasattr(plugin, 'add_startup_tasks'):
+        plugin.add_startup_tasks(
+            task_graph,
+            app_path,
+            executable_path,
+            app_executable_path,
+            executable_root_path,
+            macos_path,
+            resources_path,
+            info_plist=info_plist,
+            **plugin_arguments
+        )
+    else:
+        task_graph.add(
+            'setup_startup',
+            lambda: plugin.setup_startup(
+                app_path,
+                executable_path,
+                app_executable_path,
+                executable_root_path,
+                macos_path,
+                resources_path,
+                info_plist=info_plist,
+                **plugin_arguments
+            ),
+            inputs=('source', ),
+            outputs=('startup', ),
+            output_path=app_path
+        )
 
-def _pkg_init():
-    global _modules, _ext2module
 
-    _modules = {}
-    _ext2module = {}
-    for _, module_name, is_package in pkgutil.iter_modules(__path__):
-        if not is_package:
-            current_module = importlib.import_module('.{module_name}'.format(module_name=module_name), __name__)
-            _modules[module_name] = current_module
-            _ext2module[current_module._file_ext_] = current_module
+@_check_ext_availability
+def update_app(file_ext, app_path, macos_path, resources_path, changed_paths, **plugin_arguments):
+    # Called on incremental updates after the changed source files (`changed_paths`, relative to `macos_path`) were
+    # copied into the bundle; plugins without `update_app` need not process copied source files
+    plugin = _get_plugin(file_ext)
+    if hasattr(plugin, 'update_app'):
+        with trace.stage('update_app', macos_path, category='plugin'):
+            plugin.update_app(app_path, macos_path, resources_path, changed_paths, **plugin_arguments)
 
 
-_pkg_init()
+@_check_ext_availability
+def post_create_app(file_ext, **arguments):
+    with trace.stage('post_create_app', category='plugin'):
+        return _get_plugin(file_ext).post_create_app(**arguments)
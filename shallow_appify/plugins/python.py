@@ -7,20 +7,43 @@ from __future__ import absolute_import
 
 import codecs
 import fnmatch
+import glob
 import itertools
+import json
+import logging
 import os
 import re
 import shutil
 import subprocess
+import sys
+import tempfile
 from jinja2 import Template
-from .util import command
-from .util.binary_replace import binary_replace
+from .. import cache, fastcopy, scheduler, trace
+from .._version import __version__
+# The plugin name, file extension and command line arguments are re-exported to keep the complete plugin interface
+from .python_arguments import _EXT_MAKEFILE_TARGET, _EXT_PYLIB_VARIABLE, _file_ext_, _plugin_name_, \
+    get_command_line_arguments
+from .util import command, dedup, macho, precompile, prefix_scan, prune, relocate
 
 __author__ = 'Ingo Heimbach'
 __email__ = 'i.heimbach@fz-juelich.de'
 
+# The plugin interface which is used by the plugin registry
+__all__ = [
+    '_file_ext_', '_plugin_name_', 'add_startup_tasks', 'get_command_line_arguments', 'parse_command_line_arguments',
+    'post_create_app', 'pre_create_app', 'setup_startup', 'update_app'
+]
+
 PY_PRE_STARTUP_CONDA_SETUP = '''
 #!/bin/bash
+{% if profile_startup -%}
+# EPOCHREALTIME needs bash 5; macOS ships bash 3.2, but always has perl
+SHALLOW_APPIFY_LAUNCH_TIME="${EPOCHREALTIME:-}"
+if [[ -z "${SHALLOW_APPIFY_LAUNCH_TIME}" ]]; then
+    SHALLOW_APPIFY_LAUNCH_TIME="$(perl -MTime::HiRes=time -e 'printf "%.6f", time' 2>/dev/null)"
+fi
+export SHALLOW_APPIFY_LAUNCH_TIME
+{% endif -%}
 SCRIPT_DIR=$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )
 cd ${SCRIPT_DIR}
 
@@ -34,14 +57,7 @@ function fix_prefix {
     if [ "${SAVED_PREFIX}" != "${REAL_PREFIX}" ]; then
         if [ -w "../Resources/application_path_prefix" ]; then
             >&2 echo "INFO: Replacing application prefix ${SAVED_PREFIX} with ${REAL_PREFIX} ..."
-            while read -r MATCHING_FILE ; do
-                if file --mime "${MATCHING_FILE}" | grep -q "charset=binary"; then
-                    ../Resources/binary_replace.py "${MATCHING_FILE}" "${SAVED_PREFIX}" "${REAL_PREFIX}"
-                else
-                    sed -i '' "s!${SAVED_PREFIX}!${REAL_PREFIX}!g" "${MATCHING_FILE}"
-                fi
-            done < <(grep -rl --exclude='*.pyc' "${SAVED_PREFIX}" ../Resources/conda_env)
-            echo "${REAL_PREFIX}">../Resources/application_path_prefix
+            ../Resources/relocate.py ../Resources "${REAL_PREFIX}"
         else
             >&2 echo "WARNING: The app has no write permissions to change location prefixes!"
         fi
@@ -53,62 +69,185 @@ source ../Resources/conda_env/bin/activate ../Resources/conda_env
 python __startup__.py
 '''.strip()
 
+# Launcher without subprocesses: the environment variables set by `activate` are rendered at build time
+PY_PRE_STARTUP_CONDA_FAST_SETUP = '''
+#!/bin/bash
+{% if profile_startup -%}
+# EPOCHREALTIME needs bash 5; macOS ships bash 3.2, but always has perl
+SHALLOW_APPIFY_LAUNCH_TIME="${EPOCHREALTIME:-}"
+if [[ -z "${SHALLOW_APPIFY_LAUNCH_TIME}" ]]; then
+    SHALLOW_APPIFY_LAUNCH_TIME="$(perl -MTime::HiRes=time -e 'printf "%.6f", time' 2>/dev/null)"
+fi
+export SHALLOW_APPIFY_LAUNCH_TIME
+{% endif -%}
+if [[ "${BASH_SOURCE[0]}" == */* ]]; then
+    cd "${BASH_SOURCE[0]%/*}" || exit 1
+fi
+APP_PREFIX="${PWD%/Contents/MacOS}"
+
+read -r SAVED_PREFIX <../Resources/application_path_prefix
+if [[ "${SAVED_PREFIX}" != "${APP_PREFIX}" ]]; then
+    if [[ -w "../Resources/application_path_prefix" ]]; then
+        >&2 echo "INFO: Replacing application prefix ${SAVED_PREFIX} with ${APP_PREFIX} ..."
+        ../Resources/relocate.py ../Resources "${APP_PREFIX}"
+    else
+        >&2 echo "WARNING: The app has no write permissions to change location prefixes!"
+    fi
+fi
+
+{% for name, value in exports -%}
+{% if value is none -%}
+unset {{ name }}
+{% else -%}
+export {{ name }}="{{ value }}"
+{% endif -%}
+{% endfor -%}
+exec "${APP_PREFIX}/Contents/Resources/conda_env/bin/python" __startup__.py "$@"
+'''.strip()
+
 PY_STARTUP_SCRIPT = '''
 {{ shebang }}
 # coding: utf-8
 
 from __future__ import unicode_literals
-
+{% if profile_log_dir %}
+import time
+STARTUP_TIME = time.time()
+import json
+import sys
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+PROFILE_LOG_DIR = {{ profile_log_dir }}
+PROFILE_LOG_FILENAME = 'startup_profile.jsonl'
+PROFILE_LOG_MAX_SIZE = 1024 * 1024
+PROFILE_LOG_BACKUP_COUNT = 3
+
+class ImportProfiler(object):
+    # Measures the self and cumulative time of every import like `python -X importtime`
+    def __init__(self):
+        self.original_import = builtins.__import__
+        self.child_times = [0.0]
+        self.imports = []
+
+    def __call__(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0 and not fromlist and name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+        depth = len(self.child_times) - 1
+        self.child_times.append(0.0)
+        start_time = time.time()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative_time = time.time() - start_time
+            child_time = self.child_times.pop()
+            self.child_times[-1] += cumulative_time
+            self.imports.append(('.' * level + name, depth, cumulative_time - child_time, cumulative_time))
+
+    def start(self):
+        builtins.__import__ = self
+
+    def stop(self):
+        builtins.__import__ = self.original_import
+
+def write_startup_profile(import_start_time):
+    main_time = time.time()
+    import_profiler.stop()
+    try:
+        launch_time = float(os.environ.get('SHALLOW_APPIFY_LAUNCH_TIME', '').replace(',', '.'))
+    except ValueError:
+        launch_time = None
+    profile = {
+        'timestamp': main_time,
+        'python_version': sys.version.split()[0],
+        'interpreter_startup': STARTUP_TIME - launch_time if launch_time is not None else None,
+        'setup': import_start_time - STARTUP_TIME,
+        'import_main_module': main_time - import_start_time,
+        'time_to_main': main_time - (launch_time if launch_time is not None else STARTUP_TIME),
+        'imports': import_profiler.imports
+    }
+    # Profiling must never prevent the app from starting
+    try:
+        log_dir_path = os.path.expanduser(PROFILE_LOG_DIR)
+        if not os.path.isdir(log_dir_path):
+            os.makedirs(log_dir_path)
+        log_path = os.path.join(log_dir_path, PROFILE_LOG_FILENAME)
+        if os.path.isfile(log_path) and os.path.getsize(log_path) > PROFILE_LOG_MAX_SIZE:
+            for i in range(PROFILE_LOG_BACKUP_COUNT - 1, 0, -1):
+                if os.path.isfile('{}.{}'.format(log_path, i)):
+                    os.rename('{}.{}'.format(log_path, i), '{}.{}'.format(log_path, i + 1))
+            os.rename(log_path, '{}.1'.format(log_path))
+        with open(log_path, 'a') as f:
+            f.write(json.dumps(profile) + '\\n')
+    except (IOError, OSError):
+        pass
+
+import_profiler = ImportProfiler()
+import_profiler.start()
+{% endif %}
 import os
 import os.path
-from xml.etree import ElementTree as ET
+{% if module_archives -%}
+import sys
+
+def add_module_archives():
+    # Modules that were packed into zip archives at build time are imported with zipimport
+    app_dir_path = os.path.dirname(os.path.abspath(__file__))
+    {%- for archive_path, prepend in module_archives %}
+    {%- if prepend %}
+    sys.path.insert(1, os.path.normpath(os.path.join(app_dir_path, {{ archive_path }})))
+    {%- else %}
+    sys.path.append(os.path.normpath(os.path.join(app_dir_path, {{ archive_path }})))
+    {%- endif %}
+    {%- endfor %}
+
+add_module_archives()
+{% endif -%}
+{% if cf_keys -%}
 from Foundation import NSBundle
 
+CF_KEYS = {{ cf_keys }}
+{%- endif %}
+
 def fix_current_working_directory():
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-
+{% if cf_keys %}
 def set_cf_keys():
     bundle = NSBundle.mainBundle()
     bundle_info = bundle.localizedInfoDictionary() or bundle.infoDictionary()
-    info_plist = ET.parse('../Info.plist')
-    root = info_plist.getroot()
-    plist_dict = root.find('dict')
-    current_key = None
-    for child in plist_dict:
-        if child.tag == 'key' and (child.text.startswith('CF') or   # CoreFoundation key
-                                   child.text in ['LSUIElement', 'NSSupportsAutomaticGraphicsSwitching']):
-            current_key = child.text
-        elif current_key is not None:
-            if child.text is not None:
-                bundle_info[current_key] = child.text
-            else:
-                bundle_info[current_key] = (child.tag == 'true')
-            current_key = None
-
+    for key, value in CF_KEYS.items():
+        bundle_info[key] = value
+{% endif %}
 def main():
     fix_current_working_directory()
+{%- if cf_keys %}
     set_cf_keys()
+{%- endif %}
+{%- if profile_log_dir %}
+    import_start_time = time.time()
+{%- endif %}
     import {{ main_module }}
+{%- if profile_log_dir %}
+    write_startup_profile(import_start_time)
+{%- endif %}
     {{ main_module }}.main()    # a main function is required
 if __name__ == '__main__':
     main()
 '''.strip()
 
-_plugin_name_ = 'Python'
-_file_ext_ = 'py'
-
 _PY_STARTUP_SCRIPT_NAME = '__startup__.py'
 _ENV_STARTUP_SCRIPT_NAME = '__startup__.sh'
+_APP_MODULES_ARCHIVE_NAME = 'app_modules.zip'
+_SITE_PACKAGES_ARCHIVE_NAME = 'site_packages.zip'
 _CONDA_DEFAULT_PACKAGES = ('pyobjc-framework-cocoa', )
 _CONDA_DEFAULT_CHANNELS = ('https://conda.binstar.org/erik', )
-_EXT_PYLIB_VARIABLE = 'PYLIBPATH'
-_EXT_MAKEFILE_TARGET = 'app_extension_modules'
-
-_create_conda_env = False
-_requirements_file = None
-_conda_channels = None
-_extension_makefile = None
-_conda_gr_included = False
+_CONDA_CACHE_NAME = 'conda_envs'
+_CF_KEY_PREFIX = 'CF'  # CoreFoundation keys
+_CF_ADDITIONAL_KEYS = ('LSUIElement', 'NSSupportsAutomaticGraphicsSwitching')
+# Variables that are changed by any shell and must not be copied from the activated build environment
+_SHELL_VARIABLES = ('_', 'OLDPWD', 'PS1', 'PWD', 'SHLVL', 'SHALLOW_APPIFY_LAUNCH_TIME')
 
 
 class CondaError(Exception):
@@ -127,70 +266,70 @@ class ExtensionModuleError(Exception):
     pass
 
 
-def get_command_line_arguments():
-    arguments = [
-        (
-            ('--conda', ), {
-                'dest':
-                'conda_req_file',
-                'action':
-                'store',
-                'type':
-                os.path.abspath,
-                'help':
-                'Creates a miniconda environment from the given conda requirements file '
-                'and includes it in the app bundle. Can be used to create self-contained '
-                'python apps.'
-            }
-        ), (
-            ('--conda-channels', ), {
-                'dest':
-                'conda_channels',
-                'action':
-                'store',
-                'nargs':
-                '+',
-                'help':
-                'A list of custom conda channels to install packages that are not '
-                'included in the main anaconda distribution.'
-            }
-        ), (
-            ('--extension-makefile', ), {
-                'dest':
-                'extension_makefile',
-                'action':
-                'store',
-                'type':
-                os.path.abspath,
-                'help':
-                'Path to a makefile for building python extension modules. The '
-                'makefile is called with the target "{target}" and a variable '
-                '"{libvariable}" that holds the path to the conda python '
-                'library.'.format(target=_EXT_MAKEFILE_TARGET, libvariable=_EXT_PYLIB_VARIABLE)
-            }
-        )
-    ]
-    return arguments
+class ZipModulesError(Exception):
+    pass
 
 
-def parse_command_line_arguments(args):
-    global _create_conda_env, _requirements_file, _conda_channels, _extension_makefile, _conda_gr_included
+class BuildContext(object):
+    # Configuration of the python plugin for a single build. It is created from the plugin arguments that are passed
+    # to `setup_startup`, so several builds can run concurrently in one process.
+
+    def __init__(self, **kwargs):
+        def is_gr_in_conda_requirements(requirements_file):
+            with codecs.open(requirements_file, 'r', 'utf-8') as f:
+                found_gr = any((line.startswith('gr=') for line in f))
+            return found_gr
 
-    def is_gr_in_conda_requirements(requirements_file):
-        with codecs.open(requirements_file, 'r', 'utf-8') as f:
-            found_gr = any((line.startswith('gr=') for line in f))
-        return found_gr
+        self.requirements_file = kwargs.get('python_conda')
+        self.create_conda_env = self.requirements_file is not None
+        self.conda_channels = kwargs.get('python_conda_channels')
+        self.extension_makefile = kwargs.get('python_extension_makefile')
+        self.conda_gr_included = self.create_conda_env and is_gr_in_conda_requirements(self.requirements_file)
+        self.conda_cache_size = kwargs.get('python_conda_cache_size')
+        self.conda_prune_rules, self.conda_prune_keep_patterns = kwargs.get('python_conda_prune', (None, None))
+        self.conda_dedup = kwargs.get('python_conda_dedup', False)
+        self.zip_modules = kwargs.get('python_zip_modules', False)
+        self.fast_launcher = kwargs.get('python_fast_launcher', False)
+        self.startup_profile_log_dir = kwargs.get('python_startup_profile')
+        self.skip_cf_keys = kwargs.get('python_skip_cf_keys', False)
 
+
+def parse_command_line_arguments(args):
+    # All settings are returned as plugin arguments (prefixed with `python_`); they are passed to every plugin hook and
+    # are part of the inputs of the launcher on incremental updates
     checked_args = {}
     if args.conda_req_file is not None:
         checked_args['python_conda'] = args.conda_req_file
-        _requirements_file = args.conda_req_file
-        _create_conda_env = True
         if args.conda_channels is not None:
-            _conda_channels = args.conda_channels
+            checked_args['python_conda_channels'] = args.conda_channels
         if args.extension_makefile is not None:
-            _extension_makefile = args.extension_makefile
-        _conda_gr_included = is_gr_in_conda_requirements(_requirements_file)
+            checked_args['python_extension_makefile'] = args.extension_makefile
+            # The extension modules are built inside the bundle, so changed sources would not be rebuilt on updates
+            checked_args['incremental_update_unsupported'] = True
+        if args.conda_cache_size > 0:
+            checked_args['python_conda_cache_size'] = args.conda_cache_size
+        if args.fast_launcher:
+            checked_args['python_fast_launcher'] = True
+        prune_rules = []
+        if args.conda_prune:
+            prune_rules.extend(
+                rule for rule in prune.DEFAULT_RULES
+                if args.extension_makefile is None or rule.name not in prune.DEVELOPMENT_RULE_NAMES
+            )
+        if args.conda_prune_exclude_patterns is not None:
+            prune_rules.append(prune.PruneRule(prune.USER_RULE_NAME, tuple(args.conda_prune_exclude_patterns)))
+        if prune_rules:
+            checked_args['python_conda_prune'] = [prune_rules, tuple(args.conda_prune_keep_patterns or ())]
+        if args.conda_dedup:
+            checked_args['python_conda_dedup'] = True
+        if args.zip_modules:
+            checked_args['python_zip_modules'] = True
+            # Changed source files cannot be copied into a bundle whose modules were moved into an archive
+            checked_args['incremental_update_unsupported'] = True
+    if args.startup_profile_log_dir is not None:
+        checked_args['python_startup_profile'] = args.startup_profile_log_dir
+    if args.skip_cf_keys:
+        checked_args['python_skip_cf_keys'] = True
     return checked_args
 
 
@@ -198,12 +337,56 @@ def pre_create_app(**kwargs):
     pass
 
 
-def setup_startup(app_path, executable_path, app_executable_path, executable_root_path, macos_path, resources_path):
-    def create_python_startup_script(main_module, shebang):
+def get_cf_keys(info_plist, new_executable_path):
+    # Returns the keys which are copied into the bundle info dictionary of the python process at startup. The main
+    # bundle of the process is the one of the python interpreter, so the keys of the app always differ from it and
+    # Foundation is only skipped with `--skip-cf-keys`.
+    cf_keys = dict(
+        (key, value) for key, value in info_plist.items()
+        if key.startswith(_CF_KEY_PREFIX) or key in _CF_ADDITIONAL_KEYS
+    )
+    cf_keys['CFBundleExecutable'] = new_executable_path
+    return cf_keys
+
+
+def add_startup_tasks(
+    task_graph,
+    app_path,
+    executable_path,
+    app_executable_path,
+    executable_root_path,
+    macos_path,
+    resources_path,
+    info_plist=None,
+    **kwargs
+):
+    # Adds the tasks which create the startup scripts (and the conda environment) to the build task graph; the task
+    # with the output "startup" returns the path of the new bundle executable
+    def create_python_startup_script(main_module, shebang, cf_keys, module_archives):
+        if context.startup_profile_log_dir is not None:
+            app_name = os.path.splitext(os.path.basename(app_path))[0]
+            profile_log_dir = repr(context.startup_profile_log_dir.replace('{app_name}', app_name))
+        else:
+            profile_log_dir = None
         template = Template(PY_STARTUP_SCRIPT)
-        startup_script = template.render(main_module=main_module, shebang=shebang)
+        startup_script = template.render(
+            main_module=main_module,
+            shebang=shebang,
+            cf_keys=cf_keys,
+            profile_log_dir=profile_log_dir,
+            module_archives=module_archives
+        )
         return startup_script
 
+    def get_cf_keys_literal(new_executable_path):
+        # The keys are rendered as a dict literal, so Info.plist needs not be parsed on every launch
+        if context.skip_cf_keys or info_plist is None:
+            return None
+        cf_keys = get_cf_keys(info_plist, new_executable_path)
+        return '{{{items}}}'.format(
+            items=', '.join('{key!r}: {value!r}'.format(key=key, value=cf_keys[key]) for key in sorted(cf_keys))
+        )
+
     def patch_lib_python(env_path):
         env_path = os.path.abspath(env_path)
         python_dir_path = os.path.join(env_path, 'bin')
@@ -217,23 +400,61 @@ def setup_startup(app_path, executable_path, app_executable_path, executable_roo
         )
         for python_lib_path in python_lib_pathes:
             rel_python_lib_path = os.path.join('@executable_path', os.path.relpath(python_lib_path, python_dir_path))
-            with codecs.open(os.devnull, 'w', 'utf-8') as dummy:
-                try:
-                    subprocess.check_call(
-                        ['install_name_tool', '-id', rel_python_lib_path, python_lib_path], stdout=dummy, stderr=dummy
-                    )
-                except subprocess.CalledProcessError:
-                    raise LibPatchingError('Could not patch the anaconda python library.')
+            try:
+                macho.change_paths(python_lib_path, install_name=rel_python_lib_path)
+            except (macho.MachOError, IOError, OSError):
+                raise LibPatchingError('Could not patch the anaconda python library.')
+
+    def get_target_application_path_prefix():
+        app_name = os.path.splitext(os.path.basename(app_path))[0]
+        return '/Applications/{app_name}.app'.format(app_name=app_name)
+
+    def get_conda_cache_key():
+        hash_object = cache.hash_file(context.requirements_file)
+        cache_inputs = [
+            context.conda_channels or [],
+            list(_CONDA_DEFAULT_PACKAGES),
+            list(_CONDA_DEFAULT_CHANNELS), __version__, context.conda_prune_rules, context.conda_prune_keep_patterns
+        ]
+        hash_object.update(json.dumps(cache_inputs).encode('utf-8'))
+        return hash_object.hexdigest()
+
+    def load_conda_env_from_cache(cache_entry_path):
+        # The cached environment is copied into the bundle with copy-on-write clones where the file system supports
+        # them; hard links would let later changes to the bundle (e.g. the relocation) write through into the cache
+        env_path = os.path.join(resources_path, 'conda_env')
+        fastcopy.copy_tree(
+            os.path.join(cache_entry_path, 'conda_env'), env_path, symlinks=True, preserve_hardlinks=True
+        )
+        for filename in (relocate.RELOCATION_INDEX_FILENAME, relocate.APPLICATION_PATH_PREFIX_FILENAME):
+            shutil.copy(os.path.join(cache_entry_path, filename), os.path.join(resources_path, filename))
+        relocation_index = relocate.read_relocation_index(resources_path)
+        target_application_path_prefix = get_target_application_path_prefix()
+        if relocation_index['prefix'] != target_application_path_prefix:
+            relocate.relocate(resources_path, target_application_path_prefix)
+        return env_path
+
+    def store_conda_env_in_cache(conda_cache, cache_key, env_path):
+        def fill_entry(cache_entry_path):
+            fastcopy.copy_tree(
+                env_path, os.path.join(cache_entry_path, 'conda_env'), symlinks=True, preserve_hardlinks=True
+            )
+            for filename in (relocate.RELOCATION_INDEX_FILENAME, relocate.APPLICATION_PATH_PREFIX_FILENAME):
+                shutil.copy(os.path.join(resources_path, filename), os.path.join(cache_entry_path, filename))
+
+        conda_cache.store(cache_key, fill_entry)
 
     def create_conda_env():
         def create_env():
-            conda_channels = _conda_channels or []
+            conda_channels = context.conda_channels or []
             with codecs.open(os.devnull, 'w', 'utf-8') as dummy:
                 env_path = os.path.join(resources_path, 'conda_env')
                 try:
                     subprocess.check_call(
-                        ['conda', 'create', '-p', env_path, '--file', _requirements_file, '--copy', '--quiet', '--yes']
-                        + list(itertools.chain(*[('-c', channel) for channel in conda_channels])),
+                        [
+                            'conda', 'create', '-p', env_path, '--file', context.requirements_file, '--copy',
+                            '--quiet', '--yes'
+                        ] + list(itertools.chain(*[('-c', channel) for channel in conda_channels])),
                         stdout=dummy,
                         stderr=dummy
                     )
@@ -254,7 +475,8 @@ def setup_startup(app_path, executable_path, app_executable_path, executable_roo
                     raise CondaError('The conda environment could not be installed.')
             return env_path
 
-        env_path = create_env()
+        with trace.stage('conda_create', os.path.join(resources_path, 'conda_env')):
+            env_path = create_env()
         patch_lib_python(env_path)
         return env_path
 
@@ -278,11 +500,11 @@ def setup_startup(app_path, executable_path, app_executable_path, executable_roo
                 for link_dirpath in link_dirpaths:
                     real_dirpath = os.path.realpath(link_dirpath)
                     os.remove(link_dirpath)
-                    shutil.copytree(real_dirpath, os.path.join(root_path, os.path.basename(link_dirpath)))
+                    fastcopy.copy_tree(real_dirpath, os.path.join(root_path, os.path.basename(link_dirpath)))
                 for link_filepath in link_filepaths:
                     real_filepath = os.path.realpath(link_filepath)
                     os.remove(link_filepath)
-                    shutil.copy(real_filepath, os.path.join(root_path, os.path.basename(link_filepath)))
+                    fastcopy.copy_file(real_filepath, os.path.join(root_path, os.path.basename(link_filepath)))
 
         def fix_activate_script():
             DELETE_LINE_PART = 'checkenv'
@@ -341,32 +563,34 @@ def setup_startup(app_path, executable_path, app_executable_path, executable_roo
             full_anaconda_python_packages_path = os.path.join(system_anaconda_root_path, ANACONDA_PYTHON_PACKAGES_PATH)
             full_condaenv_python_packages_path = os.path.join(env_path, CONDAENV_PYTHON_PACKAGES_PATH)
             for package in CONDA_MISSING_PACKAGES:
-                shutil.copytree(
+                fastcopy.copy_tree(
                     os.path.join(full_anaconda_python_packages_path, package),
                     os.path.join(full_condaenv_python_packages_path, package)
                 )
 
+        def prune_conda_env():
+            prune_statistics = prune.prune(env_path, context.conda_prune_rules, context.conda_prune_keep_patterns)
+            for rule_name, (file_count, byte_count) in prune_statistics.items():
+                logging.info(
+                    'pruning rule "%s" removed %d files (%.1f MiB) from the conda environment', rule_name, file_count,
+                    byte_count / (1024 * 1024)
+                )
+
         def fix_application_path_prefix():
-            app_name = os.path.splitext(os.path.basename(app_path))[0]
-            target_application_path_prefix = '/Applications/{app_name}.app'.format(app_name=app_name)
+            target_application_path_prefix = get_target_application_path_prefix()
             current_application_path_prefix = os.path.abspath(os.path.join(env_path, '../../..'))
-            matching_files = subprocess.check_output(
-                ['grep', '-rl', "--exclude='*.pyc'", current_application_path_prefix, env_path]
-            ).strip().split('\n')
-            text_files = []
-            binary_files = []
-            for matching_file in matching_files:
-                if 'charset=binary' in subprocess.check_output(['file', '--mime', matching_file]):
-                    binary_files.append(matching_file)
-                else:
-                    text_files.append(matching_file)
-            for text_file in text_files:
-                sed_pattern = 's!{current_prefix}!{target_prefix}!g'.format(
-                    current_prefix=current_application_path_prefix, target_prefix=target_application_path_prefix
-                )
-                subprocess.check_call(['sed', '-i', '', sed_pattern, text_file])
-            for binary_file in binary_files:
-                binary_replace(binary_file, current_application_path_prefix, target_application_path_prefix)
+            scan_result = prefix_scan.replace_prefix(
+                env_path, current_application_path_prefix, target_application_path_prefix
+            )
+            logging.info(
+                'replaced the application prefix in %d text and %d binary files (%d files, %d bytes scanned)',
+                len(scan_result.text_file_paths), len(scan_result.binary_file_paths), scan_result.files_scanned,
+                scan_result.bytes_read
+            )
+            relocate.write_relocation_index(
+                resources_path, target_application_path_prefix, scan_result.text_file_paths,
+                scan_result.binary_file_paths
+            )
             with codecs.open(os.path.join(env_path, '../application_path_prefix'), 'w', 'utf-8') as f:
                 f.write(target_application_path_prefix)
 
@@ -374,8 +598,114 @@ def setup_startup(app_path, executable_path, app_executable_path, executable_roo
         fix_activate_script()
         fix_conda_shebang()
         copy_missing_conda_packages()
+        if context.conda_prune_rules is not None:
+            with trace.stage('prune_conda_env', env_path):
+                prune_conda_env()
         fix_application_path_prefix()
 
+    def get_activation_exports(env_path):
+        # Compares the environment of a shell before and after sourcing `activate`. Paths into the bundle are
+        # rendered relative to `APP_PREFIX` and changed list variables (like `PATH`) keep their runtime value.
+        def read_environment(shell_command):
+            environment_json = subprocess.check_output(
+                [
+                    'bash', '-c', '{shell_command}"{python}" -c "{print_environment}"'.format(
+                        shell_command=shell_command,
+                        python=sys.executable,
+                        print_environment='import json, os, sys; sys.stdout.write(json.dumps(dict(os.environ)))'
+                    )
+                ]
+            )
+            return json.loads(environment_json.decode('utf-8'))
+
+        def to_shell_string(text):
+            escaped_parts = [
+                re.sub(r'([\\"$`])', r'\\\1', part) for part in text.split(os.path.abspath(app_path))
+            ]
+            return '${APP_PREFIX}'.join(escaped_parts)
+
+        def to_shell_value(name, value):
+            old_value = environment_before.get(name)
+            if old_value and value.endswith(old_value):
+                return to_shell_string(value[:-len(old_value)]) + '${' + name + '}'
+            if old_value and value.startswith(old_value):
+                return '${' + name + '}' + to_shell_string(value[len(old_value):])
+            return to_shell_string(value)
+
+        try:
+            environment_before = read_environment('')
+            environment_after = read_environment(
+                'source "{activate_path}" "{env_path}" >/dev/null 2>&1; '.format(
+                    activate_path=os.path.join(env_path, 'bin/activate'), env_path=env_path
+                )
+            )
+        except (subprocess.CalledProcessError, OSError, ValueError):
+            raise CondaError('The environment of the activated conda environment could not be determined.')
+        exports = []
+        for name in sorted(set(environment_before) | set(environment_after)):
+            if name in _SHELL_VARIABLES or environment_before.get(name) == environment_after.get(name):
+                continue
+            if name in environment_after:
+                exports.append((name, to_shell_value(name, environment_after[name])))
+            else:
+                exports.append((name, None))
+        return exports
+
+    def zip_python_modules(env_path):
+        # Returns the archive paths relative to `macos_path` and if they are searched before or after the default
+        # module search path. The archives are created with the environment's interpreter, so the bytecode matches.
+        relocation_index = relocate.read_relocation_index(resources_path)
+        exclude_list = {
+            'names': [_PY_STARTUP_SCRIPT_NAME],
+            'file_paths': [os.path.join(resources_path, entry['path']) for entry in relocation_index['files']]
+        }
+        site_packages_paths = glob.glob(os.path.join(env_path, 'lib/python*/site-packages'))
+        module_archives = []
+        exclude_list_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
+        try:
+            with exclude_list_file:
+                json.dump(exclude_list, exclude_list_file)
+            for root_path, archive_path, prepend in [
+                (macos_path, os.path.join(resources_path, _APP_MODULES_ARCHIVE_NAME), True)
+            ] + [
+                (site_packages_path, os.path.join(resources_path, _SITE_PACKAGES_ARCHIVE_NAME), False)
+                for site_packages_path in site_packages_paths[:1]
+            ]:
+                try:
+                    summary = json.loads(
+                        subprocess.check_output(
+                            [
+                                os.path.join(env_path, 'bin/python'),
+                                os.path.join(os.path.dirname(__file__), 'util/zip_modules.py'), root_path,
+                                archive_path, exclude_list_file.name
+                            ]
+                        ).decode('utf-8')
+                    )
+                except (subprocess.CalledProcessError, OSError, ValueError):
+                    raise ZipModulesError('The python modules of {path} could not be packed.'.format(path=root_path))
+                logging.info(
+                    'packed %d modules (%d files) of %s into %s, %d modules stay on disk', len(summary['packed_names']),
+                    summary['file_count'], root_path, archive_path, len(summary['skipped_names'])
+                )
+                for name, reason in sorted(summary['skipped_names'].items()):
+                    logging.debug('%s stays on disk: it %s', name, reason)
+                if summary['packed_names']:
+                    module_archives.append((repr(os.path.relpath(archive_path, macos_path)), prepend))
+        finally:
+            os.remove(exclude_list_file.name)
+        return module_archives
+
+    def deduplicate_conda_env(env_path):
+        relocation_index = relocate.read_relocation_index(resources_path)
+        summary = dedup.deduplicate(
+            env_path, [os.path.join(resources_path, entry['path']) for entry in relocation_index['files']]
+        )
+        logging.info(
+            'replaced duplicates in the conda environment with %d hard links and %d symbolic links, saved %.1f MiB '
+            '(%d files scanned in %.2fs)', summary.hardlink_count, summary.symlink_count,
+            summary.bytes_saved / (1024 * 1024), summary.files_scanned, summary.wall_time
+        )
+
     def fix_conda_gr(env_path):
         def create_missing_library_links():
             library_directory = os.path.join(env_path, 'lib')
@@ -390,20 +720,35 @@ def setup_startup(app_path, executable_path, app_executable_path, executable_roo
 
         create_missing_library_links()
 
-    def precompile_python_files():
-        with codecs.open(os.devnull, 'w', 'utf-8') as dummy:
-            try:
-                subprocess.check_call(['python', '-m', 'compileall', macos_path], stdout=dummy, stderr=dummy)
-            except subprocess.CalledProcessError:
-                raise PrecompileError('Python modules could not be precompiled.')
+    def precompile_python_files(env_path, root_paths, ignore_errors=False):
+        # The files are compiled for the python version of the conda environment, so no pyc files need to be written
+        # on the first launch (which fails anyway if the app is installed to a read-only location)
+        try:
+            summary = precompile.precompile(root_paths, os.path.join(env_path, 'bin/python'))
+        except precompile.PrecompileError:
+            raise PrecompileError('Python modules could not be precompiled.')
+        logging.info(
+            'precompiled %d and skipped %d current python files in %.2fs', summary.compiled_count,
+            summary.skipped_count, summary.wall_time
+        )
+        if summary.failed_file_paths:
+            if not ignore_errors:
+                raise PrecompileError(
+                    'Python modules could not be precompiled: {paths}'.format(
+                        paths=', '.join(summary.failed_file_paths)
+                    )
+                )
+            logging.warning('%d python files could not be precompiled', len(summary.failed_file_paths))
 
     def build_extension_modules(env_path):
         def get_makefile_path():
             if executable_root_path is not None and \
-               _extension_makefile.startswith(os.path.abspath(executable_root_path)):
-                makefile_path = os.path.join(macos_path, os.path.relpath(_extension_makefile, executable_root_path))
+               context.extension_makefile.startswith(os.path.abspath(executable_root_path)):
+                makefile_path = os.path.join(
+                    macos_path, os.path.relpath(context.extension_makefile, executable_root_path)
+                )
             else:
-                makefile_path = _extension_makefile
+                makefile_path = context.extension_makefile
             return makefile_path
 
         env_path = os.path.abspath(env_path)
@@ -423,35 +768,169 @@ def setup_startup(app_path, executable_path, app_executable_path, executable_roo
             except subprocess.CalledProcessError:
                 raise ExtensionModuleError('Extension modules could not be built.')
 
-    main_module = os.path.splitext(app_executable_path)[0].replace('/', '.')
-    with codecs.open(executable_path, 'r', 'utf-8') as f:
-        shebang = f.readline().strip()
-    if not shebang.startswith('#!'):
-        shebang = '#!/usr/bin/env python'
-    python_startup_script = create_python_startup_script(main_module, shebang)
-    with codecs.open(os.path.join(macos_path, _PY_STARTUP_SCRIPT_NAME), 'w', 'utf-8') as f:
-        f.write(python_startup_script)
-    if _create_conda_env:
+    def prepare_conda_env():
+        if context.conda_cache_size is not None:
+            conda_cache = cache.DirectoryCache(_CONDA_CACHE_NAME, context.conda_cache_size * 1024 * 1024)
+            conda_cache_key = get_conda_cache_key()
+            with conda_cache.use(conda_cache_key) as cache_entry_path:
+                if cache_entry_path is not None:
+                    logging.info('using the cached conda environment %s', cache_entry_path)
+                    with trace.stage('load_conda_env_from_cache', resources_path):
+                        return load_conda_env_from_cache(cache_entry_path)
+        else:
+            conda_cache = None
         env_path = create_conda_env()
-        make_conda_portable(env_path)
-        if _conda_gr_included:
+        with trace.stage('make_conda_portable', env_path):
+            make_conda_portable(env_path)
+        if context.conda_gr_included:
             fix_conda_gr(env_path)
-        precompile_python_files()
-        if _extension_makefile is not None:
-            build_extension_modules(env_path)
-        env_startup_script = PY_PRE_STARTUP_CONDA_SETUP
-        with codecs.open(os.path.join(macos_path, _ENV_STARTUP_SCRIPT_NAME), 'w',
-                         'utf-8') as f:
-            f.write(env_startup_script)
-        shutil.copy(
-            os.path.join(os.path.dirname(__file__), 'util/binary_replace.py'),
-            os.path.join(resources_path, 'binary_replace.py')
+        # Packages may contain files that are not meant to be compiled (e.g. templates or python 2 only code)
+        with trace.stage('precompile_conda_env', env_path):
+            precompile_python_files(
+                env_path, glob.glob(os.path.join(env_path, 'lib/python*/site-packages')), ignore_errors=True
+            )
+        if conda_cache is not None:
+            with trace.stage('store_conda_env_in_cache'):
+                store_conda_env_in_cache(conda_cache, conda_cache_key, env_path)
+        return env_path
+
+    def write_startup_scripts():
+        # Returns the path of the new bundle executable relative to `macos_path`
+        main_module = os.path.splitext(app_executable_path)[0].replace('/', '.')
+        with codecs.open(executable_path, 'r', 'utf-8') as f:
+            shebang = f.readline().strip()
+        if not shebang.startswith('#!'):
+            shebang = '#!/usr/bin/env python'
+        new_executable_path = _ENV_STARTUP_SCRIPT_NAME if context.create_conda_env else _PY_STARTUP_SCRIPT_NAME
+        module_archives = task_graph.get_result('module_archives') if task_graph.has_output('module_archives') else []
+        if context.create_conda_env:
+            env_path = task_graph.get_result('conda_env')
+            if context.fast_launcher:
+                env_startup_script = Template(PY_PRE_STARTUP_CONDA_FAST_SETUP).render(
+                    exports=get_activation_exports(env_path),
+                    profile_startup=context.startup_profile_log_dir is not None
+                )
+            else:
+                env_startup_script = Template(PY_PRE_STARTUP_CONDA_SETUP).render(
+                    profile_startup=context.startup_profile_log_dir is not None
+                )
+            with codecs.open(os.path.join(macos_path, _ENV_STARTUP_SCRIPT_NAME), 'w', 'utf-8') as f:
+                f.write(env_startup_script)
+            shutil.copy(
+                os.path.join(os.path.dirname(__file__), 'util/relocate.py'),
+                os.path.join(resources_path, 'relocate.py')
+            )
+        python_startup_script = create_python_startup_script(
+            main_module, shebang, get_cf_keys_literal(new_executable_path), module_archives
+        )
+        with codecs.open(os.path.join(macos_path, _PY_STARTUP_SCRIPT_NAME), 'w', 'utf-8') as f:
+            f.write(python_startup_script)
+        if context.startup_profile_log_dir is not None:
+            shutil.copy(
+                os.path.join(os.path.dirname(__file__), 'util/startup_report.py'),
+                os.path.join(resources_path, 'startup_report.py')
+            )
+        return new_executable_path
+
+    context = BuildContext(**kwargs)
+    if context.create_conda_env:
+        # The conda environment is created in the resources directory, so it does not depend on the source copy and
+        # both can run concurrently
+        task_graph.add(
+            'prepare_conda_env',
+            prepare_conda_env,
+            outputs=('conda_env', ),
+            output_path=os.path.join(resources_path, 'conda_env')
         )
-        new_executable_path = _ENV_STARTUP_SCRIPT_NAME
-    else:
-        new_executable_path = _PY_STARTUP_SCRIPT_NAME
+        task_graph.add(
+            'precompile_python_files',
+            lambda: precompile_python_files(task_graph.get_result('conda_env'), [macos_path]),
+            inputs=('source', 'conda_env'),
+            outputs=('compiled_source', ),
+            output_path=macos_path
+        )
+        if context.extension_makefile is not None:
+            task_graph.add(
+                'build_extension_modules',
+                lambda: build_extension_modules(task_graph.get_result('conda_env')),
+                inputs=('compiled_source', 'conda_env'),
+                outputs=('extension_modules', ),
+                output_path=macos_path
+            )
+        if context.zip_modules:
+            task_graph.add(
+                'zip_python_modules',
+                lambda: zip_python_modules(task_graph.get_result('conda_env')),
+                inputs=('compiled_source', 'extension_modules', 'conda_env'),
+                outputs=('module_archives', ),
+                output_path=resources_path
+            )
+        if context.conda_dedup:
+            # Deduplication runs after the modules are packed: relative symbolic links to files that are removed after
+            # packing would be left dangling
+            task_graph.add(
+                'deduplicate_conda_env',
+                lambda: deduplicate_conda_env(task_graph.get_result('conda_env')),
+                inputs=('conda_env', 'module_archives'),
+                outputs=('deduplicated_conda_env', ),
+                output_path=os.path.join(resources_path, 'conda_env')
+            )
+    task_graph.add(
+        'write_startup_scripts',
+        write_startup_scripts,
+        inputs=(
+            'source', 'conda_env', 'compiled_source', 'extension_modules', 'module_archives', 'deduplicated_conda_env'
+        ),
+        outputs=('startup', ),
+        output_path=macos_path
+    )
+
+
+def update_app(app_path, macos_path, resources_path, changed_paths, **kwargs):
+    # The pyc files of changed source files were removed with them, so they are compiled again for the python version
+    # of the conda environment
+    context = BuildContext(**kwargs)
+    source_paths = [
+        os.path.join(macos_path, relative_path) for relative_path in changed_paths if relative_path.endswith('.py')
+    ]
+    if not context.create_conda_env or not source_paths:
+        return
+    try:
+        summary = precompile.precompile(source_paths, os.path.join(resources_path, 'conda_env/bin/python'))
+    except precompile.PrecompileError:
+        raise PrecompileError('Python modules could not be precompiled.')
+    logging.info('precompiled %d changed python files', summary.compiled_count)
+    if summary.failed_file_paths:
+        raise PrecompileError(
+            'Python modules could not be precompiled: {paths}'.format(paths=', '.join(summary.failed_file_paths))
+        )
+
 
-    return new_executable_path
+def setup_startup(
+    app_path,
+    executable_path,
+    app_executable_path,
+    executable_root_path,
+    macos_path,
+    resources_path,
+    info_plist=None,
+    **kwargs
+):
+    # Runs the startup tasks one after another (the source files must have been copied already)
+    task_graph = scheduler.TaskGraph()
+    add_startup_tasks(
+        task_graph,
+        app_path,
+        executable_path,
+        app_executable_path,
+        executable_root_path,
+        macos_path,
+        resources_path,
+        info_plist=info_plist,
+        **kwargs
+    )
+    task_graph.run(1)
+    return task_graph.get_result('startup')
 
 
 def post_create_app(**kwargs):
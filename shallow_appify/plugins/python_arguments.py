@@ -0,0 +1,185 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import os.path
+from .util import prune
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+# The command line arguments of the python plugin are kept apart from the plugin itself, so the argument parser can be
+# built without importing the plugin and its dependencies
+
+_plugin_name_ = 'Python'
+_file_ext_ = 'py'
+
+_EXT_PYLIB_VARIABLE = 'PYLIBPATH'
+_EXT_MAKEFILE_TARGET = 'app_extension_modules'
+_CONDA_CACHE_DEFAULT_SIZE = 0  # in MiB, the cache is disabled by default
+_STARTUP_PROFILE_DEFAULT_LOG_DIR = '~/Library/Logs/{app_name}'
+
+
+def get_command_line_arguments():
+    arguments = [
+        (
+            ('--conda', ), {
+                'dest':
+                'conda_req_file',
+                'action':
+                'store',
+                'type':
+                os.path.abspath,
+                'help':
+                'Creates a miniconda environment from the given conda requirements file '
+                'and includes it in the app bundle. Can be used to create self-contained '
+                'python apps.'
+            }
+        ), (
+            ('--conda-channels', ), {
+                'dest':
+                'conda_channels',
+                'action':
+                'store',
+                'nargs':
+                '+',
+                'help':
+                'A list of custom conda channels to install packages that are not '
+                'included in the main anaconda distribution.'
+            }
+        ), (
+            ('--extension-makefile', ), {
+                'dest':
+                'extension_makefile',
+                'action':
+                'store',
+                'type':
+                os.path.abspath,
+                'help':
+                'Path to a makefile for building python extension modules. The '
+                'makefile is called with the target "{target}" and a variable '
+                '"{libvariable}" that holds the path to the conda python '
+                'library.'.format(target=_EXT_MAKEFILE_TARGET, libvariable=_EXT_PYLIB_VARIABLE)
+            }
+        ), (
+            ('--conda-cache-size', ), {
+                'dest':
+                'conda_cache_size',
+                'action':
+                'store',
+                'type':
+                int,
+                'default':
+                _CONDA_CACHE_DEFAULT_SIZE,
+                'help':
+                'Maximum size in MiB of the local cache of finished conda environments (default: {default}, '
+                'disabled). Builds with an unchanged requirements file, channel list and shallow-appify version '
+                'reuse a cached environment instead of creating a new one.'.format(default=_CONDA_CACHE_DEFAULT_SIZE)
+            }
+        ), (
+            ('--conda-prune', ), {
+                'dest':
+                'conda_prune',
+                'action':
+                'store_true',
+                'help':
+                'Removes files that are not needed at runtime from the conda environment: {rules}. Headers, static '
+                'libraries and build configuration files are kept if --extension-makefile is given.'.format(
+                    rules=', '.join(rule.name.replace('_', ' ') for rule in prune.DEFAULT_RULES)
+                )
+            }
+        ), (
+            ('--conda-prune-exclude', ), {
+                'dest':
+                'conda_prune_exclude_patterns',
+                'action':
+                'store',
+                'nargs':
+                '+',
+                'metavar':
+                'PATTERN',
+                'help':
+                'Additional glob patterns of paths (relative to the conda environment root) that are removed from '
+                'the conda environment. "*" also matches "/".'
+            }
+        ), (
+            ('--conda-prune-keep', ), {
+                'dest':
+                'conda_prune_keep_patterns',
+                'action':
+                'store',
+                'nargs':
+                '+',
+                'metavar':
+                'PATTERN',
+                'help':
+                'Glob patterns of paths (relative to the conda environment root) that are never removed from the '
+                'conda environment.'
+            }
+        ), (
+            ('--conda-dedup', ), {
+                'dest':
+                'conda_dedup',
+                'action':
+                'store_true',
+                'help':
+                'Replaces byte-identical files of the conda environment with hard links (or relative symbolic links '
+                'if hard links are not possible). Files that are patched on relocation are not linked.'
+            }
+        ), (
+            ('--skip-cf-keys', ), {
+                'dest':
+                'skip_cf_keys',
+                'action':
+                'store_true',
+                'help':
+                'Does not copy the CoreFoundation keys of Info.plist into the bundle info dictionary of the python '
+                'process at startup. This avoids importing Foundation (PyObjC) on every launch, but the app may be '
+                'shown as "Python" in the menu bar.'
+            }
+        ), (
+            ('--fast-launcher', ), {
+                'dest':
+                'fast_launcher',
+                'action':
+                'store_true',
+                'help':
+                'Uses a launcher script that sets the environment variables of the conda environment directly '
+                '(determined at build time) instead of sourcing its activate script on every launch. Only used with '
+                '--conda.'
+            }
+        ), (
+            ('--zip-modules', ), {
+                'dest':
+                'zip_modules',
+                'action':
+                'store_true',
+                'help':
+                'Packs the pure python modules and packages of the app and of the conda site-packages into zip '
+                'archives of bytecode, so fewer files are searched on startup. Modules with native extensions or '
+                'data files and modules that access __file__ or __path__ stay on disk. Only used with --conda.'
+            }
+        ), (
+            ('--startup-profile', ), {
+                'dest':
+                'startup_profile_log_dir',
+                'action':
+                'store',
+                'nargs':
+                '?',
+                'const':
+                _STARTUP_PROFILE_DEFAULT_LOG_DIR,
+                'metavar':
+                'LOG_DIR',
+                'help':
+                'Records the startup time and the time spent importing each module on every launch of the app to '
+                'a rotating log file in the given directory (default: "{default}"; "~" and "{{app_name}}" are '
+                'expanded). The logs can be summarized with "shallow-appify-startup-report" or the bundled script '
+                '"Contents/Resources/startup_report.py".'.format(default=_STARTUP_PROFILE_DEFAULT_LOG_DIR)
+            }
+        )
+    ]
+    return arguments
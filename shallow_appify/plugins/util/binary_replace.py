@@ -6,6 +6,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import mmap
+import os
 import re
 import sys
 
@@ -19,40 +21,101 @@ else:
     Text = str
 
 
-def binary_replace(file_path, old, new):
+def _encode(text):
+    if isinstance(text, Text):
+        text = text.encode('utf-8')
+    return text
+
+
+def _find_replacements(data, old_to_new):
+    # Longer patterns come first, so they win if several patterns start at the same position
+    olds = sorted(old_to_new, key=len, reverse=True)
+    # One alternative per pattern: each pattern needs its own number of fill bytes behind the terminating NUL
+    fill_lens = dict((old, max(0, len(old_to_new[old]) - len(old))) for old in olds)
+    pattern = re.compile(
+        b'|'.join(
+            b'(' + re.escape(old) + b'[^\0]*?\0' + ('.{%d}' % fill_lens[old]).encode('ascii') + b')' for old in olds
+        )
+    )
+    # Replaces all patterns found in a matched string in a single pass, like separate calls would do
+    old_pattern = re.compile(b'|'.join(re.escape(old) for old in olds))
+    hit_counts = dict((old, 0) for old in olds)
+
     def replace(match):
-        old_text = match.group()
-        new_text = old_text.replace(old, new)
-        if len(new) > len(old):
-            new_text = new_text[:len(old_text)]
-            padding = 0
-        else:
-            padding = len(old_text) - len(new_text)
-        return new_text + b'\0' * padding
-
-    if isinstance(old, Text):
-        old = old.encode('utf-8')
-    if isinstance(new, Text):
-        new = new.encode('utf-8')
+        hit_counts[match.group()] += 1
+        return old_to_new[match.group()]
+
+    def find():
+        # `data` may be a memory map, so the regular expression engine scans the file without reading it into memory
+        # at once; only the matched (NUL terminated) strings are copied.
+        for match in pattern.finditer(data):
+            old_text = match.group()
+            new_text = old_pattern.sub(replace, old_text)
+            if len(new_text) > len(old_text):
+                new_text = new_text[:len(old_text)]
+            else:
+                new_text += b'\0' * (len(old_text) - len(new_text))
+            if new_text != old_text:
+                yield match.start(), new_text
+
+    return find(), hit_counts
+
+
+def binary_replace_multiple(file_path, old_to_new):
+    old_to_new = dict((_encode(old), _encode(new)) for old, new in old_to_new.items() if old)
+    hit_counts = dict((old, 0) for old in old_to_new)
+    if not old_to_new or os.path.getsize(file_path) == 0:
+        return hit_counts
+    # Scan a read-only mapping with a single pass of the combined pattern first, so files without any match are never
+    # opened for writing
     with open(file_path, 'rb') as f:
-        data = f.read()
-    unpatched_data_len = len(data)
-    fill_len = max(0, len(new) - len(old))
-    pattern = re.compile(re.escape(old) + b'([^\0]*?)\0' + ('.{%d}' % fill_len))
-    data = pattern.sub(replace, data)
-    assert (unpatched_data_len == len(data))
-    with open(file_path, 'wb') as f:
-        f.write(data)
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            replacements, hit_counts = _find_replacements(data, old_to_new)
+            replacements = list(replacements)
+        finally:
+            data.close()
+    if not replacements:
+        return hit_counts
+    # Write back only the changed byte ranges, the file size never changes
+    with open(file_path, 'r+b') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+        try:
+            for offset, new_text in replacements:
+                data[offset:offset + len(new_text)] = new_text
+            data.flush()
+        finally:
+            data.close()
+    return hit_counts
+
+
+def binary_replace(file_path, old, new):
+    old = _encode(old)
+    return binary_replace_multiple(file_path, {old: new})[old]
 
 
 def main():
-    if len(sys.argv) < 4:
-        print('Usage: {name} file_path old_string new_string'.format(name=sys.argv[0]))
+    args = sys.argv[1:]
+    print_stats = ('--stats' in args)
+    if print_stats:
+        args.remove('--stats')
+    if len(args) < 3 or len(args) % 2 != 1:
+        print(
+            'Usage: {name} [--stats] file_path old_string new_string [old_string new_string ...]'.format(
+                name=sys.argv[0]
+            )
+        )
         print('       Opens a binary file and replaces every occurance of old_string with new_string.')
+        print('       All given string pairs are replaced in a single pass over the file. With --stats, the number of')
+        print('       replacements is printed for every old_string.')
         sys.exit(0)
 
-    file_path, old_string, new_string = sys.argv[1:4]
-    binary_replace(file_path, old_string, new_string)
+    file_path = args[0]
+    old_strings, new_strings = args[1::2], args[2::2]
+    hit_counts = binary_replace_multiple(file_path, dict(zip(old_strings, new_strings)))
+    if print_stats:
+        for old_string in old_strings:
+            print('{old_string}: {count}'.format(old_string=old_string, count=hit_counts[_encode(old_string)]))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,98 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import collections
+import errno
+import multiprocessing
+import os
+import os.path
+import stat
+import time
+from multiprocessing.pool import ThreadPool
+from ... import cache
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+DedupSummary = collections.namedtuple(
+    'DedupSummary', ('files_scanned', 'hardlink_count', 'symlink_count', 'bytes_saved', 'wall_time')
+)
+
+# Errors which indicate that a hard link cannot be created and a symbolic link must be used instead
+_HARDLINK_ERRNOS = tuple(
+    getattr(errno, name) for name in ('EXDEV', 'EMLINK', 'EPERM', 'ENOTSUP', 'EOPNOTSUPP') if hasattr(errno, name)
+)
+
+
+def _group_by_size(root_path, excluded_file_paths):
+    # Files with the same size and permissions are candidates; files that are already hard linked to each other are
+    # only considered once. Python sources must also have the same modification time: a linked source gets the mtime of
+    # the original, which would invalidate the precompiled pyc file of the duplicate.
+    candidates = collections.defaultdict(dict)
+    files_scanned = 0
+    for current_root_path, _, filenames in os.walk(root_path):
+        for filename in filenames:
+            file_path = os.path.join(current_root_path, filename)
+            if file_path in excluded_file_paths:
+                continue
+            stat_result = os.lstat(file_path)
+            if not stat.S_ISREG(stat_result.st_mode) or stat_result.st_size == 0:
+                continue
+            files_scanned += 1
+            source_mtime = int(stat_result.st_mtime) if filename.endswith('.py') else None
+            group = candidates[(stat_result.st_size, stat.S_IMODE(stat_result.st_mode), source_mtime)]
+            group.setdefault((stat_result.st_dev, stat_result.st_ino), file_path)
+    return [sorted(group.values()) for group in candidates.values() if len(group) > 1], files_scanned
+
+
+def _replace_with_link(original_path, duplicate_path):
+    # Returns `True` if a hard link and `False` if a relative symbolic link was created. The duplicate is replaced
+    # atomically, so it never disappears if linking fails.
+    tmp_link_path = '{path}.dedup{pid}'.format(path=duplicate_path, pid=os.getpid())
+    try:
+        os.link(original_path, tmp_link_path)
+        is_hardlink = True
+    except OSError as e:
+        if e.errno not in _HARDLINK_ERRNOS:
+            raise
+        os.symlink(os.path.relpath(original_path, os.path.dirname(duplicate_path)), tmp_link_path)
+        is_hardlink = False
+    os.rename(tmp_link_path, duplicate_path)
+    return is_hardlink
+
+
+def deduplicate(root_path, excluded_file_paths=(), num_workers=None):
+    # Replaces byte-identical files below `root_path` with links to the first of them (in path order). Files in
+    # `excluded_file_paths` (e.g. files that are patched on relocation) are never linked.
+    start_time = time.time()
+    excluded_file_paths = frozenset(os.path.abspath(file_path) for file_path in excluded_file_paths)
+    size_groups, files_scanned = _group_by_size(os.path.abspath(root_path), excluded_file_paths)
+    file_paths = [file_path for size_group in size_groups for file_path in size_group]
+    pool = ThreadPool(num_workers or multiprocessing.cpu_count())
+    try:
+        file_hashes = dict(
+            zip(file_paths, pool.map(lambda file_path: cache.hash_file(file_path).digest(), file_paths, chunksize=8))
+        )
+    finally:
+        pool.close()
+        pool.join()
+    hardlink_count = 0
+    symlink_count = 0
+    bytes_saved = 0
+    for size_group in size_groups:
+        hash_groups = collections.OrderedDict()
+        for file_path in size_group:
+            hash_groups.setdefault(file_hashes[file_path], []).append(file_path)
+        for hash_group in hash_groups.values():
+            original_path = hash_group[0]
+            for duplicate_path in hash_group[1:]:
+                if _replace_with_link(original_path, duplicate_path):
+                    hardlink_count += 1
+                else:
+                    symlink_count += 1
+                bytes_saved += os.path.getsize(original_path)
+    return DedupSummary(files_scanned, hardlink_count, symlink_count, bytes_saved, time.time() - start_time)
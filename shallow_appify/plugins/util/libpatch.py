@@ -5,25 +5,30 @@ from __future__ import unicode_literals
 from __future__ import division
 from __future__ import absolute_import
 
+import collections
 import logging
+import multiprocessing
 import os
 import os.path
 import re
-from .command import exec_cmd
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from . import macho
 
 __author__ = 'Ingo Heimbach'
 __email__ = 'i.heimbach@fz-juelich.de'
 
+_LIB_NAME_PATTERN = re.compile(r'.+\.(dylib|so)$')
+
+PatchSummary = collections.namedtuple('PatchSummary', ('libraries_visited', 'references_rewritten', 'wall_time'))
+
+_dependency_cache = {}
+_dependency_cache_lock = threading.Lock()
+
 
 def extract_dependencies(lib_path, dependency_path_prefix):
-    dependency_output = exec_cmd('otool -L', lib_path)
-    dependencies = []
-    for line in dependency_output.split('\n'):
-        match_obj = re.match(r'\s+({prefix}[A-Za-z0-9_/.]+) \('.format(prefix=dependency_path_prefix), line)
-        if match_obj:
-            current_dependency = match_obj.group(1)
-            dependencies.append(current_dependency)
-    return dependencies
+    return [dependency for dependency in read_dependencies(lib_path) if dependency.startswith(dependency_path_prefix)]
 
 
 def replace_install_name(lib_path, new_install_name_prefix):
@@ -32,34 +37,133 @@ def replace_install_name(lib_path, new_install_name_prefix):
         new_install_name_prefix=new_install_name_prefix, lib_name=lib_name
     )
     logging.debug('set new install name %s', new_install_name)
-    exec_cmd('install_name_tool -id', new_install_name, lib_path)
+    macho.change_paths(lib_path, install_name=new_install_name)
 
 
-def replace_dependency(lib_path, old_dependency, new_dependency_prefix):
+def get_new_dependency(old_dependency, new_dependency_prefix):
     old_dependency_lib_name = os.path.basename(old_dependency)
     new_dependency = '{new_dependency_prefix}{lib_name}'.format(
         new_dependency_prefix=new_dependency_prefix, lib_name=old_dependency_lib_name
     )
+    return new_dependency
+
+
+def replace_dependency(lib_path, old_dependency, new_dependency_prefix):
+    new_dependency = get_new_dependency(old_dependency, new_dependency_prefix)
     logging.debug('replace dependency %s with %s', old_dependency, new_dependency)
-    exec_cmd('install_name_tool -change', old_dependency, new_dependency, lib_path)
+    macho.change_paths(lib_path, {old_dependency: new_dependency})
 
 
-def patch_lib(lib_path, old_dependency_prefix, new_dependency_prefix):
+def read_dependencies(lib_path):
+    # Parsed dependencies are cached until the library changes on disk
+    stat_result = os.stat(lib_path)
+    cache_key = (stat_result.st_size, stat_result.st_mtime)
+    with _dependency_cache_lock:
+        cache_entry = _dependency_cache.get(lib_path)
+    if cache_entry is not None and cache_entry[0] == cache_key:
+        return cache_entry[1]
+    dependencies = tuple(macho.read_paths(lib_path).dependencies)
+    with _dependency_cache_lock:
+        _dependency_cache[lib_path] = (cache_key, dependencies)
+    return dependencies
+
+
+def get_dependency_changes(dependencies, old_to_new_dependency_prefix_dict):
+    # The prefix pairs are applied one after another like separate `patch_lib` calls, so a dependency rewritten by one
+    # pair can be matched by the following ones
+    dependency_changes = {}
+    for dependency in dependencies:
+        new_dependency = dependency
+        for old_dependency_prefix, new_dependency_prefix in old_to_new_dependency_prefix_dict.items():
+            if new_dependency.startswith(old_dependency_prefix):
+                new_dependency = get_new_dependency(new_dependency, new_dependency_prefix)
+        if new_dependency != dependency:
+            dependency_changes[dependency] = new_dependency
+    return dependency_changes
+
+
+def apply_dependency_changes(lib_path, dependency_changes):
+    if not dependency_changes:
+        return 0
     logging.debug('patching library %s', lib_path)
-    # lib_name = os.path.basename(lib_path)
-    lib_dependencies = extract_dependencies(lib_path, old_dependency_prefix)
-    # replace_install_name(lib_path, new_dependency_prefix) # it is not necessary to change the install name
-    for dependency in lib_dependencies:
-        replace_dependency(lib_path, dependency, new_dependency_prefix)
+    for old_dependency, new_dependency in sorted(dependency_changes.items()):
+        logging.debug('replace dependency %s with %s', old_dependency, new_dependency)
+    # All dependencies are rewritten with a single read and write of the library
+    changed_command_count = macho.change_paths(lib_path, dependency_changes)
+    with _dependency_cache_lock:
+        _dependency_cache.pop(lib_path, None)
+    return changed_command_count
+
+
+def patch_lib_dependencies(lib_path, old_to_new_dependency_prefix_dict):
+    # it is not necessary to change the install name
+    dependency_changes = get_dependency_changes(read_dependencies(lib_path), old_to_new_dependency_prefix_dict)
+    return apply_dependency_changes(lib_path, dependency_changes)
+
+
+def patch_lib(lib_path, old_dependency_prefix, new_dependency_prefix):
+    return patch_lib_dependencies(lib_path, {old_dependency_prefix: new_dependency_prefix})
 
 
 def list_libs_from_directory(dir_path):
-    return tuple((os.path.join(dir_path, lib) for lib in os.listdir(dir_path) if re.match(r'.+\.((dylib)|(so))', lib)))
+    return tuple((os.path.join(dir_path, lib) for lib in os.listdir(dir_path) if _LIB_NAME_PATTERN.match(lib)))
 
 
-def patch_libs(lib_dir_paths, old_to_new_dependency_prefix_dict):
+def find_libs(root_paths):
+    # Symbolic links are skipped, so every library is visited exactly once
+    lib_paths = []
+    for root_path in root_paths:
+        for current_root_path, _, filenames in os.walk(root_path):
+            lib_paths.extend(
+                os.path.join(current_root_path, filename)
+                for filename in filenames if _LIB_NAME_PATTERN.match(filename)
+                and not os.path.islink(os.path.join(current_root_path, filename))
+            )
+    return sorted(set(lib_paths))
+
+
+def build_dependency_graph(lib_paths, num_workers=None):
+    def read_lib(lib_path):
+        try:
+            return lib_path, read_dependencies(lib_path)
+        except macho.MachOError:
+            logging.debug('skipping %s which is no Mach-O library', lib_path)
+            return lib_path, None
+
+    pool = ThreadPool(num_workers or multiprocessing.cpu_count())
+    try:
+        dependency_graph = dict(
+            (lib_path, dependencies)
+            for lib_path, dependencies in pool.imap_unordered(read_lib, lib_paths) if dependencies is not None
+        )
+    finally:
+        pool.close()
+        pool.join()
+    return dependency_graph
+
+
+def patch_libs(lib_dir_paths, old_to_new_dependency_prefix_dict, num_workers=None):
+    start_time = time.time()
     for lib_dir_path in lib_dir_paths:
         logging.debug('current library directory: %s', lib_dir_path)
-        for lib_path in list_libs_from_directory(lib_dir_path):
-            for old_dependency_prefix, new_dependency_prefix in old_to_new_dependency_prefix_dict.iteritems():
-                patch_lib(lib_path, old_dependency_prefix, new_dependency_prefix)
+    dependency_graph = build_dependency_graph(find_libs(lib_dir_paths), num_workers)
+    lib_dependency_changes = [
+        (lib_path, get_dependency_changes(dependencies, old_to_new_dependency_prefix_dict))
+        for lib_path, dependencies in sorted(dependency_graph.items())
+    ]
+    pool = ThreadPool(num_workers or multiprocessing.cpu_count())
+    try:
+        references_rewritten = sum(
+            pool.imap_unordered(
+                lambda lib_path_and_changes: apply_dependency_changes(*lib_path_and_changes), lib_dependency_changes
+            )
+        )
+    finally:
+        pool.close()
+        pool.join()
+    summary = PatchSummary(len(dependency_graph), references_rewritten, time.time() - start_time)
+    logging.debug(
+        'patched %d references in %d libraries in %.2f seconds', summary.references_rewritten,
+        summary.libraries_visited, summary.wall_time
+    )
+    return summary
@@ -0,0 +1,261 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import collections
+import struct
+import subprocess
+import sys
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+FAT_MAGIC = 0xcafebabe
+FAT_MAGIC_64 = 0xcafebabf
+MH_MAGIC = 0xfeedface
+MH_MAGIC_64 = 0xfeedfacf
+
+LC_SEGMENT = 0x1
+LC_LOAD_DYLIB = 0xc
+LC_ID_DYLIB = 0xd
+LC_SEGMENT_64 = 0x19
+LC_LAZY_LOAD_DYLIB = 0x20
+LC_LOAD_WEAK_DYLIB = 0x80000018
+LC_CODE_SIGNATURE = 0x1d
+LC_RPATH = 0x8000001c
+LC_REEXPORT_DYLIB = 0x8000001f
+LC_LOAD_UPWARD_DYLIB = 0x80000023
+DEPENDENCY_COMMANDS = (LC_LOAD_DYLIB, LC_LOAD_WEAK_DYLIB, LC_REEXPORT_DYLIB, LC_LAZY_LOAD_DYLIB, LC_LOAD_UPWARD_DYLIB)
+
+# Java class files share the fat magic number but have a much larger value at the position of the architecture count
+_MAX_FAT_ARCH_COUNT = 30
+
+LoadCommandPaths = collections.namedtuple('LoadCommandPaths', ('install_name', 'dependencies', 'rpaths'))
+
+
+class MachOError(Exception):
+    pass
+
+
+class NotMachOError(MachOError):
+    pass
+
+
+class InsufficientHeaderSpaceError(MachOError):
+    pass
+
+
+class CodeSignatureError(MachOError):
+    pass
+
+
+class _Slice(object):
+    def __init__(self, f, offset):
+        f.seek(offset)
+        header_start = f.read(4)
+        if len(header_start) < 4:
+            raise NotMachOError('The file is too short for a Mach-O header.')
+        if struct.unpack('<I', header_start)[0] in (MH_MAGIC, MH_MAGIC_64):
+            self.endian = '<'
+        elif struct.unpack('>I', header_start)[0] in (MH_MAGIC, MH_MAGIC_64):
+            self.endian = '>'
+        else:
+            raise NotMachOError('No Mach-O magic number found at offset {offset}.'.format(offset=offset))
+        magic = struct.unpack(self.endian + 'I', header_start)[0]
+        self.is_64 = (magic == MH_MAGIC_64)
+        self.offset = offset
+        self.header_size = 32 if self.is_64 else 28
+        self.alignment = 8 if self.is_64 else 4
+        header = header_start + f.read(self.header_size - 4)
+        self.ncmds, self.sizeofcmds = struct.unpack(self.endian + '2I', header[16:24])
+        load_commands_data = f.read(self.sizeofcmds)
+        if len(load_commands_data) < self.sizeofcmds:
+            raise MachOError('The load commands are truncated.')
+        self.commands = []
+        position = 0
+        for _ in range(self.ncmds):
+            cmd, cmdsize = struct.unpack(self.endian + '2I', load_commands_data[position:position + 8])
+            if cmdsize < 8 or position + cmdsize > self.sizeofcmds:
+                raise MachOError('Invalid load command size {cmdsize}.'.format(cmdsize=cmdsize))
+            self.commands.append([cmd, load_commands_data[position:position + cmdsize]])
+            position += cmdsize
+        self.data_start = self._find_data_start()
+
+    def _find_data_start(self):
+        # Load commands may grow into the padding between their end and the first section contents
+        data_start = None
+        for cmd, data in self.commands:
+            if cmd == LC_SEGMENT_64:
+                fileoff, filesize = struct.unpack(self.endian + '2Q', data[40:56])
+                nsects = struct.unpack(self.endian + 'I', data[64:68])[0]
+                sections_start, section_size, section_offset_position = 72, 80, 48
+            elif cmd == LC_SEGMENT:
+                fileoff, filesize = struct.unpack(self.endian + '2I', data[32:40])
+                nsects = struct.unpack(self.endian + 'I', data[48:52])[0]
+                sections_start, section_size, section_offset_position = 56, 68, 40
+            else:
+                continue
+            if fileoff > 0 and filesize > 0:
+                data_start = fileoff if data_start is None else min(data_start, fileoff)
+            for i in range(nsects):
+                position = sections_start + i * section_size + section_offset_position
+                section_offset = struct.unpack(self.endian + 'I', data[position:position + 4])[0]
+                if section_offset > 0:
+                    data_start = section_offset if data_start is None else min(data_start, section_offset)
+        return data_start
+
+    def _read_string(self, data):
+        string_offset = struct.unpack(self.endian + 'I', data[8:12])[0]
+        return data[string_offset:].split(b'\0', 1)[0].decode('utf-8')
+
+    def _replace_string(self, data, new_string):
+        string_offset = struct.unpack(self.endian + 'I', data[8:12])[0]
+        encoded_string = new_string.encode('utf-8') + b'\0'
+        cmdsize = len(data)
+        if string_offset + len(encoded_string) > cmdsize:
+            cmdsize = string_offset + len(encoded_string)
+            cmdsize += -cmdsize % self.alignment
+        new_data = data[:string_offset] + encoded_string
+        new_data += b'\0' * (cmdsize - len(new_data))
+        return new_data[:4] + struct.pack(self.endian + 'I', cmdsize) + new_data[8:]
+
+    def paths(self):
+        install_name = None
+        dependencies = []
+        rpaths = []
+        for cmd, data in self.commands:
+            if cmd == LC_ID_DYLIB:
+                install_name = self._read_string(data)
+            elif cmd in DEPENDENCY_COMMANDS:
+                dependencies.append(self._read_string(data))
+            elif cmd == LC_RPATH:
+                rpaths.append(self._read_string(data))
+        return LoadCommandPaths(install_name, dependencies, rpaths)
+
+    def is_signed(self):
+        return any(cmd == LC_CODE_SIGNATURE for cmd, _ in self.commands)
+
+    def change_paths(self, dependency_changes, install_name, rpath_changes):
+        changed_command_count = 0
+        for command in self.commands:
+            cmd, data = command
+            if cmd == LC_ID_DYLIB and install_name is not None:
+                new_path = install_name
+            elif cmd in DEPENDENCY_COMMANDS:
+                new_path = dependency_changes.get(self._read_string(data))
+            elif cmd == LC_RPATH:
+                new_path = rpath_changes.get(self._read_string(data))
+            else:
+                continue
+            if new_path is not None and new_path != self._read_string(data):
+                command[1] = self._replace_string(data, new_path)
+                changed_command_count += 1
+        return changed_command_count
+
+    def load_commands_data(self):
+        load_commands_data = b''.join(data for _, data in self.commands)
+        available_size = (self.data_start if self.data_start is not None else float('inf')) - self.header_size
+        if len(load_commands_data) > available_size:
+            raise InsufficientHeaderSpaceError(
+                'The load commands need {needed} bytes but only {available} bytes are available.'.format(
+                    needed=len(load_commands_data), available=available_size
+                )
+            )
+        return load_commands_data
+
+    def write(self, f):
+        load_commands_data = self.load_commands_data()
+        padding = b'\0' * max(0, self.sizeofcmds - len(load_commands_data))
+        f.seek(self.offset + 20)
+        f.write(struct.pack(self.endian + 'I', len(load_commands_data)))
+        f.seek(self.offset + self.header_size)
+        f.write(load_commands_data + padding)
+        self.sizeofcmds = len(load_commands_data)
+
+
+def _read_slice_offsets(f):
+    f.seek(0)
+    header = f.read(8)
+    if len(header) < 8:
+        raise NotMachOError('The file is too short for a Mach-O header.')
+    magic, nfat_arch = struct.unpack('>2I', header)
+    if magic == FAT_MAGIC and nfat_arch < _MAX_FAT_ARCH_COUNT:
+        arch_format, arch_size = '>5I', 20
+    elif magic == FAT_MAGIC_64 and nfat_arch < _MAX_FAT_ARCH_COUNT:
+        arch_format, arch_size = '>2I2Q2I', 32
+    else:
+        return [0]
+    offsets = []
+    for _ in range(nfat_arch):
+        offsets.append(struct.unpack(arch_format, f.read(arch_size))[2])
+    return offsets
+
+
+def _read_slices(f):
+    return [_Slice(f, offset) for offset in _read_slice_offsets(f)]
+
+
+def is_macho(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            _read_slices(f)
+    except (MachOError, struct.error, IOError, OSError):
+        return False
+    return True
+
+
+def read_paths(file_path):
+    # The paths of all architectures in a universal binary are merged in their order of appearance
+    with open(file_path, 'rb') as f:
+        slices = _read_slices(f)
+    install_name = None
+    dependencies = []
+    rpaths = []
+    for current_slice in slices:
+        paths = current_slice.paths()
+        install_name = install_name or paths.install_name
+        dependencies.extend(path for path in paths.dependencies if path not in dependencies)
+        rpaths.extend(path for path in paths.rpaths if path not in rpaths)
+    return LoadCommandPaths(install_name, dependencies, rpaths)
+
+
+def _sign(file_path):
+    # Changed load commands invalidate an existing code signature and macOS refuses to load libraries with invalid
+    # signatures (always on Apple Silicon), so the file is re-signed ad hoc
+    try:
+        p = subprocess.Popen(['codesign', '-f', '-s', '-', file_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, stderr = p.communicate()
+    except OSError:
+        raise CodeSignatureError('Could not run codesign to re-sign {file_path}.'.format(file_path=file_path))
+    if p.returncode != 0:
+        raise CodeSignatureError(
+            'Could not re-sign {file_path}: {error}'.format(
+                file_path=file_path, error=stderr.decode('utf-8', 'replace').strip()
+            )
+        )
+
+
+def change_paths(file_path, dependency_changes=None, install_name=None, rpath_changes=None):
+    # All changes are validated for all architectures before anything is written
+    dependency_changes = dependency_changes or {}
+    rpath_changes = rpath_changes or {}
+    with open(file_path, 'r+b') as f:
+        slices = _read_slices(f)
+        changed_command_count = 0
+        for current_slice in slices:
+            changed_command_count += current_slice.change_paths(dependency_changes, install_name, rpath_changes)
+            current_slice.load_commands_data()
+        is_signed = any(current_slice.is_signed() for current_slice in slices)
+        if changed_command_count > 0 and is_signed and sys.platform != 'darwin':
+            raise CodeSignatureError(
+                '{file_path} is code signed and can only be changed and re-signed on macOS.'.format(file_path=file_path)
+            )
+        if changed_command_count > 0:
+            for current_slice in slices:
+                current_slice.write(f)
+    if changed_command_count > 0 and is_signed:
+        _sign(file_path)
+    return changed_command_count
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import binascii
+import collections
+import json
+import multiprocessing
+import os
+import os.path
+import py_compile
+import struct
+import subprocess
+import sys
+import time
+try:
+    from importlib.util import MAGIC_NUMBER, cache_from_source
+except ImportError:
+    import imp
+    MAGIC_NUMBER = imp.get_magic()
+
+    def cache_from_source(path):
+        return path + 'c'
+
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+# This file is also run as a script with the interpreter of a conda environment whose python version differs from
+# the version running shallow-appify, so it must not import anything from the shallow_appify package.
+
+PrecompileSummary = collections.namedtuple(
+    'PrecompileSummary', ('compiled_count', 'skipped_count', 'failed_file_paths', 'wall_time')
+)
+
+
+class PrecompileError(Exception):
+    pass
+
+
+def _get_magic_string():
+    return binascii.hexlify(MAGIC_NUMBER).decode('ascii')
+
+
+def is_pyc_current(source_path, pyc_path):
+    # Compares the source modification time and size recorded in the pyc header like the import system does
+    try:
+        with open(pyc_path, 'rb') as f:
+            header = f.read(16)
+    except (IOError, OSError):
+        return False
+    if header[:4] != MAGIC_NUMBER:
+        return False
+    source_stat = os.stat(source_path)
+    if sys.version_info >= (3, 7):
+        if len(header) < 16:
+            return False
+        flags, mtime, size = struct.unpack('<3I', header[4:16])
+        if flags != 0:
+            return False  # hash based pycs are not used by this module
+    elif sys.version_info >= (3, 3):
+        if len(header) < 12:
+            return False
+        mtime, size = struct.unpack('<2I', header[4:12])
+    else:
+        if len(header) < 8:
+            return False
+        mtime, size = struct.unpack('<I', header[4:8])[0], None
+    if mtime != int(source_stat.st_mtime) & 0xFFFFFFFF:
+        return False
+    return size is None or size == source_stat.st_size & 0xFFFFFFFF
+
+
+def compile_file(source_path):
+    # Returns `None` for skipped files, `True` for compiled files and `False` on errors
+    pyc_path = cache_from_source(source_path)
+    if is_pyc_current(source_path, pyc_path):
+        return None
+    kwargs = {}
+    if hasattr(py_compile, 'PycInvalidationMode'):
+        # `SOURCE_DATE_EPOCH` would select hash based pycs otherwise which are always checked against the source
+        kwargs['invalidation_mode'] = py_compile.PycInvalidationMode.TIMESTAMP
+    try:
+        py_compile.compile(source_path, cfile=pyc_path, doraise=True, **kwargs)
+    except (py_compile.PyCompileError, IOError, OSError, UnicodeError):
+        return False
+    return True
+
+
+def _iter_source_paths(root_paths):
+    for root_path in root_paths:
+        if os.path.isfile(root_path):
+            yield root_path
+            continue
+        for current_root_path, dirnames, filenames in os.walk(root_path):
+            dirnames[:] = [dirname for dirname in dirnames if dirname != '__pycache__']
+            for filename in filenames:
+                if filename.endswith('.py'):
+                    yield os.path.join(current_root_path, filename)
+
+
+def _precompile_in_process(root_paths, num_workers):
+    start_time = time.time()
+    source_paths = list(_iter_source_paths(root_paths))
+    compiled_count = 0
+    skipped_count = 0
+    failed_file_paths = []
+    pool = multiprocessing.Pool(num_workers or multiprocessing.cpu_count())
+    try:
+        for source_path, result in zip(source_paths, pool.imap(compile_file, source_paths, chunksize=32)):
+            if result is None:
+                skipped_count += 1
+            elif result:
+                compiled_count += 1
+            else:
+                failed_file_paths.append(source_path)
+    finally:
+        pool.close()
+        pool.join()
+    return PrecompileSummary(compiled_count, skipped_count, failed_file_paths, time.time() - start_time)
+
+
+def _run_script(python_path, *args):
+    try:
+        return subprocess.check_output([python_path, os.path.abspath(__file__)] + list(args)).decode('utf-8')
+    except (subprocess.CalledProcessError, OSError):
+        raise PrecompileError('Could not run {python_path}.'.format(python_path=python_path))
+
+
+def precompile(root_paths, python_path=None, num_workers=None):
+    # Compiles all python files below `root_paths` for the interpreter at `python_path` (default: the running
+    # interpreter). The files are always compiled by running this module with that interpreter: builds run on threads
+    # and forking a process pool from a multi-threaded process can deadlock in the children.
+    start_time = time.time()
+    summary = json.loads(
+        _run_script(python_path or sys.executable, '--json', '--jobs', str(num_workers or 0), *root_paths)
+    )
+    return PrecompileSummary(
+        summary['compiled_count'], summary['skipped_count'], summary['failed_file_paths'],
+        time.time() - start_time
+    )
+
+
+def main():
+    if len(sys.argv) < 2:
+        print('Usage: {name} [--json] [--jobs N] path [path ...]'.format(name=sys.argv[0]))
+        print('       {name} --magic'.format(name=sys.argv[0]))
+        print('       Compiles all python files below the given paths whose pyc files are missing or outdated.')
+        sys.exit(0)
+
+    if sys.argv[1] == '--magic':
+        print(_get_magic_string())
+        return
+    args = sys.argv[1:]
+    print_json = '--json' in args
+    if print_json:
+        args.remove('--json')
+    num_workers = None
+    if '--jobs' in args:
+        jobs_index = args.index('--jobs')
+        num_workers = int(args[jobs_index + 1]) or None
+        del args[jobs_index:jobs_index + 2]
+    summary = _precompile_in_process(args, num_workers)
+    if print_json:
+        print(json.dumps(summary._asdict()))
+    else:
+        print(
+            'compiled {compiled}, skipped {skipped} current and failed on {failed} files in {time:.2f}s'.format(
+                compiled=summary.compiled_count,
+                skipped=summary.skipped_count,
+                failed=len(summary.failed_file_paths),
+                time=summary.wall_time
+            )
+        )
+    if summary.failed_file_paths and not print_json:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
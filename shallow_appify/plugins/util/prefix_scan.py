@@ -0,0 +1,121 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import collections
+import fnmatch
+import logging
+import multiprocessing
+import os
+import os.path
+from multiprocessing.pool import ThreadPool
+from .binary_replace import binary_replace
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+READ_CHUNK_SIZE = 1024 * 1024
+CLASSIFY_BYTE_COUNT = 8192
+BINARY_MAGIC_NUMBERS = (
+    b'\xfe\xed\xfa\xce',  # Mach-O 32 bit
+    b'\xce\xfa\xed\xfe',  # Mach-O 32 bit, reversed byte order
+    b'\xfe\xed\xfa\xcf',  # Mach-O 64 bit
+    b'\xcf\xfa\xed\xfe',  # Mach-O 64 bit, reversed byte order
+    b'\xca\xfe\xba\xbe',  # Mach-O universal binary (and Java class files)
+    b'\x7fELF',
+    b'!<arch>\n',  # static libraries
+    b'PK\x03\x04',  # zip archives (eggs, wheels, jars)
+    b'\x1f\x8b',  # gzip
+    b'BZh',
+    b'\xfd7zXZ\x00',
+    b'\x89PNG',
+    b'\xff\xd8\xff',  # jpeg
+    b'GIF8',
+    b'%PDF',
+    b'SQLite format 3\x00',
+)
+
+ScanResult = collections.namedtuple(
+    'ScanResult', ('files_scanned', 'bytes_read', 'text_file_paths', 'binary_file_paths')
+)
+
+
+def is_binary_data(leading_bytes):
+    return leading_bytes.startswith(BINARY_MAGIC_NUMBERS) or b'\0' in leading_bytes[:CLASSIFY_BYTE_COUNT]
+
+
+def _scan_file(file_path, prefix):
+    # Returns `(contains_prefix, is_binary, read_byte_count)`; the file is only read up to the first match
+    bytes_read = 0
+    is_binary = None
+    overlap = b''
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return False, is_binary, bytes_read
+            bytes_read += len(chunk)
+            if is_binary is None:
+                is_binary = is_binary_data(chunk)
+            if prefix in overlap + chunk:
+                return True, is_binary, bytes_read
+            overlap = chunk[-(len(prefix) - 1):] if len(prefix) > 1 else b''
+
+
+def _replace_in_text_file(file_path, old_prefix, new_prefix):
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    with open(file_path, 'wb') as f:
+        f.write(data.replace(old_prefix, new_prefix))
+
+
+def _iter_file_paths(root_path, exclude_patterns):
+    # Like `grep -r`, symbolic links are not followed
+    for current_root_path, _, filenames in os.walk(root_path):
+        for filename in filenames:
+            if any(fnmatch.fnmatch(filename, pattern) for pattern in exclude_patterns):
+                continue
+            file_path = os.path.join(current_root_path, filename)
+            if not os.path.islink(file_path):
+                yield file_path
+
+
+def replace_prefix(root_path, old_prefix, new_prefix, exclude_patterns=('*.pyc', ), num_workers=None):
+    if not isinstance(old_prefix, bytes):
+        old_prefix = old_prefix.encode('utf-8')
+    if not isinstance(new_prefix, bytes):
+        new_prefix = new_prefix.encode('utf-8')
+
+    def process_file(file_path):
+        contains_prefix, is_binary, bytes_read = _scan_file(file_path, old_prefix)
+        if contains_prefix:
+            if is_binary:
+                binary_replace(file_path, old_prefix, new_prefix)
+            else:
+                _replace_in_text_file(file_path, old_prefix, new_prefix)
+        return file_path, contains_prefix, is_binary, bytes_read
+
+    files_scanned = 0
+    total_bytes_read = 0
+    text_file_paths = []
+    binary_file_paths = []
+    pool = ThreadPool(num_workers or multiprocessing.cpu_count())
+    try:
+        for file_path, contains_prefix, is_binary, bytes_read in pool.imap_unordered(
+            process_file, _iter_file_paths(root_path, exclude_patterns), chunksize=16
+        ):
+            files_scanned += 1
+            total_bytes_read += bytes_read
+            if contains_prefix:
+                (binary_file_paths if is_binary else text_file_paths).append(file_path)
+    finally:
+        pool.close()
+        pool.join()
+    logging.debug(
+        'scanned %d files (%d bytes) in %s, replaced the prefix in %d text and %d binary files', files_scanned,
+        total_bytes_read, root_path, len(text_file_paths), len(binary_file_paths)
+    )
+    return ScanResult(files_scanned, total_bytes_read, sorted(text_file_paths), sorted(binary_file_paths))
@@ -0,0 +1,103 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import collections
+import fnmatch
+import os
+import os.path
+import shutil
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+# Patterns are matched with `fnmatch` against paths relative to the environment root; `*` also matches `/`, so
+# `lib/python*/site-packages/*/tests` matches test directories at any depth of a package
+PruneRule = collections.namedtuple('PruneRule', ('name', 'patterns'))
+PruneStatistics = collections.namedtuple('PruneStatistics', ('file_count', 'byte_count'))
+
+DEFAULT_RULES = (
+    PruneRule('package_cache', ('pkgs', )),
+    PruneRule(
+        'tests', ('lib/python*/test', 'lib/python*/*/tests', 'lib/python*/*/test', 'lib/python*/idlelib/idle_test')
+    ),
+    PruneRule('documentation', ('share/doc', 'share/gtk-doc', 'share/info', 'doc', 'docs')),
+    PruneRule('man_pages', ('share/man', 'man')),
+    PruneRule('locales', ('share/locale', )),
+    PruneRule('headers', ('include', 'lib/python*/config*/*.h')),
+    PruneRule('static_libraries', ('lib/*.a', 'lib/python*/config*/*.a')),
+    PruneRule('build_configuration', ('lib/pkgconfig', 'share/pkgconfig', 'lib/cmake', 'share/aclocal')),
+)
+# Rules that remove files needed to build extension modules against the environment
+DEVELOPMENT_RULE_NAMES = ('headers', 'static_libraries', 'build_configuration')
+USER_RULE_NAME = 'user'
+
+
+def _get_tree_statistics(root_path):
+    if os.path.islink(root_path) or not os.path.isdir(root_path):
+        return PruneStatistics(1, os.lstat(root_path).st_size)
+    file_count = 0
+    byte_count = 0
+    for current_root_path, dirnames, filenames in os.walk(root_path):
+        dir_links = [dirname for dirname in dirnames if os.path.islink(os.path.join(current_root_path, dirname))]
+        for name in filenames + dir_links:
+            file_count += 1
+            byte_count += os.lstat(os.path.join(current_root_path, name)).st_size
+    return PruneStatistics(file_count, byte_count)
+
+
+def _matches(relative_path, patterns):
+    return any(fnmatch.fnmatchcase(relative_path, pattern) for pattern in patterns)
+
+
+def prune(root_path, rules=DEFAULT_RULES, keep_patterns=()):
+    # Removes all files and directories matching a rule unless they match a keep pattern. Directories that match a
+    # rule are removed as a whole if no keep patterns are given; otherwise their contents are checked one by one.
+    # Returns the number of removed files and bytes per rule name.
+    def find_rule(relative_path):
+        for rule in rules:
+            if _matches(relative_path, rule.patterns):
+                return rule
+        return None
+
+    statistics = collections.OrderedDict((rule.name, PruneStatistics(0, 0)) for rule in rules)
+
+    def add_statistics(rule, removed_statistics):
+        statistics[rule.name] = PruneStatistics(
+            *(current + removed for current, removed in zip(statistics[rule.name], removed_statistics))
+        )
+
+    inherited_rules = {}
+    pruned_dir_paths = []
+    for current_root_path, dirnames, filenames in os.walk(root_path):
+        current_relative_path = os.path.relpath(current_root_path, root_path)
+        inherited_rule = inherited_rules.get(current_relative_path)
+        kept_dirnames = []
+        for name in dirnames + filenames:
+            relative_path = os.path.normpath(os.path.join(current_relative_path, name))
+            path = os.path.join(current_root_path, name)
+            is_dir = name in dirnames and not os.path.islink(path)
+            rule = inherited_rule or find_rule(relative_path)
+            if rule is None or _matches(relative_path, keep_patterns):
+                if is_dir:
+                    kept_dirnames.append(name)
+                continue
+            if is_dir and keep_patterns:
+                inherited_rules[relative_path] = rule
+                pruned_dir_paths.append(path)
+                kept_dirnames.append(name)
+                continue
+            add_statistics(rule, _get_tree_statistics(path))
+            if is_dir:
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        dirnames[:] = kept_dirnames
+    # Directories whose contents were checked one by one are removed if nothing was kept
+    for dir_path in reversed(pruned_dir_paths):
+        if not os.listdir(dir_path):
+            os.rmdir(dir_path)
+    return statistics
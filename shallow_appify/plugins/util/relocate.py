@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import codecs
+import json
+import mmap
+import os
+import os.path
+import sys
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+RELOCATION_INDEX_FILENAME = 'relocation_index.json'
+APPLICATION_PATH_PREFIX_FILENAME = 'application_path_prefix'
+
+PY2 = (sys.version_info.major < 3)
+if PY2:
+    Text = unicode
+else:
+    Text = str
+
+
+class RelocationIndexError(Exception):
+    pass
+
+
+def _encode(text):
+    if isinstance(text, Text):
+        text = text.encode('utf-8')
+    return text
+
+
+def _find_offsets(file_path, prefix):
+    offsets = []
+    if os.path.getsize(file_path) == 0:
+        return offsets
+    with open(file_path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            offset = data.find(prefix)
+            while offset >= 0:
+                offsets.append(offset)
+                offset = data.find(prefix, offset + len(prefix))
+        finally:
+            data.close()
+    return offsets
+
+
+def _relocate_text_file(file_path, offsets, old_prefix, new_prefix):
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    valid_offsets = [offset for offset in offsets if data[offset:offset + len(old_prefix)] == old_prefix]
+    if not valid_offsets:
+        return []
+    parts = []
+    last_offset = 0
+    for offset in valid_offsets:
+        parts.extend((data[last_offset:offset], new_prefix))
+        last_offset = offset + len(old_prefix)
+    parts.append(data[last_offset:])
+    with open(file_path, 'wb') as f:
+        f.write(b''.join(parts))
+    length_diff = len(new_prefix) - len(old_prefix)
+    return [offset + i * length_diff for i, offset in enumerate(valid_offsets)]
+
+
+def _relocate_binary_file(file_path, offsets, old_prefix, new_prefix):
+    # Applies the rules of `binary_replace` to the indexed occurrences: each NUL terminated string containing the
+    # prefix is rewritten in place and padded with NUL bytes (or truncated if the new prefix is longer).
+    length_diff = len(new_prefix) - len(old_prefix)
+    new_offsets = []
+    with open(file_path, 'r+b') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+        try:
+            string_groups = []
+            for offset in offsets:
+                if data[offset:offset + len(old_prefix)] != old_prefix:
+                    continue
+                string_end = data.find(b'\0', offset)
+                if string_end < 0:
+                    continue
+                if string_groups and string_groups[-1][0] == string_end:
+                    string_groups[-1][1].append(offset)
+                else:
+                    string_groups.append((string_end, [offset]))
+            last_region_end = 0
+            for string_end, group_offsets in string_groups:
+                region_start = group_offsets[0]
+                region_end = string_end + 1 + max(0, length_diff)
+                # Like `binary_replace`, skip strings without enough fill bytes or which were overwritten already
+                if region_start < last_region_end or region_end > len(data):
+                    continue
+                last_region_end = region_end
+                parts = []
+                last_offset = region_start
+                for i, offset in enumerate(group_offsets):
+                    parts.extend((data[last_offset:offset], new_prefix))
+                    last_offset = offset + len(old_prefix)
+                    if offset + i * length_diff + len(new_prefix) <= region_end:
+                        new_offsets.append(offset + i * length_diff)
+                parts.append(data[last_offset:region_end])
+                new_text = b''.join(parts)
+                region_len = region_end - region_start
+                if len(new_text) > region_len:
+                    new_text = new_text[:region_len]
+                else:
+                    new_text += b'\0' * (region_len - len(new_text))
+                data[region_start:region_end] = new_text
+            data.flush()
+        finally:
+            data.close()
+    return new_offsets
+
+
+def write_relocation_index(index_dir_path, prefix, text_file_paths, binary_file_paths):
+    prefix = _encode(prefix)
+    entries = []
+    for file_paths, is_binary in ((text_file_paths, False), (binary_file_paths, True)):
+        for file_path in file_paths:
+            offsets = _find_offsets(file_path, prefix)
+            if offsets:
+                entries.append(
+                    {'path': os.path.relpath(file_path, index_dir_path), 'binary': is_binary, 'offsets': offsets}
+                )
+    index = {'prefix': prefix.decode('utf-8'), 'files': sorted(entries, key=lambda entry: entry['path'])}
+    with codecs.open(os.path.join(index_dir_path, RELOCATION_INDEX_FILENAME), 'w', 'utf-8') as f:
+        json.dump(index, f)
+    return index
+
+
+def read_relocation_index(index_dir_path):
+    index_path = os.path.join(index_dir_path, RELOCATION_INDEX_FILENAME)
+    if not os.path.isfile(index_path):
+        raise RelocationIndexError('The relocation index {index_path} does not exist.'.format(index_path=index_path))
+    with codecs.open(index_path, 'r', 'utf-8') as f:
+        return json.load(f)
+
+
+def relocate(index_dir_path, new_prefix):
+    index_path = os.path.join(index_dir_path, RELOCATION_INDEX_FILENAME)
+    index = read_relocation_index(index_dir_path)
+    old_prefix = _encode(index['prefix'])
+    new_prefix = _encode(new_prefix)
+    entries = []
+    for entry in index['files']:
+        file_path = os.path.join(index_dir_path, entry['path'])
+        if not os.path.isfile(file_path):
+            continue
+        if entry['binary']:
+            offsets = _relocate_binary_file(file_path, entry['offsets'], old_prefix, new_prefix)
+        else:
+            offsets = _relocate_text_file(file_path, entry['offsets'], old_prefix, new_prefix)
+        if len(offsets) < len(entry['offsets']):
+            print(
+                'WARNING: {count} prefix occurrences in {file_path} could not be relocated.'.format(
+                    count=len(entry['offsets']) - len(offsets), file_path=file_path
+                ),
+                file=sys.stderr
+            )
+        if offsets:
+            entries.append({'path': entry['path'], 'binary': entry['binary'], 'offsets': offsets})
+    index = {'prefix': new_prefix.decode('utf-8'), 'files': entries}
+    with codecs.open(index_path, 'w', 'utf-8') as f:
+        json.dump(index, f)
+    with codecs.open(os.path.join(index_dir_path, APPLICATION_PATH_PREFIX_FILENAME), 'w', 'utf-8') as f:
+        f.write(index['prefix'])
+    return index
+
+
+def main():
+    if len(sys.argv) < 3:
+        print('Usage: {name} index_directory new_prefix'.format(name=sys.argv[0]))
+        print('       Replaces the application prefix at all positions listed in the relocation index of')
+        print('       index_directory with new_prefix and updates the index.')
+        sys.exit(0)
+
+    index_dir_path, new_prefix = sys.argv[1:3]
+    try:
+        relocate(index_dir_path, new_prefix)
+    except RelocationIndexError as e:
+        print('ERROR: {message}'.format(message=e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
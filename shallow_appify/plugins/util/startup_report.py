@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import collections
+import glob
+import json
+import os
+import os.path
+import sys
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+# This file is bundled with apps built with `--startup-profile`, so it must not import anything from the
+# shallow_appify package.
+
+PROFILE_LOG_FILENAME = 'startup_profile.jsonl'
+PHASES = ('interpreter_startup', 'setup', 'import_main_module', 'time_to_main')
+
+ImportStatistics = collections.namedtuple(
+    'ImportStatistics', ('name', 'count', 'mean_self_time', 'mean_cumulative_time', 'max_cumulative_time')
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='''
+    Summarizes the startup profiles that are recorded by apps built with
+    "--startup-profile": the duration of each startup phase and the slowest
+    imports.'''
+    )
+    parser.add_argument(
+        '-n',
+        '--count',
+        dest='import_count',
+        action='store',
+        type=int,
+        default=20,
+        help='Number of slowest imports to show (default: 20).'
+    )
+    parser.add_argument(
+        '-s',
+        '--sort',
+        dest='sort_key',
+        action='store',
+        choices=('self', 'cumulative'),
+        default='self',
+        help='Sorts the imports by their mean self or cumulative time (default: self).'
+    )
+    parser.add_argument(
+        'log_paths',
+        action='store',
+        nargs='+',
+        help='Log directories or log files (rotated log files of a directory are included).'
+    )
+    return parser.parse_args()
+
+
+def read_profiles(log_paths):
+    profiles = []
+    for log_path in log_paths:
+        if os.path.isdir(log_path):
+            file_paths = sorted(glob.glob(os.path.join(log_path, PROFILE_LOG_FILENAME + '*')))
+        else:
+            file_paths = [log_path]
+        for file_path in file_paths:
+            with open(file_path, 'r') as f:
+                for line in f:
+                    try:
+                        profiles.append(json.loads(line))
+                    except ValueError:
+                        pass  # a line may be truncated if the app was killed while writing
+    return profiles
+
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 == 1 else (values[middle - 1] + values[middle]) / 2
+
+
+def summarize_phases(profiles):
+    summary = collections.OrderedDict()
+    for phase in PHASES:
+        values = [profile[phase] for profile in profiles if profile.get(phase) is not None]
+        summary[phase] = (_median(values), max(values) if values else None)
+    return summary
+
+
+def summarize_imports(profiles):
+    # Imports are aggregated over all launches; a module that is only imported in some launches is averaged over
+    # the launches that imported it
+    self_times = collections.defaultdict(list)
+    cumulative_times = collections.defaultdict(list)
+    for profile in profiles:
+        for name, _, self_time, cumulative_time in profile.get('imports', []):
+            self_times[name].append(self_time)
+            cumulative_times[name].append(cumulative_time)
+    return [
+        ImportStatistics(
+            name,
+            len(self_times[name]),
+            sum(self_times[name]) / len(self_times[name]),
+            sum(cumulative_times[name]) / len(cumulative_times[name]),
+            max(cumulative_times[name])
+        ) for name in self_times
+    ]
+
+
+def _format_time(seconds):
+    return '{:>10.1f}'.format(seconds * 1000) if seconds is not None else '{:>10}'.format('-')
+
+
+def main():
+    args = parse_args()
+    profiles = read_profiles(args.log_paths)
+    if not profiles:
+        print('No startup profiles found.', file=sys.stderr)
+        sys.exit(1)
+    print('{count} launches'.format(count=len(profiles)))
+    print()
+    print('{phase:<20} {median:>10} {maximum:>10}'.format(phase='phase (ms)', median='median', maximum='max'))
+    for phase, (median, maximum) in summarize_phases(profiles).items():
+        print(
+            '{phase:<20} {median} {maximum}'.format(
+                phase=phase, median=_format_time(median), maximum=_format_time(maximum)
+            )
+        )
+    import_statistics = summarize_imports(profiles)
+    import_statistics.sort(
+        key=lambda statistics: statistics.mean_self_time
+        if args.sort_key == 'self' else statistics.mean_cumulative_time,
+        reverse=True
+    )
+    name_width = max([len('import')] + [len(statistics.name) for statistics in import_statistics[:args.import_count]])
+    print()
+    print(
+        '{name:<{width}} {self_time:>10} {cumulative_time:>10} {max_time:>10} {count:>6}'.format(
+            name='import (ms)',
+            width=name_width,
+            self_time='self',
+            cumulative_time='cumulative',
+            max_time='max',
+            count='count'
+        )
+    )
+    for statistics in import_statistics[:args.import_count]:
+        print(
+            '{name:<{width}} {self_time} {cumulative_time} {max_time} {count:>6}'.format(
+                name=statistics.name,
+                width=name_width,
+                self_time=_format_time(statistics.mean_self_time),
+                cumulative_time=_format_time(statistics.mean_cumulative_time),
+                max_time=_format_time(statistics.max_cumulative_time),
+                count=statistics.count
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import os
+import os.path
+import py_compile
+import re
+import shutil
+import sys
+import tempfile
+import zipfile
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+# This file is run as a script with the interpreter of the conda environment, so the bytecode in the archive
+# matches the python version of the app. It must not import anything from the shallow_appify package.
+
+SOURCE_EXTENSION = '.py'
+BYTECODE_EXTENSIONS = ('.pyc', '.pyo')
+# Code that accesses these names usually expects its package to be a directory on disk
+_ON_DISK_NAMES_PATTERN = re.compile(br'\b(__file__|__path__)\b')
+
+
+def _iter_package_file_paths(package_path):
+    for current_root_path, dirnames, filenames in os.walk(package_path):
+        dirnames[:] = [dirname for dirname in dirnames if dirname != '__pycache__']
+        for filename in filenames:
+            yield os.path.join(current_root_path, filename)
+
+
+def _check_source_file(file_path, excluded_file_paths):
+    if file_path in excluded_file_paths:
+        return 'contains the application path prefix'
+    with open(file_path, 'rb') as f:
+        if _ON_DISK_NAMES_PATTERN.search(f.read()):
+            return 'uses __file__ or __path__'
+    return None
+
+
+def check_module(module_path, excluded_file_paths=frozenset()):
+    # Returns the reason why a top-level module or package must stay on disk or `None` if it can be packed
+    if os.path.islink(module_path):
+        return 'is a symbolic link'
+    if os.path.isfile(module_path):
+        return _check_source_file(module_path, excluded_file_paths)
+    if not os.path.isfile(os.path.join(module_path, '__init__' + SOURCE_EXTENSION)):
+        return 'is no regular package'
+    for file_path in _iter_package_file_paths(module_path):
+        if os.path.islink(file_path):
+            return 'contains symbolic links'
+        extension = os.path.splitext(file_path)[1]
+        if extension == SOURCE_EXTENSION:
+            reason = _check_source_file(file_path, excluded_file_paths)
+            if reason is not None:
+                return reason
+        elif extension not in BYTECODE_EXTENSIONS:
+            return 'contains native extensions or data files'
+    return None
+
+
+def find_modules(root_path, excluded_names=(), excluded_file_paths=frozenset()):
+    # Returns the packable top-level modules and packages of `root_path` and the reasons for all others
+    packable_names = []
+    skipped_names = {}
+    for name in sorted(os.listdir(root_path)):
+        module_path = os.path.join(root_path, name)
+        if os.path.isdir(module_path) and not os.path.islink(module_path):
+            if name == '__pycache__' or '.' in name:
+                continue  # metadata directories like `*.dist-info` or `*.egg-info`
+        elif os.path.splitext(name)[1] != SOURCE_EXTENSION:
+            continue
+        if name in excluded_names:
+            skipped_names[name] = 'is excluded'
+            continue
+        reason = check_module(module_path, excluded_file_paths)
+        if reason is None:
+            packable_names.append(name)
+        else:
+            skipped_names[name] = reason
+    return packable_names, skipped_names
+
+
+def _compile_module(root_path, name, archive_path, compile_dir_path):
+    module_path = os.path.join(root_path, name)
+    if os.path.isfile(module_path):
+        source_paths = [module_path]
+    else:
+        source_paths = sorted(
+            file_path for file_path in _iter_package_file_paths(module_path) if file_path.endswith(SOURCE_EXTENSION)
+        )
+    kwargs = {}
+    if hasattr(py_compile, 'PycInvalidationMode'):
+        kwargs['invalidation_mode'] = py_compile.PycInvalidationMode.TIMESTAMP
+    archive_entries = []
+    pyc_path = os.path.join(compile_dir_path, 'module.pyc')
+    for source_path in source_paths:
+        relative_path = os.path.relpath(source_path, root_path)
+        py_compile.compile(
+            source_path, cfile=pyc_path, dfile=os.path.join(archive_path, relative_path), doraise=True, **kwargs
+        )
+        with open(pyc_path, 'rb') as f:
+            archive_entries.append((os.path.splitext(relative_path)[0] + '.pyc', f.read()))
+    return archive_entries
+
+
+def create_archive(root_path, names, archive_path):
+    # Writes only bytecode, which zipimport loads without checking for sources. Tracebacks show the paths inside the
+    # archive. Returns the packed names, the number of packed files and the names that could not be compiled.
+    packed_names = []
+    failed_names = {}
+    file_count = 0
+    compile_dir_path = tempfile.mkdtemp()
+    try:
+        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_STORED) as archive:
+            for name in names:
+                try:
+                    archive_entries = _compile_module(root_path, name, archive_path, compile_dir_path)
+                except py_compile.PyCompileError:
+                    failed_names[name] = 'cannot be compiled'
+                    continue
+                for archive_name, data in archive_entries:
+                    archive.writestr(archive_name, data)
+                packed_names.append(name)
+                file_count += len(archive_entries)
+    finally:
+        shutil.rmtree(compile_dir_path)
+    return packed_names, file_count, failed_names
+
+
+def remove_modules(root_path, names):
+    for name in names:
+        module_path = os.path.join(root_path, name)
+        if os.path.isdir(module_path):
+            shutil.rmtree(module_path)
+        else:
+            os.remove(module_path)
+            pycache_path = os.path.join(root_path, '__pycache__')
+            module_name = os.path.splitext(name)[0]
+            for bytecode_path in [module_path + 'c', module_path + 'o'] + [
+                os.path.join(pycache_path, filename) for filename in
+                (os.listdir(pycache_path) if os.path.isdir(pycache_path) else [])
+                if filename.split('.')[0] == module_name
+            ]:
+                if os.path.isfile(bytecode_path):
+                    os.remove(bytecode_path)
+
+
+def zip_modules(root_path, archive_path, excluded_names=(), excluded_file_paths=()):
+    # Moves all packable top-level modules and packages of `root_path` into a zip archive
+    excluded_file_paths = frozenset(os.path.abspath(file_path) for file_path in excluded_file_paths)
+    packable_names, skipped_names = find_modules(root_path, excluded_names, excluded_file_paths)
+    if not packable_names:
+        return {'packed_names': [], 'skipped_names': skipped_names, 'file_count': 0}
+    packed_names, file_count, failed_names = create_archive(root_path, packable_names, archive_path)
+    skipped_names.update(failed_names)
+    remove_modules(root_path, packed_names)
+    return {'packed_names': packed_names, 'skipped_names': skipped_names, 'file_count': file_count}
+
+
+def main():
+    if len(sys.argv) < 3:
+        print('Usage: {name} root_path archive_path [exclude_list_file]'.format(name=sys.argv[0]))
+        print('       Moves all pure python modules and packages of root_path that do not need to be on disk into')
+        print('       a zip archive of bytecode. exclude_list_file is a JSON file with top-level names and file paths')
+        print('       ({"names": [...], "file_paths": [...]}) that must not be packed. Prints a JSON summary.')
+        sys.exit(0)
+
+    root_path, archive_path = (os.path.abspath(path) for path in sys.argv[1:3])
+    excluded_names, excluded_file_paths = (), ()
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], 'r') as f:
+            exclude_list = json.load(f)
+        excluded_names = exclude_list.get('names', ())
+        excluded_file_paths = exclude_list.get('file_paths', ())
+    try:
+        summary = zip_modules(root_path, archive_path, excluded_names, excluded_file_paths)
+    except (IOError, OSError) as e:
+        print('ERROR: {message}'.format(message=e), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import collections
+import logging
+import multiprocessing
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from . import trace
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+Task = collections.namedtuple('Task', ('name', 'function', 'inputs', 'outputs', 'output_path'))
+TaskRecord = collections.namedtuple('TaskRecord', ('name', 'status', 'start_time', 'end_time'))
+
+TASK_DONE = 'done'
+TASK_FAILED = 'failed'
+TASK_CANCELLED = 'cancelled'
+
+
+class TaskGraphError(Exception):
+    pass
+
+
+class TaskGraph(object):
+    # Build stages declare the resources (abstract names like "source" or "conda_env") they read and write; a task
+    # depends on the tasks that produce its inputs. Inputs that no task produces are expected to exist beforehand.
+    # Tasks run on a thread pool as soon as their dependencies are done. The first failing task is reported at once
+    # and all waiting tasks are cancelled; threads cannot be interrupted, so the error is raised as soon as the tasks
+    # which are already running have returned.
+
+    def __init__(self):
+        self.tasks = collections.OrderedDict()
+        self.records = collections.OrderedDict()
+        self._results = {}
+        self._producers = {}
+
+    def add(self, name, function, inputs=(), outputs=(), output_path=None):
+        if name in self.tasks:
+            raise TaskGraphError('The task {name} is defined twice.'.format(name=name))
+        for output in outputs:
+            if output in self._producers:
+                raise TaskGraphError(
+                    'The output {output} of {name} is already produced by {producer}.'.format(
+                        output=output, name=name, producer=self._producers[output]
+                    )
+                )
+            self._producers[output] = name
+        self.tasks[name] = Task(name, function, tuple(inputs), tuple(outputs), output_path)
+
+    def has_output(self, output):
+        return output in self._producers
+
+    def get_result(self, output):
+        # Returns the return value of the task which produced `output`; tasks can call this for their inputs
+        return self._results[self._producers[output]]
+
+    def get_dependencies(self, name):
+        return sorted(
+            set(self._producers[input_] for input_ in self.tasks[name].inputs if input_ in self._producers),
+            key=list(self.tasks).index
+        )
+
+    def get_topological_order(self):
+        ordered_names = []
+        visit_states = {}
+
+        def visit(name, path):
+            if visit_states.get(name) == 'done':
+                return
+            if visit_states.get(name) == 'visiting':
+                raise TaskGraphError('The tasks {tasks} form a cycle.'.format(tasks=' -> '.join(path + [name])))
+            visit_states[name] = 'visiting'
+            for dependency_name in self.get_dependencies(name):
+                visit(dependency_name, path + [name])
+            visit_states[name] = 'done'
+            ordered_names.append(name)
+
+        for name in self.tasks:
+            visit(name, [])
+        return ordered_names
+
+    def run(self, num_workers=None):
+        def run_task(task, tracer):
+            start_time = time.time()
+            try:
+                with trace.use_tracer(tracer), trace.stage(task.name, task.output_path, category='task'):
+                    result = task.function()
+            except BaseException as e:
+                return task.name, start_time, time.time(), None, e
+            return task.name, start_time, time.time(), result, None
+
+        def cancel_waiting_tasks():
+            for name in waiting_names:
+                self.records[name] = TaskRecord(name, TASK_CANCELLED, None, None)
+                logging.debug('cancelled the task %s', name)
+            del waiting_names[:]
+
+        def is_ready(name):
+            return all(
+                dependency_name in self.records and self.records[dependency_name].status == TASK_DONE
+                for dependency_name in dependencies[name]
+            )
+
+        num_workers = num_workers or multiprocessing.cpu_count()
+        waiting_names = self.get_topological_order()
+        dependencies = dict((name, self.get_dependencies(name)) for name in self.tasks)
+        first_error = None
+        finished_tasks = collections.deque()
+        task_finished = threading.Condition()
+        tracer = trace.get_tracer()
+        running_count = 0
+
+        def on_finished(task_result):
+            with task_finished:
+                finished_tasks.append(task_result)
+                task_finished.notify()
+
+        pool = ThreadPool(num_workers)
+        try:
+            while waiting_names or running_count > 0:
+                for name in [name for name in waiting_names if is_ready(name)]:
+                    if running_count >= num_workers:
+                        break
+                    waiting_names.remove(name)
+                    pool.apply_async(run_task, (self.tasks[name], tracer), callback=on_finished)
+                    running_count += 1
+                with task_finished:
+                    while not finished_tasks:
+                        task_finished.wait()
+                    name, start_time, end_time, result, error = finished_tasks.popleft()
+                running_count -= 1
+                if error is None:
+                    self._results[name] = result
+                    self.records[name] = TaskRecord(name, TASK_DONE, start_time, end_time)
+                else:
+                    self.records[name] = TaskRecord(name, TASK_FAILED, start_time, end_time)
+                    if first_error is None:
+                        first_error = error
+                        logging.error('the task %s failed: %s', name, error)
+                        if running_count > 0:
+                            logging.info('waiting for %d running tasks to return', running_count)
+                    cancel_waiting_tasks()
+        finally:
+            pool.close()
+            pool.join()
+        if first_error is not None:
+            raise first_error
+
+    def get_critical_path(self):
+        # Returns the records of the chain of dependent tasks with the longest total duration
+        path_durations = {}
+        predecessors = {}
+        for name in self.get_topological_order():
+            record = self.records.get(name)
+            duration = record.end_time - record.start_time if record is not None and record.end_time else 0.0
+            predecessor = None
+            for dependency_name in self.get_dependencies(name):
+                if predecessor is None or path_durations[dependency_name] > path_durations[predecessor]:
+                    predecessor = dependency_name
+            predecessors[name] = predecessor
+            path_durations[name] = duration + (path_durations[predecessor] if predecessor is not None else 0.0)
+        if not path_durations:
+            return []
+        name = max(path_durations, key=lambda name: path_durations[name])
+        critical_path = []
+        while name is not None:
+            if name in self.records:
+                critical_path.append(self.records[name])
+            name = predecessors[name]
+        return list(reversed(critical_path))
+
+
+def format_critical_path(critical_path):
+    total_time = sum(record.end_time - record.start_time for record in critical_path if record.end_time)
+    return 'critical path ({time:.2f}s): {tasks}'.format(
+        time=total_time,
+        tasks=' -> '.join(
+            '{name} ({time:.2f}s)'.format(name=record.name, time=record.end_time - record.start_time)
+            for record in critical_path if record.end_time
+        )
+    )
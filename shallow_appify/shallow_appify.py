@@ -8,69 +8,27 @@ from __future__ import absolute_import
 
 import argparse
 import codecs
+import hashlib
+import json
 import logging
 import os
 import os.path
+import plistlib
 import re
 import shutil
 import subprocess
 import sys
 import tempfile
-from jinja2 import Template
-from PIL import Image
-from . import plugins
+from . import cache, fastcopy, manifest, plugins, scheduler, trace
+from ._version import __version__
 logging.basicConfig(level=logging.WARNING)
 
 __author__ = 'Ingo Heimbach'
 __email__ = 'i.heimbach@fz-juelich.de'
 
-INFO_PLIST_TEMPLATE = '''
-<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
-<plist version="1.0">
-<dict>
-    {% if environment -%}
-    <key>LSEnvironment</key>
-    <dict>
-        {% for key, value in environment.iteritems() -%}
-        <key>{{ key }}</key>
-        <string>{{ value }}</string>
-        {% endfor -%}
-    </dict>
-    {% endif -%}
-    <key>CFBundleDevelopmentRegion</key>
-    <string>English</string>
-    <key>CFBundleExecutable</key>
-    <string>{{ executable }}</string>
-    {% if icon_file -%}
-    <key>CFBundleIconFile</key>
-    <string>{{ icon_file }}</string>
-    {% endif -%}
-    <key>CFBundleIdentifier</key>
-    <string>{{ group }}.{{ name }}</string>
-    <key>CFBundleInfoDictionaryVersion</key>
-    <string>6.0</string>
-    <key>CFBundleName</key>
-    <string>{{ name }}</string>
-    <key>CFBundleDisplayName</key>
-    <string>{{ name }}</string>
-    <key>CFBundleShortVersionString</key>
-    <string>{{ short_version }}</string>
-    <key>CFBundleVersion</key>
-    <string>{{ version }}</string>
-    <key>CFBundlePackageType</key>
-    <string>APPL</string>
-    <key>CFBundleSignature</key>
-    <string>????</string>
-    {% if hidden -%}
-    <key>LSUIElement</key>
-    <string>1</string>
-    {% endif -%}
-    <key>NSSupportsAutomaticGraphicsSwitching</key>
-    <true/>
-</dict>
-</plist>
-'''.strip()
+PLIST_FORMATS = ('xml', 'binary')
+# Keys of a build configuration (see `build_app`) which hold the executable path
+EXECUTABLE_CONFIG_KEYS = ('executable', 'executable-path')
 
 PKG_INFO_CONTENT = 'APPL????'
 
@@ -129,75 +87,156 @@ class InvalidAppPath(Exception):
     pass
 
 
-def parse_args():
+class InvalidPlistFormatError(Exception):
+    pass
+
+
+class InvalidConfigError(Exception):
+    pass
+
+
+class ConfigArgumentParser(argparse.ArgumentParser):
+    # Raises `InvalidConfigError` instead of printing the usage and exiting, so library callers are never terminated
+
+    def __init__(self, *args, **kwargs):
+        if sys.version_info >= (3, 5):
+            kwargs['allow_abbrev'] = False
+        super(ConfigArgumentParser, self).__init__(*args, **kwargs)
+
+    def error(self, message):
+        raise InvalidConfigError(message)
+
+    def exit(self, status=0, message=None):
+        raise InvalidConfigError(message or 'The build configuration is invalid.')
+
+
+def create_argument_parser(parser_class=argparse.ArgumentParser):
+    parser = parser_class(
+        description='''
+    Creates a runnable application for Mac OS X with references to
+    system libraries. The result is a NON-self-contained app bundle.'''
+    )
+    parser.add_argument(
+        '-d',
+        '--executable-directory',
+        dest='executable_root_path',
+        action='store',
+        type=os.path.abspath,
+        help='Defines the executable root directory that will be included in the app.'
+    )
+    parser.add_argument(
+        '-e',
+        '--environment',
+        dest='environment_vars',
+        action='store',
+        nargs='+',
+        help='Specifies which environment variables -- set on the current interpreter startup -- '
+        ' shall be included in the app bundle.'
+    )
+    parser.add_argument(
+        '-i',
+        '--icon',
+        dest='icon_path',
+        action='store',
+        type=os.path.abspath,
+        help='Image file that is used for app icon creation. It must be quadratic with a '
+        'resolution of 1024x1024 pixels or more.'
+    )
+    parser.add_argument(
+        '-g',
+        '--group',
+        dest='group',
+        action='store',
+        help='Developer group name that is saved to the internal app plist.'
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        dest='jobs',
+        action='store',
+        type=int,
+        help='Maximum number of build stages that run concurrently (default: number of CPUs). Stages that do not '
+        'depend on each other (e.g. the source copy, the icon creation and the conda environment creation) '
+        'overlap.'
+    )
+    parser.add_argument(
+        '-n', '--hidden', dest='hidden', action='store_true', help='Hides the app icon in the dock when given.'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        dest='app_path',
+        action='store',
+        type=os.path.abspath,
+        help='Sets the path the app will be saved to.'
+    )
+    parser.add_argument(
+        '-t',
+        '--trace',
+        dest='trace_path',
+        action='store',
+        type=os.path.abspath,
+        help='Writes the wall and cpu time, peak memory usage and bytes and files written of every build stage to '
+        'the given file (in the Chrome trace event format).'
+    )
+    parser.add_argument(
+        '-u',
+        '--update',
+        dest='update',
+        action='store_true',
+        help='Updates an existing app bundle incrementally: only changed source files are copied and Info.plist, '
+        'the icon and the launcher are only regenerated when their inputs changed. Bundles with extension modules '
+        'or zipped modules are always rebuilt completely.'
+    )
+    parser.add_argument(
+        '-v',
+        '--version',
+        dest='version_string',
+        action='store',
+        help='Specifies the version string of the program.'
+    )
+    parser.add_argument(
+        '--verbose',
+        dest='verbose',
+        action='store_true',
+        help='Prints summaries of the build stages (e.g. the files removed by pruning, linked by deduplication or '
+        'compiled by the precompilation).'
+    )
+    parser.add_argument(
+        '--extra-plist',
+        dest='extra_plist_path',
+        action='store',
+        type=os.path.abspath,
+        help='Plist file (XML or binary) with additional keys that are merged into Info.plist. Its keys override '
+        'the generated ones.'
+    )
+    parser.add_argument(
+        '--plist-format',
+        dest='plist_format',
+        action='store',
+        choices=PLIST_FORMATS,
+        default='xml',
+        help='Format of the generated Info.plist (default: xml). Binary plists are smaller and parsed faster.'
+    )
+    parser.add_argument(
+        'executable_path',
+        action='store',
+        type=os.path.abspath,
+        help='Sets the executable that is started when the app is opened.'
+    )
+    plugins.add_plugin_command_line_arguments(parser)
+    return parser
+
+
+def parse_args(argv=None, parser_class=argparse.ArgumentParser):
     def parse_commandline():
-        parser = argparse.ArgumentParser(
-            description='''
-        Creates a runnable application for Mac OS X with references to
-        system libraries. The result is a NON-self-contained app bundle.'''
-        )
-        parser.add_argument(
-            '-d',
-            '--executable-directory',
-            dest='executable_root_path',
-            action='store',
-            type=os.path.abspath,
-            help='Defines the executable root directory that will be included in the app.'
-        )
-        parser.add_argument(
-            '-e',
-            '--environment',
-            dest='environment_vars',
-            action='store',
-            nargs='+',
-            help='Specifies which environment variables -- set on the current interpreter startup -- '
-            ' shall be included in the app bundle.'
-        )
-        parser.add_argument(
-            '-i',
-            '--icon',
-            dest='icon_path',
-            action='store',
-            type=os.path.abspath,
-            help='Image file that is used for app icon creation. It must be quadratic with a '
-            'resolution of 1024x1024 pixels or more.'
-        )
-        parser.add_argument(
-            '-g',
-            '--group',
-            dest='group',
-            action='store',
-            help='Developer group name that is saved to the internal app plist.'
-        )
-        parser.add_argument(
-            '-n', '--hidden', dest='hidden', action='store_true', help='Hides the app icon in the dock when given.'
-        )
-        parser.add_argument(
-            '-o',
-            '--output',
-            dest='app_path',
-            action='store',
-            type=os.path.abspath,
-            help='Sets the path the app will be saved to.'
-        )
-        parser.add_argument(
-            '-v',
-            '--version',
-            dest='version_string',
-            action='store',
-            help='Specifies the version string of the program.'
-        )
-        parser.add_argument(
-            'executable_path',
-            action='store',
-            type=os.path.abspath,
-            help='Sets the executable that is started when the app is opened.'
-        )
-        plugins.add_plugin_command_line_arguments(parser)
-        if len(sys.argv) < 2:
+        parser = create_argument_parser(parser_class)
+        if len(argv if argv is not None else sys.argv[1:]) < 1:
             parser.print_help()
-            sys.exit(1)
-        args = parser.parse_args()
+            parser.exit(1)
+        args = parser.parse_args(argv)
+        if args.jobs is not None and args.jobs < 1:
+            parser.error('argument -j/--jobs: must be at least 1')
         return args
 
     def map_environment_arguments_to_dict(enviroment_argument_list):
@@ -205,6 +244,10 @@ def parse_args():
             keys_and_values = [item.split('=') for item in enviroment_argument_list]
             for item in keys_and_values:
                 if len(item) < 2:
+                    if item[0] not in os.environ:
+                        raise InvalidConfigError(
+                            'The environment variable {name} is not set.'.format(name=item[0])
+                        )
                     item.append(os.environ[item[0]])
             result = dict(keys_and_values)
         else:
@@ -217,7 +260,13 @@ def parse_args():
     checked_args['icon_path'] = args.icon_path
     checked_args['group'] = args.group if args.group else 'undefined'
     checked_args['hidden'] = args.hidden
+    checked_args['update'] = args.update
+    checked_args['trace_path'] = args.trace_path
+    checked_args['jobs'] = args.jobs
+    checked_args['verbose'] = args.verbose
     checked_args['environment_vars'] = map_environment_arguments_to_dict(args.environment_vars)
+    checked_args['extra_plist_keys'] = read_plist_file(args.extra_plist_path) if args.extra_plist_path else None
+    checked_args['plist_format'] = args.plist_format
     if args.app_path is not None:
         checked_args['app_path'] = args.app_path
     else:
@@ -232,11 +281,12 @@ def parse_args():
     plugin_args = plugins.parse_command_line_arguments(os.path.splitext(checked_args['executable_path'])[1], args)
 
     args = checked_args.copy()
-    args.update(plugin_args)
+    if plugin_args is not NotImplemented:
+        args.update(plugin_args)
     return Arguments(**args)
 
 
-def create_info_plist_content(
+def create_info_plist(
     app_name,
     version,
     group,
@@ -244,7 +294,8 @@ def create_info_plist_content(
     executable_root_path=None,
     icon_path=None,
     hidden=False,
-    environment_vars=None
+    environment_vars=None,
+    extra_keys=None
 ):
     def get_short_version(version):
         match_obj = re.search(r'\d+(\.\d+){0,2}', version)
@@ -264,38 +315,55 @@ def create_info_plist_content(
     else:
         executable = executable_path
 
-    variables = {
-        'executable': executable,
-        'icon_file': os.path.basename(icon_path) if icon_path is not None else None,
-        'name': app_name,
-        'group': group,
-        'hidden': hidden,
-        'short_version': get_short_version(version),
-        'version': version
+    info_plist = {
+        'CFBundleDevelopmentRegion': 'English',
+        'CFBundleExecutable': executable,
+        'CFBundleIdentifier': '{group}.{name}'.format(group=group, name=app_name),
+        'CFBundleInfoDictionaryVersion': '6.0',
+        'CFBundleName': app_name,
+        'CFBundleDisplayName': app_name,
+        'CFBundleShortVersionString': get_short_version(version),
+        'CFBundleVersion': version,
+        'CFBundlePackageType': 'APPL',
+        'CFBundleSignature': '????',
+        'NSSupportsAutomaticGraphicsSwitching': True
     }
-
+    if icon_path is not None:
+        info_plist['CFBundleIconFile'] = os.path.basename(icon_path)
+    if hidden:
+        info_plist['LSUIElement'] = True
     if environment_vars is not None:
-        environment_variables = dict(((key, os.environ[key]) for key in environment_vars))
-        variables['environment'] = environment_variables
-
-    template = Template(INFO_PLIST_TEMPLATE)
-    info_plist = template.render(**variables)
+        info_plist['LSEnvironment'] = dict(environment_vars)
+    if extra_keys is not None:
+        info_plist.update(extra_keys)
 
     return info_plist
 
 
+def serialize_info_plist(info_plist, plist_format='xml'):
+    if hasattr(plistlib, 'dumps'):
+        return plistlib.dumps(
+            info_plist, fmt=plistlib.FMT_BINARY if plist_format == 'binary' else plistlib.FMT_XML, sort_keys=True
+        )
+    if plist_format == 'binary':
+        raise InvalidPlistFormatError('Binary plists can only be written with Python 3.4 or newer.')
+    return plistlib.writePlistToString(info_plist)
+
+
+def read_plist_file(plist_path):
+    with open(plist_path, 'rb') as f:
+        if hasattr(plistlib, 'load'):
+            return plistlib.load(f)
+        return plistlib.readPlist(f)
+
+
 def create_icon_set(icon_path, iconset_out_path):
-    with TemporaryDirectory() as tmp_dir:
-        tmp_icns_dir = os.path.join(tmp_dir, 'icon.iconset')
-        os.mkdir(tmp_icns_dir)
-        original_icon = Image.open(icon_path)
-        for name, size in (
-            ('icon_{size}x{size}{suffix}.png'.format(size=size, suffix=suffix), factor * size)
-            for size in (16, 32, 128, 256, 512) for factor, suffix in ((1, ''), (2, '@2x'))
-        ):
-            resized_icon = original_icon.resize((size, size), Image.ANTIALIAS)
-            resized_icon.save(os.path.join(tmp_icns_dir, name))
-        subprocess.check_call(('iconutil', '--convert', 'icns', tmp_icns_dir, '--output', iconset_out_path))
+    # The icon module imports PIL, which is only needed if an icon is given
+    from . import icon
+
+    icns_data = icon.create_icns(icon_path)
+    with open(iconset_out_path, 'wb') as f:
+        f.write(icns_data)
 
 
 def create_dmg(app_name, app_path, dmg_path):
@@ -323,25 +391,39 @@ def create_app(
     icon_path=None,
     hidden=False,
     environment_vars=None,
+    extra_plist_keys=None,
+    plist_format='xml',
+    update=False,
+    trace_path=None,
+    jobs=None,
+    verbose=False,
     **kwargs
 ):
     def abs_path(relative_bundle_path, base=None):
         return os.path.abspath(os.path.join(base or app_path, relative_bundle_path))
 
     def error_checks():
-        if os.path.exists(abs_path('.')):
+        if os.path.exists(abs_path('.')) and not (update and not dmg_requested):
             raise AppAlreadyExistingError('The app path {app_path} already exists.'.format(app_path=app_path))
         if dmg_requested and os.path.exists(dmg_path):
             raise DmgAlreadyExistingError('The dmg path {dmg_path} already exists.'.format(dmg_path=dmg_path))
         if executable_root_path is not None and abs_path('.').startswith(os.path.abspath(executable_root_path) + '/'):
             raise InvalidAppPath('The specified app path is a subpath of the source root directory.')
 
-    def write_info_plist():
-        info_plist_content = create_info_plist_content(
+    def get_info_plist(app_executable_path):
+        return create_info_plist(
             app_name, version_string, group, app_executable_path, executable_root_path, bundle_icon_path, hidden,
-            environment_vars
+            environment_vars, extra_plist_keys
         )
-        with codecs.open(abs_path('Info.plist', contents_path), 'w', 'utf-8') as f:
+
+    def write_info_plist(app_executable_path):
+        info_plist_content = serialize_info_plist(get_info_plist(app_executable_path), plist_format)
+        info_plist_path = abs_path('Info.plist', contents_path)
+        if os.path.isfile(info_plist_path):
+            with open(info_plist_path, 'rb') as f:
+                if f.read() == info_plist_content:
+                    return
+        with open(info_plist_path, 'wb') as f:
             f.write(info_plist_content)
 
     def write_pkg_info():
@@ -350,14 +432,88 @@ def create_app(
 
     def copy_source():
         if executable_root_path is None:
-            shutil.copy(executable_path, macos_path)
+            fastcopy.copy_file(executable_path, macos_path)
         else:
             os.rmdir(macos_path)
-            shutil.copytree(executable_root_path, macos_path)
+            fastcopy.copy_tree(executable_root_path, macos_path)
 
-    def set_file_permissions():
+    def create_icon_set_or_raise():
+        try:
+            create_icon_set(icon_path, bundle_icon_path)
+        except IOError as e:
+            raise MissingIconError(e)
+
+    def set_file_permissions(app_executable_path):
         os.chmod(abs_path(app_executable_path, macos_path), 0o555)
 
+    def get_new_app_executable_path():
+        # The plugin replaces the bundle executable with its startup script
+        return task_graph.get_result('startup') if task_graph.has_output('startup') else app_executable_path
+
+    def get_plugin_input_file_hashes():
+        # Plugin arguments that name files (e.g. a conda requirements file or a makefile) are hashed by content, so
+        # editing such a file causes a full rebuild on updates
+        return dict(
+            (key, cache.hash_file(value).hexdigest()) for key, value in kwargs.items()
+            if isinstance(value, (type(''), str)) and os.path.isfile(value)
+        )
+
+    def get_launcher_inputs_hash():
+        # The launcher and everything else created by plugins only depends on these inputs (plugins may embed
+        # Info.plist values into the launcher)
+        launcher_inputs = {
+            'executable_path': executable_path,
+            'executable_root_path': executable_root_path,
+            'info_plist': [
+                app_name, version_string, group, icon_path is not None, hidden, environment_vars, extra_plist_keys
+            ],
+            'plugin_arguments': kwargs,
+            'plugin_input_files': get_plugin_input_file_hashes(),
+            'version': __version__
+        }
+        return hashlib.sha256(json.dumps(launcher_inputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def write_manifest(source_files, app_executable_path, file_entries=None):
+        if file_entries is None:
+            file_entries = manifest.create_file_entries(source_files)
+        app_manifest = manifest.Manifest(
+            file_entries, {
+                'launcher': launcher_inputs_hash,
+                'app_executable_path': app_executable_path,
+                'icon': manifest.file_entry(icon_path) if icon_path is not None else None
+            }
+        )
+        app_manifest.write(abs_path(manifest.MANIFEST_FILENAME, resources_path))
+
+    def update_app():
+        # Returns `False` if the existing bundle cannot be updated incrementally
+        if kwargs.get('incremental_update_unsupported'):
+            return False  # a plugin moves or transforms the copied source files
+        app_manifest = manifest.Manifest.read(abs_path(manifest.MANIFEST_FILENAME, resources_path))
+        if app_manifest is None or app_manifest.inputs.get('launcher') != launcher_inputs_hash:
+            return False
+        source_files = manifest.list_source_files(executable_root_path or executable_path)
+        changed_paths, removed_paths, new_entries = manifest.diff_files(source_files, app_manifest.files)
+        manifest.remove_files(macos_path, removed_paths + changed_paths, source_files)
+        for relative_path in removed_paths:
+            del app_manifest.files[relative_path]
+        for relative_path in changed_paths:
+            target_file_path = abs_path(relative_path, macos_path)
+            if not os.path.isdir(os.path.dirname(target_file_path)):
+                os.makedirs(os.path.dirname(target_file_path))
+            fastcopy.copy_file(source_files[relative_path], target_file_path)
+        plugins.update_app(
+            os.path.splitext(executable_path)[1], app_path, macos_path, resources_path, changed_paths, **kwargs
+        )
+        app_manifest.files.update(new_entries)
+        if icon_path is None:
+            if os.path.isfile(abs_path('Icon.icns', resources_path)):
+                os.remove(abs_path('Icon.icns', resources_path))
+        elif not manifest.is_file_unchanged(icon_path, app_manifest.inputs.get('icon')):
+            create_icon_set(icon_path, bundle_icon_path)
+        logging.info('updated %d and removed %d files', len(changed_paths), len(removed_paths))
+        return app_manifest.files, app_manifest.inputs['app_executable_path']
+
     directory_structure = ('Contents', 'Contents/MacOS', 'Contents/Resources')
     app_name = os.path.splitext(os.path.basename(app_path))[0]
     dmg_requested = (os.path.splitext(app_path)[1] == '.dmg')
@@ -373,36 +529,153 @@ def create_app(
         app_executable_path = os.path.relpath(executable_path, executable_root_path)
     else:
         app_executable_path = os.path.basename(executable_path)
+    launcher_inputs_hash = get_launcher_inputs_hash()
 
     error_checks()
 
+    if update and not dmg_requested and os.path.exists(abs_path('.')):
+        with trace.stage('update_app', macos_path):
+            update_result = update_app()
+        if update_result:
+            file_entries, app_executable_path = update_result
+            write_info_plist(app_executable_path)
+            set_file_permissions(app_executable_path)
+            with trace.stage('write_manifest'):
+                write_manifest(None, app_executable_path, file_entries)
+            return None
+        if not os.path.isfile(abs_path('Info.plist', contents_path)):
+            raise AppAlreadyExistingError(
+                'The app path {app_path} already exists and is no app bundle.'.format(app_path=app_path)
+            )
+        # The launcher inputs changed or the bundle has no manifest, so the whole bundle is rebuilt
+        with trace.stage('remove_app'):
+            shutil.rmtree(abs_path('.'))
+
     for current_path in (abs_path(dir) for dir in directory_structure):
         os.makedirs(current_path)
-    copy_source()
+    # The build stages declare their inputs and outputs, so independent stages (e.g. the source copy, the icon creation
+    # and the conda environment creation of the python plugin) run concurrently
+    task_graph = scheduler.TaskGraph()
+    task_graph.add('copy_source', copy_source, outputs=('source', ), output_path=macos_path)
     if icon_path is not None:
-        try:
-            create_icon_set(icon_path, bundle_icon_path)
-        except IOError as e:
-            raise MissingIconError(e)
-    setup_result = plugins.setup_startup(
-        os.path.splitext(executable_path)[1], app_path, executable_path, app_executable_path, executable_root_path,
-        macos_path, resources_path
+        task_graph.add('create_icon_set', create_icon_set_or_raise, outputs=('icon', ), output_path=bundle_icon_path)
+    plugins.add_startup_tasks(
+        os.path.splitext(executable_path)[1], task_graph, app_path, executable_path, app_executable_path,
+        executable_root_path, macos_path, resources_path, get_info_plist(app_executable_path), **kwargs
     )
-    if setup_result is not NotImplemented:
-        app_executable_path = setup_result
-    write_info_plist()
-    write_pkg_info()
-    set_file_permissions()
+    task_graph.add(
+        'write_info_plist',
+        lambda: write_info_plist(get_new_app_executable_path()),
+        inputs=('startup', ),
+        outputs=('info_plist', ),
+        output_path=contents_path
+    )
+    task_graph.add('write_pkg_info', write_pkg_info, outputs=('pkg_info', ), output_path=contents_path)
+    task_graph.add(
+        'set_file_permissions',
+        lambda: set_file_permissions(get_new_app_executable_path()),
+        inputs=('source', 'startup'),
+        outputs=('permissions', )
+    )
+    if update and not dmg_requested:
+        # The manifest is written last, so an interrupted build is never taken as complete on the next update
+        task_graph.add(
+            'write_manifest',
+            lambda: write_manifest(
+                manifest.list_source_files(executable_root_path or executable_path), get_new_app_executable_path()
+            ),
+            inputs=('source', 'icon', 'startup', 'info_plist', 'pkg_info', 'permissions'),
+            outputs=('manifest', )
+        )
     if dmg_requested:
-        create_dmg(app_name, app_path, dmg_path)
-        tmp_dir_wrapper.close()
+        task_graph.add(
+            'create_dmg',
+            lambda: create_dmg(app_name, app_path, dmg_path),
+            inputs=('source', 'icon', 'startup', 'info_plist', 'pkg_info', 'permissions'),
+            outputs=('dmg', ),
+            output_path=dmg_path
+        )
+    try:
+        task_graph.run(jobs)
+    finally:
+        if dmg_requested:
+            tmp_dir_wrapper.close()
+    return task_graph.get_critical_path()
+
+
+def run(args):
+    # Runs all build steps for parsed command line arguments and writes the trace file if requested. Returns the
+    # critical path of the build stages (`None` for incremental updates).
+    file_ext = os.path.splitext(args.executable_path)[1]
+    if args.verbose:
+        # The summaries of the build stages are logged on info level
+        logging.getLogger().setLevel(logging.INFO)
+    if args.trace_path is not None:
+        trace.enable()
+    try:
+        with trace.stage('shallow-appify', args.app_path):
+            plugins.pre_create_app(file_ext, **args)
+            with trace.stage('create_app'):
+                critical_path = create_app(**args)
+            plugins.post_create_app(file_ext, **args)
+    finally:
+        if args.trace_path is not None:
+            trace.write(args.trace_path)
+    return critical_path
+
+
+def config_to_argv(config):
+    # The executable path comes first, so it is not consumed by options that take several values
+    config = dict((key.replace('_', '-'), value) for key, value in config.items())
+    executable_paths = [config[key] for key in EXECUTABLE_CONFIG_KEYS if key in config]
+    if not executable_paths:
+        raise InvalidConfigError('The build configuration {config} has no executable.'.format(config=config))
+    argv = [executable_paths[0]]
+    for option, value in sorted(config.items()):
+        if option in EXECUTABLE_CONFIG_KEYS or value is None or value is False:
+            continue
+        if value is True:
+            argv.append('--' + option)
+        elif isinstance(value, (list, tuple)):
+            argv.append('--' + option)
+            argv.extend('{}'.format(item) for item in value)
+        else:
+            argv.extend(('--' + option, '{}'.format(value)))
+    return argv
+
+
+def parse_config(config):
+    # Validates a build configuration (see `build_app`) and converts it to arguments like `parse_args`; raises
+    # `InvalidConfigError` for unknown keys and invalid values
+    parser = create_argument_parser(ConfigArgumentParser)
+    known_keys = set(EXECUTABLE_CONFIG_KEYS)
+    for action in parser._actions:
+        known_keys.update(option[2:] for option in action.option_strings if option.startswith('--'))
+    known_keys.discard('help')
+    unknown_keys = sorted(set(key.replace('_', '-') for key in config) - known_keys)
+    if unknown_keys:
+        raise InvalidConfigError(
+            'The build configuration contains unknown keys: {keys}'.format(keys=', '.join(unknown_keys))
+        )
+    return parse_args(config_to_argv(config), ConfigArgumentParser)
+
+
+def build_app(config):
+    # Builds an app bundle from a mapping of long command line options (without leading dashes) to values, e.g.
+    # `{'executable': 'main.py', 'output': 'Main.app', 'hidden': True}`, or from the result of `parse_args`. All
+    # state of a build (including the configuration of the plugin) is passed along with its arguments, so several
+    # builds can run concurrently on threads of one process. Relative paths are resolved against the current working
+    # directory.
+    if not isinstance(config, Arguments):
+        config = parse_config(config)
+    return run(config)
 
 
 def main():
     args = parse_args()
-    plugins.pre_create_app(os.path.splitext(args.executable_path)[1], **args)
-    create_app(**args)
-    plugins.post_create_app(os.path.splitext(args.executable_path)[1], **args)
+    critical_path = run(args)
+    if critical_path:
+        print(scheduler.format_critical_path(critical_path))
 
 
 if __name__ == '__main__':
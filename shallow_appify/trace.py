@@ -0,0 +1,181 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import codecs
+import contextlib
+import json
+import os
+import os.path
+import sys
+import threading
+import time
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+# Every thread has its own tracer, so concurrent builds in one process are traced separately
+_local = threading.local()
+
+
+class _Tracer(object):
+    def __init__(self):
+        self.start_time = time.time()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add_event(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def write(self, trace_path):
+        # The trace event format is read by chrome://tracing, Perfetto and speedscope
+        trace_content = {
+            'traceEvents': [
+                {
+                    'name': 'process_name',
+                    'ph': 'M',
+                    'pid': os.getpid(),
+                    'args': {
+                        'name': 'shallow-appify'
+                    }
+                }
+            ] + sorted(self.events, key=lambda event: event['ts']),
+            'displayTimeUnit': 'ms'
+        }
+        with codecs.open(trace_path, 'w', 'utf-8') as f:
+            json.dump(trace_content, f, indent=1, sort_keys=True)
+
+
+def _get_cpu_time():
+    # Returns the cpu time of the calling thread and the scope it was measured in. Without `time.thread_time`
+    # (Python < 3.7) the process wide cpu time is used, which includes the work of concurrent builds in other threads.
+    if hasattr(time, 'thread_time'):
+        return time.thread_time(), 'thread'
+    times = os.times()
+    return times[0] + times[1], 'process'
+
+
+def _get_children_cpu_time():
+    # Finished child processes like `conda`, `make` or `compileall` cannot be attributed to a thread, so this is the
+    # process wide cpu time of all children
+    times = os.times()
+    return times[2] + times[3]
+
+
+def _get_peak_rss():
+    # Returns the peak resident set sizes (in bytes) of the whole process and its largest child process so far; both
+    # values are process wide and not specific to the traced stage
+    if resource is None:
+        return None, None
+    rss_unit = 1 if sys.platform == 'darwin' else 1024
+    return tuple(
+        resource.getrusage(who).ru_maxrss * rss_unit for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+    )
+
+
+def _get_tree_stats(root_path):
+    if root_path is None or not os.path.lexists(root_path):
+        return 0, 0
+    if not os.path.isdir(root_path) or os.path.islink(root_path):
+        return os.lstat(root_path).st_size, 1
+    total_size = 0
+    file_count = 0
+    for current_root_path, _, filenames in os.walk(root_path):
+        for filename in filenames:
+            try:
+                total_size += os.lstat(os.path.join(current_root_path, filename)).st_size
+            except OSError:
+                continue  # removed by a concurrently running build stage
+            file_count += 1
+    return total_size, file_count
+
+
+def get_tracer():
+    return getattr(_local, 'tracer', None)
+
+
+@contextlib.contextmanager
+def use_tracer(tracer):
+    # Lets a worker thread record its stages in the trace of the thread which started it
+    previous_tracer = get_tracer()
+    _local.tracer = tracer
+    try:
+        yield
+    finally:
+        _local.tracer = previous_tracer
+
+
+def enable():
+    _local.tracer = _Tracer()
+
+
+def is_enabled():
+    return get_tracer() is not None
+
+
+def write(trace_path):
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.write(trace_path)
+        _local.tracer = None
+
+
+@contextlib.contextmanager
+def stage(name, output_path=None, category='stage'):
+    # Records a complete trace event with the wall and cpu time of the enclosed code. If `output_path` is given, the
+    # size and file count differences of that file or directory tree are recorded as bytes and files written.
+    tracer = get_tracer()
+    if tracer is None:
+        yield
+        return
+    size_before, file_count_before = _get_tree_stats(output_path)
+    cpu_time_before, cpu_time_scope = _get_cpu_time()
+    children_cpu_time_before = _get_children_cpu_time()
+    start_time = time.time()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        end_time = time.time()
+        cpu_time = _get_cpu_time()[0] - cpu_time_before
+        children_cpu_time = _get_children_cpu_time() - children_cpu_time_before
+        size_after, file_count_after = _get_tree_stats(output_path)
+        peak_rss_process, peak_children_rss_process = _get_peak_rss()
+        event_args = {
+            'wall_time': end_time - start_time,
+            'cpu_time': cpu_time,
+            'cpu_time_scope': cpu_time_scope,
+            'children_cpu_time_process': children_cpu_time,
+            'peak_rss_process': peak_rss_process,
+            'peak_children_rss_process': peak_children_rss_process,
+            'failed': failed
+        }
+        if output_path is not None:
+            event_args.update(
+                {
+                    'output_path': output_path,
+                    'bytes_written': size_after - size_before,
+                    'files_written': file_count_after - file_count_before
+                }
+            )
+        tracer.add_event(
+            {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': int((start_time - tracer.start_time) * 1e6),
+                'dur': int((end_time - start_time) * 1e6),
+                'pid': os.getpid(),
+                'tid': threading.current_thread().ident,
+                'args': event_args
+            }
+        )
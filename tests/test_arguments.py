@@ -0,0 +1,46 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import json
+import logging
+import pytest
+from shallow_appify import batch
+from shallow_appify import shallow_appify
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.mark.parametrize('jobs', ('0', '-2'))
+def test_invalid_jobs(jobs):
+    with pytest.raises(shallow_appify.InvalidConfigError):
+        shallow_appify.parse_args(['-j', jobs, 'app.py'], shallow_appify.ConfigArgumentParser)
+    with pytest.raises(SystemExit):
+        shallow_appify.parse_args(['-j', jobs, 'app.py'])
+
+
+def test_valid_jobs():
+    args = shallow_appify.parse_args(['-j', '2', 'app.py'], shallow_appify.ConfigArgumentParser)
+    assert args.jobs == 2
+
+
+@pytest.mark.parametrize('jobs', (0, -1, 1.5, '2', True))
+def test_invalid_manifest_jobs(tmp_path, jobs):
+    manifest_path = tmp_path / 'manifest.json'
+    manifest_path.write_text(json.dumps({'apps': [{'executable': 'app.py'}], 'jobs': jobs}))
+    with pytest.raises(batch.ManifestError):
+        batch.read_manifest(str(manifest_path))
+
+
+def test_verbose_logs_stage_summaries(monkeypatch, tmp_path):
+    root_logger = logging.getLogger()
+    monkeypatch.setattr(root_logger, 'level', logging.WARNING)
+    (tmp_path / 'app.py').write_bytes(b'def main():\n    pass\n')
+    config = {'executable': str(tmp_path / 'app.py'), 'output': str(tmp_path / 'App.app')}
+    assert not shallow_appify.parse_config(config).verbose
+    shallow_appify.build_app(dict(config, verbose=True))
+    assert root_logger.level == logging.INFO
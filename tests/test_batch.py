@@ -0,0 +1,93 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import threading
+import time
+import pytest
+from shallow_appify import batch
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def events(monkeypatch):
+    # Replaces builds and icon renders with fakes that record their start and end; builds of apps named "slow" take
+    # longer than the others
+    events = []
+    lock = threading.Lock()
+
+    def record(event):
+        with lock:
+            events.append(event)
+
+    def build(working_dir_path, spec):
+        record(('start', spec['output']))
+        time.sleep(0.2 if 'slow' in spec['output'] else 0.05)
+        record(('end', spec['output']))
+        return True, None, 0.0
+
+    def render_icon(icon_path):
+        record(('start', icon_path))
+        time.sleep(0.05)
+        record(('end', icon_path))
+
+    monkeypatch.setattr(batch, 'build', build)
+    monkeypatch.setattr(batch, 'render_icon', render_icon)
+    return events
+
+
+def _spec(output, conda=None, cache_size=None, **kwargs):
+    spec = dict(executable='app.py', output=output, **kwargs)
+    if conda is not None:
+        spec['conda'] = conda
+    if cache_size is not None:
+        spec['conda-cache-size'] = cache_size
+    return spec
+
+
+def test_followers_wait_for_their_first_build(events):
+    specs = [
+        _spec('slow_first.app', 'slow.txt', 1024),
+        _spec('first.app', 'fast.txt', 1024),
+        _spec('follower.app', 'fast.txt', 1024),
+        _spec('slow_follower.app', 'slow.txt', 1024),
+    ]
+    results = batch.run_builds('/work', specs, jobs=4)
+    assert results == [(True, None, 0.0)] * 4
+    assert events.index(('start', 'follower.app')) > events.index(('end', 'first.app'))
+    assert events.index(('start', 'slow_follower.app')) > events.index(('end', 'slow_first.app'))
+    # A follower does not wait for the first builds of other environments
+    assert events.index(('end', 'follower.app')) < events.index(('end', 'slow_first.app'))
+
+
+def test_builds_without_cache_run_concurrently(events):
+    specs = [_spec('slow_first.app', 'env.txt'), _spec('slow_second.app', 'env.txt', 0)]
+    batch.run_builds('/work', specs, jobs=2)
+    assert events.index(('start', 'slow_second.app')) < events.index(('end', 'slow_first.app'))
+
+
+def test_different_environment_options_do_not_share(events):
+    specs = [
+        _spec('slow_first.app', 'env.txt', 1024),
+        _spec('slow_second.app', 'env.txt', 1024, **{'conda-dedup': True}),
+    ]
+    batch.run_builds('/work', specs, jobs=2)
+    assert events.index(('start', 'slow_second.app')) < events.index(('end', 'slow_first.app'))
+
+
+def test_icons_are_rendered_once_before_their_builds(events):
+    specs = [
+        _spec('first.app', icon='icon.png'),
+        _spec('second.app', icon='icon.png'),
+        _spec('slow_without_icon.app'),
+    ]
+    batch.run_builds('/work', specs, jobs=3)
+    assert events.count(('start', '/work/icon.png')) == 1
+    assert events.index(('start', 'slow_without_icon.app')) < events.index(('end', '/work/icon.png'))
+    for output in ('first.app', 'second.app'):
+        assert events.index(('start', output)) > events.index(('end', '/work/icon.png'))
@@ -0,0 +1,123 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import random
+import re
+import pytest
+from shallow_appify.plugins.util import binary_replace
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+def _reference_binary_replace(data, old, new):
+    # The original single pattern implementation which read the whole file and replaced with `re.sub`
+    def replace(match):
+        old_text = match.group()
+        new_text = old_text.replace(old, new)
+        if len(new) > len(old):
+            new_text = new_text[:len(old_text)]
+            padding = 0
+        else:
+            padding = len(old_text) - len(new_text)
+        return new_text + b'\0' * padding
+
+    fill_len = max(0, len(new) - len(old))
+    pattern = re.compile(re.escape(old) + b'([^\0]*?)\0' + ('.{%d}' % fill_len).encode('ascii'))
+    return pattern.sub(replace, data)
+
+
+def _replace_in_file(tmp_path, data, old_to_new):
+    file_path = tmp_path / 'binary'
+    file_path.write_bytes(data)
+    hit_counts = binary_replace.binary_replace_multiple(str(file_path), old_to_new)
+    return file_path.read_bytes(), hit_counts
+
+
+def _random_data(rng, pieces, length):
+    return b''.join(rng.choice(pieces) for _ in range(length))
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_single_pattern_matches_reference(tmp_path, seed):
+    rng = random.Random(seed)
+    old = b'/opt/anaconda'
+    new = rng.choice((b'/Applications/Test.app', b'/opt/x', b'/opt/anacondb', b''))
+    pieces = (old, old[:5], b'/lib', b'\0', b'\0\0\0', b'\n', b'a', b'\xff', b'/')
+    data = _random_data(rng, pieces, 200)
+    new_data, _ = _replace_in_file(tmp_path, data, {old: new})
+    assert len(new_data) == len(data)
+    assert new_data == _reference_binary_replace(data, old, new)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_multiple_patterns_match_sequential_reference(tmp_path, seed):
+    # Patterns that never occur in the same string give the same result as sequential single pattern replacements
+    rng = random.Random(seed)
+    old_to_new = {b'/opt/anaconda': b'/Applications/Test.app', b'/usr/local/conda': b'/opt/c'}
+    pieces = tuple(old_to_new) + (b'/lib', b'\0', b'\0\0\0\0\0\0\0\0\0\0', b'x')
+    data = _random_data(rng, pieces, 100)
+    data = b'\0'.join(part for part in data.split(b'\0') if sum(part.count(old) for old in old_to_new) <= 1)
+    expected_data = data
+    for old, new in old_to_new.items():
+        expected_data = _reference_binary_replace(expected_data, old, new)
+    new_data, _ = _replace_in_file(tmp_path, data, old_to_new)
+    assert new_data == expected_data
+
+
+def test_replace_shorter_prefix_pads_with_nul(tmp_path):
+    data = b'\x00/opt/anaconda/lib/libz.dylib\x00rest'
+    new_data, hit_counts = _replace_in_file(tmp_path, data, {'/opt/anaconda': '/opt/c'})
+    assert new_data == b'\x00/opt/c/lib/libz.dylib\x00\x00\x00\x00\x00\x00\x00\x00rest'
+    assert hit_counts == {b'/opt/anaconda': 1}
+
+
+def test_replace_longer_prefix_needs_fill_bytes(tmp_path):
+    # A longer prefix overwrites the following NUL bytes; strings without enough of them are left unchanged
+    data = b'/opt/a/lib\x00\x00\x00\x00\x00\x00|/opt/a/bin\x00x'
+    new_data, hit_counts = _replace_in_file(tmp_path, data, {'/opt/a': '/opt/abcd'})
+    assert new_data == b'/opt/abcd/lib\x00\x00\x00|/opt/a/bin\x00x'
+    assert hit_counts == {b'/opt/a': 1}
+
+
+def test_several_patterns_in_one_string(tmp_path):
+    data = b'/opt/a/bin:/opt/b/bin\x00\x00\x00\x00'
+    new_data, hit_counts = _replace_in_file(tmp_path, data, {'/opt/a': '/x', '/opt/b': '/yy'})
+    assert new_data == b'/x/bin:/yy/bin' + b'\x00' * 11
+    assert hit_counts == {b'/opt/a': 1, b'/opt/b': 1}
+
+
+def test_longer_pattern_wins_at_same_position(tmp_path):
+    data = b'/opt/anaconda3/lib\x00'
+    new_data, hit_counts = _replace_in_file(tmp_path, data, {'/opt/anaconda': '/a', '/opt/anaconda3': '/b'})
+    assert new_data == b'/b/lib\x00' + b'\x00' * 12
+    assert hit_counts == {b'/opt/anaconda': 0, b'/opt/anaconda3': 1}
+
+
+def test_files_without_matches_are_unchanged(tmp_path):
+    new_data, hit_counts = _replace_in_file(tmp_path, b'no prefix here\x00', {'/opt/a': '/b'})
+    assert new_data == b'no prefix here\x00'
+    assert hit_counts == {b'/opt/a': 0}
+    new_data, hit_counts = _replace_in_file(tmp_path, b'', {'/opt/a': '/b'})
+    assert new_data == b''
+
+
+def test_files_without_matches_are_not_opened_for_writing(monkeypatch, tmp_path):
+    file_path = tmp_path / 'data'
+    file_path.write_bytes(b'no prefix here\x00' * 100)
+    open_modes = []
+
+    def recording_open(file_path, mode='r', *args, **kwargs):
+        open_modes.append(mode)
+        return open(file_path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(binary_replace, 'open', recording_open, raising=False)
+    binary_replace.binary_replace_multiple(str(file_path), {'/opt/a': '/b', '/opt/b': '/c'})
+    assert open_modes == ['rb']
+    file_path.write_bytes(b'/opt/a\x00')
+    binary_replace.binary_replace_multiple(str(file_path), {'/opt/a': '/b', '/opt/b': '/c'})
+    assert open_modes == ['rb', 'rb', 'r+b']
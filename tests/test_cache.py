@@ -0,0 +1,70 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import os.path
+import pytest
+from shallow_appify import cache
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def cache_dir_path(tmp_path, monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_ENVIRONMENT_VARIABLE, str(tmp_path))
+    return str(tmp_path)
+
+
+def _fill_entry(size):
+    def fill_entry(entry_path):
+        with open(os.path.join(entry_path, 'data'), 'wb') as f:
+            f.write(b'x' * size)
+
+    return fill_entry
+
+
+def _set_last_usage_time(directory_cache, key, time):
+    os.utime(directory_cache._entry_path(key), (time, time))
+
+
+def test_store_and_use(cache_dir_path):
+    directory_cache = cache.DirectoryCache('test')
+    with directory_cache.use('missing') as entry_path:
+        assert entry_path is None
+    directory_cache.store('entry', _fill_entry(16))
+    with directory_cache.use('entry') as entry_path:
+        assert entry_path == os.path.join(cache_dir_path, 'test', 'entry')
+        with open(os.path.join(entry_path, 'data'), 'rb') as f:
+            assert f.read() == b'x' * 16
+    assert [name for name in os.listdir(os.path.join(cache_dir_path, 'test')) if not name.startswith('.')] == ['entry']
+
+
+def test_evict_least_recently_used(cache_dir_path):
+    directory_cache = cache.DirectoryCache('test', max_size=1536)
+    directory_cache.store('old', _fill_entry(1024))
+    _set_last_usage_time(directory_cache, 'old', 1000)
+    directory_cache.store('new', _fill_entry(1024))
+    with directory_cache.use('old') as entry_path:
+        assert entry_path is None
+    with directory_cache.use('new') as entry_path:
+        assert entry_path is not None
+
+
+def test_evict_skips_entries_in_use(cache_dir_path):
+    directory_cache = cache.DirectoryCache('test', max_size=2560)
+    directory_cache.store('pinned', _fill_entry(1024))
+    directory_cache.store('unused', _fill_entry(1024))
+    with directory_cache.use('pinned') as pinned_entry_path:
+        _set_last_usage_time(directory_cache, 'pinned', 1000)
+        _set_last_usage_time(directory_cache, 'unused', 2000)
+        directory_cache.store('new', _fill_entry(1024))
+        assert os.path.isdir(pinned_entry_path)
+    with directory_cache.use('unused') as entry_path:
+        assert entry_path is None
+    with directory_cache.use('new') as entry_path:
+        assert entry_path is not None
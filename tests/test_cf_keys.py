@@ -0,0 +1,42 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import pytest
+from shallow_appify import shallow_appify
+from shallow_appify.plugins import python
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+def test_app_keys_are_copied():
+    info_plist = shallow_appify.create_info_plist(
+        'App', '1.0', 'group', 'app.py', hidden=True, environment_vars={'A': 'B'}
+    )
+    cf_keys = python.get_cf_keys(info_plist, '__startup__.sh')
+    assert sorted(cf_keys) == sorted(
+        key for key in info_plist
+        if key.startswith('CF') or key in ('LSUIElement', 'NSSupportsAutomaticGraphicsSwitching')
+    )
+    assert cf_keys['CFBundleName'] == 'App'
+    assert cf_keys['CFBundleExecutable'] == '__startup__.sh'
+    assert 'LSEnvironment' not in cf_keys
+
+
+@pytest.mark.parametrize('skip_cf_keys', (False, True))
+def test_foundation_is_only_skipped_on_request(tmp_path, skip_cf_keys):
+    (tmp_path / 'app.py').write_bytes(b'def main():\n    pass\n')
+    shallow_appify.build_app(
+        {
+            'executable': str(tmp_path / 'app.py'),
+            'output': str(tmp_path / 'App.app'),
+            'skip-cf-keys': skip_cf_keys
+        }
+    )
+    startup_script = (tmp_path / 'App.app' / 'Contents' / 'MacOS' / '__startup__.py').read_text()
+    assert ('from Foundation import NSBundle' in startup_script) != skip_cf_keys
+    assert ("'CFBundleName': 'App'" in startup_script) != skip_cf_keys
@@ -0,0 +1,97 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import errno
+import os
+import pytest
+from shallow_appify.plugins.util import dedup
+from shallow_appify.plugins.util import precompile
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def env_path(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    for relative_path, data in (
+        ('a/lib.dylib', b'library'),
+        ('b/lib.dylib', b'library'),
+        ('b/copy.dylib', b'library'),
+        ('a/other.dylib', b'LIBRARY'),
+        ('a/empty', b''),
+        ('b/empty', b''),
+    ):
+        (tmp_path / relative_path).write_bytes(data)
+    return tmp_path
+
+
+def _inode(path):
+    stat_result = os.stat(str(path))
+    return stat_result.st_dev, stat_result.st_ino
+
+
+def test_identical_files_are_linked(env_path):
+    summary = dedup.deduplicate(str(env_path))
+    assert summary.files_scanned == 4
+    assert (summary.hardlink_count, summary.symlink_count) == (2, 0)
+    assert summary.bytes_saved == 2 * len(b'library')
+    # The first file in path order is the original
+    assert _inode(env_path / 'b' / 'lib.dylib') == _inode(env_path / 'a' / 'lib.dylib')
+    assert _inode(env_path / 'b' / 'copy.dylib') == _inode(env_path / 'a' / 'lib.dylib')
+    assert _inode(env_path / 'a' / 'other.dylib') != _inode(env_path / 'a' / 'lib.dylib')
+    assert _inode(env_path / 'a' / 'empty') != _inode(env_path / 'b' / 'empty')
+
+
+def test_different_permissions_are_not_linked(env_path):
+    os.chmod(str(env_path / 'b' / 'lib.dylib'), 0o755)
+    summary = dedup.deduplicate(str(env_path))
+    assert summary.hardlink_count == 1
+    assert _inode(env_path / 'b' / 'lib.dylib') != _inode(env_path / 'a' / 'lib.dylib')
+    assert _inode(env_path / 'b' / 'copy.dylib') == _inode(env_path / 'a' / 'lib.dylib')
+
+
+def test_excluded_files_are_not_linked(env_path):
+    summary = dedup.deduplicate(str(env_path), excluded_file_paths=[str(env_path / 'b' / 'lib.dylib')])
+    assert summary.hardlink_count == 1
+    assert _inode(env_path / 'b' / 'lib.dylib') != _inode(env_path / 'a' / 'lib.dylib')
+
+
+def test_existing_hard_links_are_counted_once(env_path):
+    os.remove(str(env_path / 'b' / 'copy.dylib'))
+    os.link(str(env_path / 'a' / 'lib.dylib'), str(env_path / 'b' / 'copy.dylib'))
+    summary = dedup.deduplicate(str(env_path))
+    assert summary.hardlink_count == 1
+    assert summary.bytes_saved == len(b'library')
+
+
+def test_symbolic_link_fallback(env_path, monkeypatch):
+    def link(source_path, target_path):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+    monkeypatch.setattr(dedup.os, 'link', link)
+    summary = dedup.deduplicate(str(env_path))
+    assert (summary.hardlink_count, summary.symlink_count) == (0, 2)
+    assert os.readlink(str(env_path / 'b' / 'lib.dylib')) == os.path.join('..', 'a', 'lib.dylib')
+    assert (env_path / 'b' / 'copy.dylib').read_bytes() == b'library'
+    assert sorted(os.listdir(str(env_path / 'b'))) == ['copy.dylib', 'empty', 'lib.dylib']
+
+
+def test_precompiled_sources_stay_current(tmp_path):
+    # Identical modules with different modification times are not linked, so their pyc files stay valid
+    for name, mtime in (('first.py', 1000), ('second.py', 2000), ('third.py', 2000)):
+        (tmp_path / name).write_bytes(b'value = 1\n')
+        os.utime(str(tmp_path / name), (mtime, mtime))
+    precompile.precompile([str(tmp_path)])
+    summary = dedup.deduplicate(str(tmp_path))
+    assert _inode(tmp_path / 'first.py') != _inode(tmp_path / 'second.py')
+    assert _inode(tmp_path / 'second.py') == _inode(tmp_path / 'third.py')
+    assert summary.hardlink_count >= 1
+    for name in ('first.py', 'second.py', 'third.py'):
+        source_path = str(tmp_path / name)
+        assert precompile.is_pyc_current(source_path, precompile.cache_from_source(source_path))
@@ -0,0 +1,48 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import pytest
+from shallow_appify import fastcopy
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    source_path = tmp_path / 'source'
+    (source_path / 'sub').mkdir(parents=True)
+    (source_path / 'file').write_bytes(b'data')
+    os.link(str(source_path / 'file'), str(source_path / 'sub' / 'linked_file'))
+    os.symlink('../file', str(source_path / 'sub' / 'symlink'))
+    return source_path
+
+
+def _inode(path):
+    stat_result = os.stat(str(path))
+    return stat_result.st_dev, stat_result.st_ino
+
+
+def test_copy_tree(tmp_path, source_path):
+    target_path = tmp_path / 'target'
+    fastcopy.copy_tree(str(source_path), str(target_path))
+    assert (target_path / 'file').read_bytes() == b'data'
+    assert (target_path / 'sub' / 'linked_file').read_bytes() == b'data'
+    # Hard links of the source tree are not preserved by default and symbolic links are followed
+    assert _inode(target_path / 'file') != _inode(target_path / 'sub' / 'linked_file')
+    assert not os.path.islink(str(target_path / 'sub' / 'symlink'))
+    assert (target_path / 'sub' / 'symlink').read_bytes() == b'data'
+    assert _inode(target_path / 'file') != _inode(source_path / 'file')
+
+
+def test_copy_tree_preserve_hardlinks(tmp_path, source_path):
+    target_path = tmp_path / 'target'
+    fastcopy.copy_tree(str(source_path), str(target_path), symlinks=True, preserve_hardlinks=True)
+    assert _inode(target_path / 'file') == _inode(target_path / 'sub' / 'linked_file')
+    assert _inode(target_path / 'file') != _inode(source_path / 'file')
+    assert os.readlink(str(target_path / 'sub' / 'symlink')) == '../file'
@@ -0,0 +1,101 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import gc
+import io
+import os
+import struct
+import weakref
+import pytest
+from PIL import Image
+from shallow_appify import cache
+from shallow_appify import icon
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def icon_path(tmp_path):
+    icon_path = str(tmp_path / 'icon.png')
+    Image.new('RGB', (1100, 1000), (0, 0, 255)).save(icon_path)
+    return icon_path
+
+
+@pytest.fixture
+def cache_dir_path(monkeypatch, tmp_path):
+    monkeypatch.setenv(cache.CACHE_DIR_ENVIRONMENT_VARIABLE, str(tmp_path / 'cache'))
+    return tmp_path / 'cache' / 'icons'
+
+
+def _read_chunks(icns_data):
+    chunks = []
+    offset = 8
+    while offset < len(icns_data):
+        icon_type, chunk_length = struct.unpack('>4sI', icns_data[offset:offset + 8])
+        chunks.append((icon_type, icns_data[offset + 8:offset + chunk_length]))
+        offset += chunk_length
+    assert offset == len(icns_data)
+    return chunks
+
+
+def test_full_resolution_image_is_freed_after_largest_size():
+    image = Image.new('RGBA', (2048, 2048), (255, 0, 0, 255))
+    image_reference = weakref.ref(image)
+    downscaled_images = icon.iter_downscaled_images(image, [16, 1024, 32])
+    del image
+    size, largest_image = next(downscaled_images)
+    gc.collect()
+    assert (size, largest_image.size) == (1024, (1024, 1024))
+    assert image_reference() is None
+    assert [size for size, _ in downscaled_images] == [32, 16]
+
+
+def test_icns_data_layout():
+    size_to_png_data = dict((size, 'png {size:d}'.format(size=size).encode('ascii')) for _, size in icon.ICNS_PNG_TYPES)
+    icns_data = icon.create_icns_data(size_to_png_data)
+    assert icns_data[:4] == b'icns'
+    assert struct.unpack('>I', icns_data[4:8])[0] == len(icns_data)
+    # Every chunk length includes its 8 byte header
+    assert _read_chunks(icns_data) == [
+        (icon_type, size_to_png_data[size]) for icon_type, size in icon.ICNS_PNG_TYPES
+    ]
+
+
+def test_render_icns(icon_path):
+    chunks = _read_chunks(icon.render_icns(icon_path, num_workers=2))
+    assert [icon_type for icon_type, _ in chunks] == [icon_type for icon_type, _ in icon.ICNS_PNG_TYPES]
+    for (_, size), (_, png_data) in zip(icon.ICNS_PNG_TYPES, chunks):
+        image = Image.open(io.BytesIO(png_data))
+        assert (image.format, image.size) == ('PNG', (size, size))
+
+
+def test_icns_cache(monkeypatch, icon_path, cache_dir_path):
+    rendered_icon_paths = []
+    render_icns = icon.render_icns
+
+    def counting_render_icns(icon_path, num_workers=None):
+        rendered_icon_paths.append(icon_path)
+        return render_icns(icon_path, num_workers)
+
+    monkeypatch.setattr(icon, 'render_icns', counting_render_icns)
+    icns_data = icon.create_icns(icon_path)
+    assert len(os.listdir(str(cache_dir_path))) == 1
+    assert icon.create_icns(icon_path) == icns_data
+    assert rendered_icon_paths == [icon_path]
+    # A changed icon is rendered again and stored in a new cache entry
+    Image.new('RGB', (1024, 1024), (0, 255, 0)).save(icon_path)
+    assert icon.create_icns(icon_path) != icns_data
+    assert len(rendered_icon_paths) == 2
+    assert len(os.listdir(str(cache_dir_path))) == 2
+    # An outdated icns format version is not used
+    monkeypatch.setattr(icon, 'ICNS_FORMAT_VERSION', icon.ICNS_FORMAT_VERSION + 1)
+    icon.create_icns(icon_path)
+    assert len(rendered_icon_paths) == 3
+    icon.create_icns(icon_path, use_cache=False)
+    assert len(rendered_icon_paths) == 4
+    assert len(os.listdir(str(cache_dir_path))) == 3
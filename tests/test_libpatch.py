@@ -0,0 +1,81 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import collections
+import os
+import pytest
+from shallow_appify.plugins.util import libpatch
+from shallow_appify.plugins.util import macho
+from test_macho import _build_slice
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+_NEW_PREFIX = '@executable_path/../lib/'
+
+
+@pytest.fixture
+def lib_dir_path(tmp_path):
+    # lib/libtest.dylib, lib/python/site-packages/module.so, a symbolic link and files that are no Mach-O libraries
+    (tmp_path / 'lib' / 'python' / 'site-packages').mkdir(parents=True)
+    (tmp_path / 'lib' / 'libtest.dylib').write_bytes(_build_slice())
+    (tmp_path / 'lib' / 'python' / 'site-packages' / 'module.so').write_bytes(_build_slice(is_64=False))
+    (tmp_path / 'lib' / 'python' / 'site-packages' / 'broken.so').write_bytes(b'no library')
+    (tmp_path / 'lib' / 'libtest.dylib.txt').write_bytes(_build_slice())
+    os.symlink('libtest.dylib', str(tmp_path / 'lib' / 'liblink.dylib'))
+    return tmp_path / 'lib'
+
+
+def test_find_libs(lib_dir_path):
+    assert libpatch.find_libs([str(lib_dir_path)]) == [
+        str(lib_dir_path / 'libtest.dylib'),
+        str(lib_dir_path / 'python' / 'site-packages' / 'broken.so'),
+        str(lib_dir_path / 'python' / 'site-packages' / 'module.so'),
+    ]
+
+
+def test_patch_libs(lib_dir_path):
+    summary = libpatch.patch_libs([str(lib_dir_path)], {'/opt/anaconda/lib/': _NEW_PREFIX}, num_workers=2)
+    assert (summary.libraries_visited, summary.references_rewritten) == (2, 2)
+    assert summary.wall_time >= 0
+    for lib_path in (lib_dir_path / 'libtest.dylib', lib_dir_path / 'python' / 'site-packages' / 'module.so'):
+        assert macho.read_paths(str(lib_path)).dependencies == [
+            _NEW_PREFIX + 'libz.1.dylib', '/usr/lib/libSystem.B.dylib'
+        ]
+    # A second run finds nothing to rewrite
+    summary = libpatch.patch_libs([str(lib_dir_path)], {'/opt/anaconda/lib/': _NEW_PREFIX})
+    assert summary.references_rewritten == 0
+
+
+def test_prefix_pairs_are_applied_in_order(tmp_path, lib_dir_path):
+    # The second pair matches the result of the first one, like sequential `patch_lib` calls
+    prefix_pairs = collections.OrderedDict((('/opt/anaconda/', '/first/'), ('/first/', '/second/')))
+    expected_lib_path = str(tmp_path / 'expected.dylib')
+    (tmp_path / 'expected.dylib').write_bytes(_build_slice())
+    for old_prefix, new_prefix in prefix_pairs.items():
+        libpatch.patch_lib(expected_lib_path, old_prefix, new_prefix)
+    libpatch.patch_libs([str(lib_dir_path)], prefix_pairs)
+    assert macho.read_paths(str(lib_dir_path / 'libtest.dylib')).dependencies == \
+        macho.read_paths(expected_lib_path).dependencies == ['/second/libz.1.dylib', '/usr/lib/libSystem.B.dylib']
+
+
+def test_dependencies_are_cached(monkeypatch, lib_dir_path):
+    lib_path = str(lib_dir_path / 'libtest.dylib')
+    read_paths_calls = []
+    read_paths = macho.read_paths
+
+    def counting_read_paths(file_path):
+        read_paths_calls.append(file_path)
+        return read_paths(file_path)
+
+    monkeypatch.setattr(macho, 'read_paths', counting_read_paths)
+    libpatch.read_dependencies(lib_path)
+    libpatch.read_dependencies(lib_path)
+    assert read_paths_calls == [lib_path]
+    # Patching invalidates the cache entry of the changed library
+    libpatch.patch_lib(lib_path, '/opt/anaconda/lib/', _NEW_PREFIX)
+    assert libpatch.read_dependencies(lib_path)[0] == _NEW_PREFIX + 'libz.1.dylib'
@@ -0,0 +1,195 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import struct
+import pytest
+from shallow_appify.plugins.util import macho
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+# The fixtures are minimal Mach-O files with a single __TEXT segment whose section contents start at `_DATA_START`, so
+# the load commands can grow into the padding before it
+_DATA_START = 0x200
+_SECTION_CONTENTS = b'\xcc' * 16
+_INSTALL_NAME = '/opt/anaconda/lib/libtest.dylib'
+_DEPENDENCIES = ('/opt/anaconda/lib/libz.1.dylib', '/usr/lib/libSystem.B.dylib')
+_RPATH = '/opt/anaconda/lib'
+
+
+def _pad(data, alignment):
+    return data + b'\0' * (-len(data) % alignment)
+
+
+def _path_command(cmd, path, alignment):
+    encoded_path = path.encode('utf-8') + b'\0'
+    if cmd == macho.LC_RPATH:
+        data = _pad(struct.pack('<3I', cmd, 0, 12) + encoded_path, alignment)
+    else:
+        data = _pad(struct.pack('<6I', cmd, 0, 24, 2, 0x10000, 0x10000) + encoded_path, alignment)
+    return data[:4] + struct.pack('<I', len(data)) + data[8:]
+
+
+def _segment_command(is_64):
+    if is_64:
+        segment = struct.pack(
+            '<2I16s4Q2i2I', macho.LC_SEGMENT_64, 72 + 80, b'__TEXT', 0, 0x1000, 0, _DATA_START + 16, 5, 5, 1, 0
+        )
+        section = struct.pack('<16s16s2Q8I', b'__text', b'__TEXT', _DATA_START, 16, _DATA_START, 0, 0, 0, 0, 0, 0, 0)
+    else:
+        segment = struct.pack(
+            '<2I16s4I2i2I', macho.LC_SEGMENT, 56 + 68, b'__TEXT', 0, 0x1000, 0, _DATA_START + 16, 5, 5, 1, 0
+        )
+        section = struct.pack('<16s16s9I', b'__text', b'__TEXT', _DATA_START, 16, _DATA_START, 0, 0, 0, 0, 0, 0)
+    return segment + section
+
+
+def _build_slice(is_64=True, signed=False):
+    alignment = 8 if is_64 else 4
+    commands = [
+        _segment_command(is_64),
+        _path_command(macho.LC_ID_DYLIB, _INSTALL_NAME, alignment),
+    ]
+    commands.extend(_path_command(macho.LC_LOAD_DYLIB, dependency, alignment) for dependency in _DEPENDENCIES)
+    commands.append(_path_command(macho.LC_RPATH, _RPATH, alignment))
+    if signed:
+        commands.append(struct.pack('<4I', macho.LC_CODE_SIGNATURE, 16, _DATA_START + 16, 0))
+    load_commands_data = b''.join(commands)
+    if is_64:
+        header = struct.pack('<8I', macho.MH_MAGIC_64, 0x01000007, 3, 6, len(commands), len(load_commands_data), 0, 0)
+    else:
+        header = struct.pack('<7I', macho.MH_MAGIC, 7, 3, 6, len(commands), len(load_commands_data), 0)
+    data = header + load_commands_data
+    return data + b'\0' * (_DATA_START - len(data)) + _SECTION_CONTENTS
+
+
+def _build_fat(slices):
+    slice_offsets = [0x1000 * (i + 1) for i in range(len(slices))]
+    data = struct.pack('>2I', macho.FAT_MAGIC, len(slices))
+    for i, (slice_data, slice_offset) in enumerate(zip(slices, slice_offsets)):
+        data += struct.pack('>5I', 7 + i, 3, slice_offset, len(slice_data), 12)
+    for slice_data, slice_offset in zip(slices, slice_offsets):
+        data += b'\0' * (slice_offset - len(data)) + slice_data
+    return data, slice_offsets
+
+
+@pytest.fixture
+def thin_path(tmp_path):
+    path = tmp_path / 'libtest.dylib'
+    path.write_bytes(_build_slice())
+    return str(path)
+
+
+@pytest.fixture
+def fat_path(tmp_path):
+    path = tmp_path / 'libfat.dylib'
+    path.write_bytes(_build_fat([_build_slice(is_64=True), _build_slice(is_64=False)])[0])
+    return str(path)
+
+
+@pytest.fixture
+def signed_path(tmp_path):
+    path = tmp_path / 'libsigned.dylib'
+    path.write_bytes(_build_slice(signed=True))
+    return str(path)
+
+
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_read_paths_thin(thin_path):
+    paths = macho.read_paths(thin_path)
+    assert paths.install_name == _INSTALL_NAME
+    assert paths.dependencies == list(_DEPENDENCIES)
+    assert paths.rpaths == [_RPATH]
+
+
+def test_read_paths_fat(fat_path):
+    assert macho.is_macho(fat_path)
+    paths = macho.read_paths(fat_path)
+    assert paths.install_name == _INSTALL_NAME
+    assert paths.dependencies == list(_DEPENDENCIES)
+    assert paths.rpaths == [_RPATH]
+
+
+def test_change_paths_round_trip_thin(thin_path):
+    new_dependency = '@executable_path/../Resources/conda_env/lib/libz.1.dylib'
+    changed_command_count = macho.change_paths(
+        thin_path, {_DEPENDENCIES[0]: new_dependency},
+        install_name='@rpath/libtest.dylib',
+        rpath_changes={_RPATH: '@loader_path'}
+    )
+    assert changed_command_count == 3
+    paths = macho.read_paths(thin_path)
+    assert paths.install_name == '@rpath/libtest.dylib'
+    assert paths.dependencies == [new_dependency, _DEPENDENCIES[1]]
+    assert paths.rpaths == ['@loader_path']
+    assert _read_bytes(thin_path)[_DATA_START:] == _SECTION_CONTENTS
+
+
+def test_change_paths_round_trip_fat(tmp_path):
+    path = tmp_path / 'libfat.dylib'
+    data, slice_offsets = _build_fat([_build_slice(is_64=True), _build_slice(is_64=False)])
+    path.write_bytes(data)
+    new_dependency = '@executable_path/../Resources/conda_env/lib/libz.1.dylib'
+    assert macho.change_paths(str(path), {_DEPENDENCIES[0]: new_dependency}) == 2
+    with open(str(path), 'rb') as f:
+        for slice_offset in slice_offsets:
+            paths = macho._Slice(f, slice_offset).paths()
+            assert paths.dependencies == [new_dependency, _DEPENDENCIES[1]]
+    new_data = _read_bytes(str(path))
+    for slice_offset in slice_offsets:
+        assert new_data[slice_offset + _DATA_START:slice_offset + _DATA_START + 16] == _SECTION_CONTENTS
+
+
+def test_change_paths_without_changes(thin_path):
+    original_data = _read_bytes(thin_path)
+    assert macho.change_paths(thin_path, {'/not/a/dependency.dylib': '/other.dylib'}) == 0
+    assert macho.change_paths(thin_path, {_DEPENDENCIES[0]: _DEPENDENCIES[0]}) == 0
+    assert _read_bytes(thin_path) == original_data
+
+
+@pytest.mark.parametrize('path_fixture', ('thin_path', 'fat_path'))
+def test_change_paths_name_does_not_fit(request, path_fixture):
+    path = request.getfixturevalue(path_fixture)
+    original_data = _read_bytes(path)
+    with pytest.raises(macho.InsufficientHeaderSpaceError):
+        macho.change_paths(path, install_name='/' + 'x' * _DATA_START)
+    assert _read_bytes(path) == original_data
+
+
+def test_is_macho_rejects_other_files(tmp_path):
+    text_path = tmp_path / 'text.txt'
+    text_path.write_bytes(b'no Mach-O file')
+    java_class_path = tmp_path / 'Test.class'
+    java_class_path.write_bytes(struct.pack('>2I', macho.FAT_MAGIC, 52) + b'\0' * 64)
+    assert not macho.is_macho(str(text_path))
+    assert not macho.is_macho(str(java_class_path))
+    with pytest.raises(macho.NotMachOError):
+        macho.read_paths(str(text_path))
+
+
+def test_change_paths_signed_fails_outside_macos(signed_path, monkeypatch):
+    monkeypatch.setattr(macho.sys, 'platform', 'linux')
+    original_data = _read_bytes(signed_path)
+    with pytest.raises(macho.CodeSignatureError):
+        macho.change_paths(signed_path, {_DEPENDENCIES[0]: '@rpath/libz.1.dylib'})
+    assert _read_bytes(signed_path) == original_data
+    # Reading and unchanged files do not need a new signature
+    assert macho.read_paths(signed_path).dependencies == list(_DEPENDENCIES)
+    assert macho.change_paths(signed_path, {_DEPENDENCIES[0]: _DEPENDENCIES[0]}) == 0
+
+
+def test_change_paths_signed_is_resigned_on_macos(signed_path, monkeypatch):
+    signed_paths = []
+    monkeypatch.setattr(macho.sys, 'platform', 'darwin')
+    monkeypatch.setattr(macho, '_sign', signed_paths.append)
+    assert macho.change_paths(signed_path, {_DEPENDENCIES[0]: '@rpath/libz.1.dylib'}) == 1
+    assert signed_paths == [signed_path]
+    assert macho.read_paths(signed_path).dependencies == ['@rpath/libz.1.dylib', _DEPENDENCIES[1]]
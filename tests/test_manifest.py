@@ -0,0 +1,78 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import pytest
+from shallow_appify import manifest
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'main.py').write_bytes(b'import pkg\n')
+    (tmp_path / 'pkg' / '__init__.py').write_bytes(b'')
+    (tmp_path / 'pkg' / 'module.py').write_bytes(b'value = 1\n')
+    return tmp_path
+
+
+def _set_mtime(path, mtime):
+    os.utime(str(path), (mtime, mtime))
+
+
+def test_diff_unchanged(source_path):
+    source_files = manifest.list_source_files(str(source_path))
+    assert sorted(source_files) == ['main.py', os.path.join('pkg', '__init__.py'), os.path.join('pkg', 'module.py')]
+    file_entries = manifest.create_file_entries(source_files)
+    assert manifest.diff_files(source_files, file_entries) == ([], [], {})
+
+
+def test_diff_changed_new_and_removed(source_path):
+    file_entries = manifest.create_file_entries(manifest.list_source_files(str(source_path)))
+    (source_path / 'pkg' / 'module.py').write_bytes(b'value = 2\n')
+    _set_mtime(source_path / 'pkg' / 'module.py', 1000)
+    (source_path / 'pkg' / 'new.py').write_bytes(b'')
+    os.remove(str(source_path / 'main.py'))
+    source_files = manifest.list_source_files(str(source_path))
+    changed_paths, removed_paths, new_entries = manifest.diff_files(source_files, file_entries)
+    assert changed_paths == [os.path.join('pkg', 'module.py'), os.path.join('pkg', 'new.py')]
+    assert removed_paths == ['main.py']
+    assert sorted(new_entries) == changed_paths
+    assert new_entries[os.path.join('pkg', 'module.py')] == manifest.file_entry(str(source_path / 'pkg' / 'module.py'))
+
+
+def test_diff_touched_file_is_unchanged(source_path):
+    # A file with a new modification time but the same content only gets a new entry
+    file_entries = manifest.create_file_entries(manifest.list_source_files(str(source_path)))
+    _set_mtime(source_path / 'main.py', 1000)
+    source_files = manifest.list_source_files(str(source_path))
+    changed_paths, removed_paths, new_entries = manifest.diff_files(source_files, file_entries)
+    assert (changed_paths, removed_paths) == ([], [])
+    assert list(new_entries) == ['main.py']
+    assert new_entries['main.py'][1] == 1000
+    assert new_entries['main.py'][2] == file_entries['main.py'][2]
+
+
+def test_manifest_round_trip(tmp_path, source_path):
+    file_entries = manifest.create_file_entries(manifest.list_source_files(str(source_path)))
+    manifest_path = str(tmp_path / manifest.MANIFEST_FILENAME)
+    manifest.Manifest(file_entries, {'icon': 'hash'}).write(manifest_path)
+    read_manifest = manifest.Manifest.read(manifest_path)
+    assert read_manifest.files == file_entries
+    assert read_manifest.inputs == {'icon': 'hash'}
+    assert manifest.Manifest.read(str(tmp_path / 'missing.json')) is None
+
+
+def test_remove_files(source_path):
+    (source_path / 'pkg' / '__pycache__').mkdir()
+    (source_path / 'pkg' / '__pycache__' / 'module.cpython-37.pyc').write_bytes(b'')
+    (source_path / 'pkg' / 'module.pyc').write_bytes(b'')
+    manifest.remove_files(str(source_path), [os.path.join('pkg', 'module.py'), os.path.join('pkg', '__init__.py')])
+    assert not os.path.exists(str(source_path / 'pkg'))
+    assert (source_path / 'main.py').exists()
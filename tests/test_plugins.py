@@ -0,0 +1,62 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import subprocess
+import sys
+import pytest
+from shallow_appify import cache
+from shallow_appify import plugins
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def query_calls(monkeypatch, tmp_path):
+    monkeypatch.setenv(cache.CACHE_DIR_ENVIRONMENT_VARIABLE, str(tmp_path))
+    query_calls = []
+
+    def query_entry_points():
+        query_calls.append(True)
+        return [['.rb', 'shallow_appify_ruby:plugin']]
+
+    monkeypatch.setattr(plugins, '_query_entry_points', query_entry_points)
+    return query_calls
+
+
+def test_entry_points_are_cached(query_calls):
+    assert plugins._iter_entry_points() == [['.rb', 'shallow_appify_ruby:plugin']]
+    assert plugins._iter_entry_points() == [['.rb', 'shallow_appify_ruby:plugin']]
+    assert len(query_calls) == 1
+
+
+def test_entry_points_cache_is_invalidated(monkeypatch, tmp_path, query_calls):
+    plugins._iter_entry_points()
+    # A newly installed distribution changes the modification time of a directory on the module search path
+    (tmp_path / 'site-packages').mkdir()
+    monkeypatch.setattr(sys, 'path', sys.path + [str(tmp_path / 'site-packages')])
+    plugins._iter_entry_points()
+    assert len(query_calls) == 2
+
+
+def test_registry_uses_entry_points(monkeypatch, query_calls):
+    monkeypatch.setattr(plugins, '_registry', None)
+    assert plugins._get_registry()['rb'] == ('shallow_appify_ruby', 'shallow_appify_ruby')
+    assert plugins._get_registry()['py'] == ('shallow_appify.plugins.python', 'shallow_appify.plugins.python_arguments')
+
+
+def test_command_line_does_not_import_pil(monkeypatch, tmp_path):
+    monkeypatch.setenv(cache.CACHE_DIR_ENVIRONMENT_VARIABLE, str(tmp_path))
+    imported_modules = subprocess.check_output(
+        [
+            sys.executable, '-c', 'import sys\nfrom shallow_appify import shallow_appify\n'
+            'shallow_appify.create_argument_parser()\nprint(" ".join(sys.modules))'
+        ]
+    ).decode('utf-8').split()
+    assert 'shallow_appify.plugins' in imported_modules
+    assert 'PIL' not in imported_modules
+    assert 'shallow_appify.plugins.python' not in imported_modules
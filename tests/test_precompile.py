@@ -0,0 +1,58 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+from multiprocessing.pool import ThreadPool
+import pytest
+from shallow_appify.plugins.util import precompile
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'main.py').write_bytes(b'import pkg\n')
+    (tmp_path / 'pkg' / '__init__.py').write_bytes(b'value = 1\n')
+    (tmp_path / 'pkg' / 'broken.py').write_bytes(b'def broken(:\n')
+    return tmp_path
+
+
+def test_precompile(source_path):
+    summary = precompile.precompile([str(source_path)], num_workers=2)
+    assert summary.compiled_count == 2
+    assert summary.skipped_count == 0
+    assert summary.failed_file_paths == [str(source_path / 'pkg' / 'broken.py')]
+    main_path = str(source_path / 'main.py')
+    assert precompile.is_pyc_current(main_path, precompile.cache_from_source(main_path))
+    # Current pyc files are skipped
+    summary = precompile.precompile([str(source_path)], num_workers=2)
+    assert (summary.compiled_count, summary.skipped_count) == (0, 2)
+    os.utime(main_path, (1000, 1000))
+    assert not precompile.is_pyc_current(main_path, precompile.cache_from_source(main_path))
+
+
+def test_precompile_on_threads(tmp_path):
+    # Builds precompile on the threads of the task scheduler
+    source_paths = []
+    for i in range(4):
+        (tmp_path / str(i)).mkdir()
+        (tmp_path / str(i) / 'module.py').write_bytes(b'value = 1\n')
+        source_paths.append(str(tmp_path / str(i)))
+    pool = ThreadPool(4)
+    try:
+        summaries = pool.map(lambda source_path: precompile.precompile([source_path], num_workers=2), source_paths)
+    finally:
+        pool.close()
+        pool.join()
+    assert [summary.compiled_count for summary in summaries] == [1, 1, 1, 1]
+
+
+def test_precompile_with_missing_interpreter(source_path):
+    with pytest.raises(precompile.PrecompileError):
+        precompile.precompile([str(source_path)], str(source_path / 'missing' / 'python'))
@@ -0,0 +1,61 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import pytest
+from shallow_appify.plugins.util import prefix_scan
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+_OLD_PREFIX = '/opt/anaconda'
+_NEW_PREFIX = '/Applications/Test.app/Contents/Resources/conda_env'
+
+
+@pytest.fixture
+def env_path(tmp_path):
+    (tmp_path / 'bin').mkdir()
+    (tmp_path / 'lib').mkdir()
+    (tmp_path / 'bin' / 'script').write_bytes(b'#!/opt/anaconda/bin/python\nprint("/opt/anaconda/lib")\n')
+    (tmp_path / 'lib' / 'libtest.dylib').write_bytes(
+        b'\xcf\xfa\xed\xfe' + b'\x00' * 12 + b'/opt/anaconda/lib\x00' + b'\x00' * 64
+    )
+    (tmp_path / 'lib' / 'unrelated.txt').write_bytes(b'no prefix\n')
+    (tmp_path / 'lib' / 'module.pyc').write_bytes(b'/opt/anaconda/lib\x00')
+    os.symlink(str(tmp_path / 'bin' / 'script'), str(tmp_path / 'lib' / 'link'))
+    return tmp_path
+
+
+def test_replace_prefix(env_path):
+    scan_result = prefix_scan.replace_prefix(str(env_path), _OLD_PREFIX, _NEW_PREFIX)
+    assert scan_result.files_scanned == 3
+    assert scan_result.text_file_paths == [str(env_path / 'bin' / 'script')]
+    assert scan_result.binary_file_paths == [str(env_path / 'lib' / 'libtest.dylib')]
+    assert (env_path / 'bin' / 'script').read_bytes() == \
+        '#!{prefix}/bin/python\nprint("{prefix}/lib")\n'.format(prefix=_NEW_PREFIX).encode('utf-8')
+    # Binary files keep their size, the string is padded with NUL bytes
+    library_data = (env_path / 'lib' / 'libtest.dylib').read_bytes()
+    assert len(library_data) == 4 + 12 + 18 + 64
+    assert library_data[16:].startswith('{prefix}/lib\x00'.format(prefix=_NEW_PREFIX).encode('utf-8'))
+    assert (env_path / 'lib' / 'unrelated.txt').read_bytes() == b'no prefix\n'
+    # Excluded files and symbolic links are not touched
+    assert (env_path / 'lib' / 'module.pyc').read_bytes() == b'/opt/anaconda/lib\x00'
+    assert os.path.islink(str(env_path / 'lib' / 'link'))
+
+
+def test_prefix_across_chunk_boundary(tmp_path, monkeypatch):
+    monkeypatch.setattr(prefix_scan, 'READ_CHUNK_SIZE', 8)
+    (tmp_path / 'script').write_bytes(b'abcdefghij/opt/anaconda\n')
+    scan_result = prefix_scan.replace_prefix(str(tmp_path), _OLD_PREFIX, '/x')
+    assert scan_result.text_file_paths == [str(tmp_path / 'script')]
+    assert (tmp_path / 'script').read_bytes() == b'abcdefghij/x\n'
+
+
+def test_is_binary_data():
+    assert prefix_scan.is_binary_data(b'\xcf\xfa\xed\xfe some text')
+    assert prefix_scan.is_binary_data(b'text with a \x00 byte')
+    assert not prefix_scan.is_binary_data(b'#!/bin/sh\necho test\n')
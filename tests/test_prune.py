@@ -0,0 +1,106 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import pytest
+from shallow_appify.plugins.util import prune
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+_ENV_FILES = (
+    'bin/python',
+    'pkgs/numpy-1.0.tar.bz2',
+    'include/Python.h',
+    'lib/libpython3.7m.a',
+    'lib/libpython3.7m.dylib',
+    'lib/python3.7/os.py',
+    'lib/python3.7/test/test_os.py',
+    'lib/python3.7/site-packages/numpy/core.py',
+    'lib/python3.7/site-packages/numpy/tests/test_core.py',
+    'lib/python3.7/site-packages/numpy/core/tests/test_multiarray.py',
+    'lib/python3.7/site-packages/numpy/testing/utils.py',
+    'lib/python3.7/config-3.7m-darwin/pyconfig.h',
+    'share/man/man1/python.1',
+    'share/locale/de/LC_MESSAGES/gettext.mo',
+    'share/terminfo/x/xterm',
+)
+
+
+@pytest.fixture
+def env_path(tmp_path):
+    for relative_path in _ENV_FILES:
+        file_path = tmp_path / relative_path
+        if not file_path.parent.is_dir():
+            file_path.parent.mkdir(parents=True)
+        file_path.write_bytes(b'x' * 10)
+    return tmp_path
+
+
+def _list_files(root_path):
+    return sorted(
+        os.path.relpath(os.path.join(current_root_path, filename), str(root_path))
+        for current_root_path, _, filenames in os.walk(str(root_path)) for filename in filenames
+    )
+
+
+def test_default_rules(env_path):
+    statistics = prune.prune(str(env_path))
+    assert _list_files(env_path) == [
+        'bin/python',
+        'lib/libpython3.7m.dylib',
+        'lib/python3.7/os.py',
+        'lib/python3.7/site-packages/numpy/core.py',
+        'lib/python3.7/site-packages/numpy/testing/utils.py',
+        'share/terminfo/x/xterm',
+    ]
+    assert not os.path.exists(str(env_path / 'share' / 'man'))
+    assert statistics['package_cache'] == prune.PruneStatistics(1, 10)
+    assert statistics['tests'] == prune.PruneStatistics(3, 30)
+    assert statistics['headers'] == prune.PruneStatistics(2, 20)
+    assert statistics['static_libraries'] == prune.PruneStatistics(1, 10)
+    assert statistics['documentation'] == prune.PruneStatistics(0, 0)
+
+
+def test_selected_rules(env_path):
+    rules = [rule for rule in prune.DEFAULT_RULES if rule.name not in prune.DEVELOPMENT_RULE_NAMES]
+    statistics = prune.prune(str(env_path), rules)
+    remaining_file_paths = _list_files(env_path)
+    assert 'include/Python.h' in remaining_file_paths
+    assert 'lib/libpython3.7m.a' in remaining_file_paths
+    assert 'lib/python3.7/test/test_os.py' not in remaining_file_paths
+    assert set(statistics) == set(rule.name for rule in rules)
+
+
+def test_keep_patterns(env_path):
+    statistics = prune.prune(
+        str(env_path), keep_patterns=('lib/python*/site-packages/numpy/tests/*', 'share/locale/de*')
+    )
+    remaining_file_paths = _list_files(env_path)
+    assert 'lib/python3.7/site-packages/numpy/tests/test_core.py' in remaining_file_paths
+    assert 'share/locale/de/LC_MESSAGES/gettext.mo' in remaining_file_paths
+    assert 'lib/python3.7/site-packages/numpy/core/tests/test_multiarray.py' not in remaining_file_paths
+    assert statistics['tests'] == prune.PruneStatistics(2, 20)
+    # Directories that matched a rule but were checked one by one are removed when they are empty
+    assert not os.path.exists(str(env_path / 'lib' / 'python3.7' / 'test'))
+
+
+def test_user_rule(env_path):
+    rules = prune.DEFAULT_RULES + (prune.PruneRule(prune.USER_RULE_NAME, ('share/terminfo', )), )
+    statistics = prune.prune(str(env_path), rules)
+    assert not os.path.exists(str(env_path / 'share' / 'terminfo'))
+    assert statistics[prune.USER_RULE_NAME] == prune.PruneStatistics(1, 10)
+
+
+def test_symbolic_links_are_not_followed(env_path, tmp_path_factory):
+    outside_path = tmp_path_factory.mktemp('outside')
+    (outside_path / 'file').write_bytes(b'x')
+    os.symlink(str(outside_path), str(env_path / 'doc'))
+    statistics = prune.prune(str(env_path))
+    assert not os.path.lexists(str(env_path / 'doc'))
+    assert (outside_path / 'file').read_bytes() == b'x'
+    assert statistics['documentation'].file_count == 1
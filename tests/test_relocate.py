@@ -0,0 +1,144 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import pytest
+from shallow_appify.plugins.util import binary_replace, relocate
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+_BUILD_PREFIX = b'/Applications/Test.app'
+_LONGER_PREFIX = b'/Users/someone/Desktop/Test.app'
+_SHORTER_PREFIX = b'/T.app'
+_PADDING = b'\x00' * 64
+
+
+def _text_data(prefix):
+    return b'#!' + prefix + b'/bin/python\nPATH=' + prefix + b'/bin:' + prefix + b'/lib\n'
+
+
+def _binary_data(prefix):
+    # Two strings, the first with two occurrences of the prefix
+    return b'\xcf\xfa\xed\xfe\x00' + prefix + b'/bin:' + prefix + b'/lib\x00' + _PADDING + prefix + b'/share\x00' + \
+        _PADDING + b'end'
+
+
+def _padded_binary_data(prefix):
+    # The expected result of relocating `_binary_data(_BUILD_PREFIX)` to a prefix that is not longer: strings keep
+    # their position and are padded with NUL bytes
+    def string(text, length):
+        return text + b'\x00' * (length - len(text))
+
+    first_length = len(_BUILD_PREFIX + b'/bin:' + _BUILD_PREFIX + b'/lib\x00') + len(_PADDING)
+    second_length = len(_BUILD_PREFIX + b'/share\x00') + len(_PADDING)
+    return b'\xcf\xfa\xed\xfe\x00' + string(prefix + b'/bin:' + prefix + b'/lib', first_length) + \
+        string(prefix + b'/share', second_length) + b'end'
+
+
+def _binary_replace_data(tmp_path, data, prefixes):
+    # Relocation must give the same result as `binary_replace` applied to the whole file for every prefix change
+    file_path = tmp_path / 'reference'
+    file_path.write_bytes(data)
+    for old_prefix, new_prefix in zip(prefixes[:-1], prefixes[1:]):
+        binary_replace.binary_replace(str(file_path), old_prefix, new_prefix)
+    return file_path.read_bytes()
+
+
+@pytest.fixture
+def index_dir_path(tmp_path):
+    (tmp_path / 'conda_env').mkdir()
+    (tmp_path / 'conda_env' / 'script').write_bytes(_text_data(_BUILD_PREFIX))
+    (tmp_path / 'conda_env' / 'libtest.dylib').write_bytes(_binary_data(_BUILD_PREFIX))
+    (tmp_path / 'conda_env' / 'unrelated').write_bytes(b'no prefix')
+    relocate.write_relocation_index(
+        str(tmp_path), _BUILD_PREFIX, [str(tmp_path / 'conda_env' / 'script')],
+        [str(tmp_path / 'conda_env' / 'libtest.dylib'), str(tmp_path / 'conda_env' / 'unrelated')]
+    )
+    return tmp_path
+
+
+def _assert_offsets(index_dir_path, index, prefix):
+    for entry in index['files']:
+        data = (index_dir_path / entry['path']).read_bytes()
+        assert entry['offsets']
+        for offset in entry['offsets']:
+            assert data[offset:offset + len(prefix)] == prefix
+
+
+def test_index_round_trip(index_dir_path):
+    index = relocate.read_relocation_index(str(index_dir_path))
+    assert index['prefix'] == _BUILD_PREFIX.decode('utf-8')
+    assert [(entry['path'], entry['binary']) for entry in index['files']] == \
+        [('conda_env/libtest.dylib', True), ('conda_env/script', False)]
+    assert [len(entry['offsets']) for entry in index['files']] == [3, 3]
+    _assert_offsets(index_dir_path, index, _BUILD_PREFIX)
+
+
+def test_missing_index(tmp_path):
+    with pytest.raises(relocate.RelocationIndexError):
+        relocate.read_relocation_index(str(tmp_path))
+
+
+@pytest.mark.parametrize('new_prefix', (_SHORTER_PREFIX, _BUILD_PREFIX))
+def test_relocate_to_shorter_prefix(index_dir_path, new_prefix):
+    index = relocate.relocate(str(index_dir_path), new_prefix)
+    assert (index_dir_path / 'conda_env' / 'script').read_bytes() == _text_data(new_prefix)
+    assert (index_dir_path / 'conda_env' / 'libtest.dylib').read_bytes() == _padded_binary_data(new_prefix)
+    assert (index_dir_path / relocate.APPLICATION_PATH_PREFIX_FILENAME).read_bytes() == new_prefix
+    assert relocate.read_relocation_index(str(index_dir_path)) == index
+    _assert_offsets(index_dir_path, index, new_prefix)
+
+
+@pytest.mark.parametrize('new_prefix', (_LONGER_PREFIX, _SHORTER_PREFIX, _BUILD_PREFIX))
+def test_relocate(index_dir_path, tmp_path, new_prefix):
+    index = relocate.relocate(str(index_dir_path), new_prefix)
+    assert (index_dir_path / 'conda_env' / 'script').read_bytes() == _text_data(new_prefix)
+    assert (index_dir_path / 'conda_env' / 'libtest.dylib').read_bytes() == \
+        _binary_replace_data(tmp_path, _binary_data(_BUILD_PREFIX), (_BUILD_PREFIX, new_prefix))
+    assert (index_dir_path / relocate.APPLICATION_PATH_PREFIX_FILENAME).read_bytes() == new_prefix
+    assert relocate.read_relocation_index(str(index_dir_path)) == index
+    _assert_offsets(index_dir_path, index, new_prefix)
+
+
+@pytest.mark.parametrize(
+    'new_prefixes', (
+        (_LONGER_PREFIX, _SHORTER_PREFIX),
+        (_SHORTER_PREFIX, _LONGER_PREFIX),
+        (_LONGER_PREFIX, _BUILD_PREFIX),
+    )
+)
+def test_relocate_again(index_dir_path, tmp_path, new_prefixes):
+    # A moved application is relocated again from the updated index
+    for new_prefix in new_prefixes:
+        index = relocate.relocate(str(index_dir_path), new_prefix)
+    assert (index_dir_path / 'conda_env' / 'script').read_bytes() == _text_data(new_prefixes[-1])
+    assert (index_dir_path / 'conda_env' / 'libtest.dylib').read_bytes() == \
+        _binary_replace_data(tmp_path, _binary_data(_BUILD_PREFIX), (_BUILD_PREFIX, ) + new_prefixes)
+    _assert_offsets(index_dir_path, index, new_prefixes[-1])
+
+
+def test_relocate_without_fill_bytes(tmp_path, capsys):
+    # Strings without enough fill bytes for a longer prefix are left unchanged and reported
+    (tmp_path / 'libtest.dylib').write_bytes(b'\x00' + _BUILD_PREFIX + b'/lib\x00end')
+    relocate.write_relocation_index(str(tmp_path), _BUILD_PREFIX, [], [str(tmp_path / 'libtest.dylib')])
+    index = relocate.relocate(str(tmp_path), _LONGER_PREFIX)
+    assert (tmp_path / 'libtest.dylib').read_bytes() == b'\x00' + _BUILD_PREFIX + b'/lib\x00end'
+    assert index['files'] == []
+    assert 'could not be relocated' in capsys.readouterr().err
+
+
+def test_non_ascii_prefixes(tmp_path):
+    build_prefix = '/Applications/Tëst.app'
+    new_prefix = '/Users/sömeone/Tëst.app'
+    (tmp_path / 'script').write_bytes(_text_data(build_prefix.encode('utf-8')))
+    index = relocate.write_relocation_index(str(tmp_path), build_prefix, [str(tmp_path / 'script')], [])
+    assert index['prefix'] == build_prefix
+    assert relocate.read_relocation_index(str(tmp_path)) == index
+    relocate.relocate(str(tmp_path), new_prefix)
+    assert (tmp_path / 'script').read_bytes() == _text_data(new_prefix.encode('utf-8'))
+    assert relocate.read_relocation_index(str(tmp_path))['prefix'] == new_prefix
+    assert (tmp_path / relocate.APPLICATION_PATH_PREFIX_FILENAME).read_bytes() == new_prefix.encode('utf-8')
@@ -0,0 +1,118 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import threading
+import time
+import pytest
+from shallow_appify import scheduler
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+class _TaskError(Exception):
+    pass
+
+
+def _create_graph(calls):
+    # source -> compiled -> startup, icon is independent; every task takes some time, so the chain is the critical
+    # path
+    lock = threading.Lock()
+
+    def task(name, result=None):
+        def run():
+            time.sleep(0.01)
+            with lock:
+                calls.append(name)
+            return result
+
+        return run
+
+    task_graph = scheduler.TaskGraph()
+    task_graph.add(
+        'write_startup', task('write_startup', 'run.sh'), inputs=('compiled', 'source'), outputs=('startup', )
+    )
+    task_graph.add('compile', task('compile'), inputs=('source', ), outputs=('compiled', ))
+    task_graph.add('copy_source', task('copy_source', 'source_path'), inputs=('executable', ), outputs=('source', ))
+    task_graph.add('create_icon', task('create_icon'), outputs=('icon', ))
+    return task_graph
+
+
+def test_topological_order():
+    task_graph = _create_graph([])
+    order = task_graph.get_topological_order()
+    assert order.index('copy_source') < order.index('compile') < order.index('write_startup')
+    assert task_graph.get_dependencies('write_startup') == ['compile', 'copy_source']
+    # Inputs without a producing task are expected to exist beforehand
+    assert task_graph.get_dependencies('copy_source') == []
+
+
+@pytest.mark.parametrize('num_workers', (1, 4))
+def test_run(num_workers):
+    calls = []
+    task_graph = _create_graph(calls)
+    task_graph.run(num_workers)
+    assert sorted(calls) == sorted(task_graph.tasks)
+    assert calls.index('copy_source') < calls.index('compile') < calls.index('write_startup')
+    assert task_graph.get_result('startup') == 'run.sh'
+    assert task_graph.get_result('source') == 'source_path'
+    assert all(record.status == scheduler.TASK_DONE for record in task_graph.records.values())
+    critical_path = [record.name for record in task_graph.get_critical_path()]
+    assert critical_path == ['copy_source', 'compile', 'write_startup']
+
+
+def test_duplicate_task_and_output():
+    task_graph = scheduler.TaskGraph()
+    task_graph.add('a', lambda: None, outputs=('x', ))
+    with pytest.raises(scheduler.TaskGraphError):
+        task_graph.add('a', lambda: None)
+    with pytest.raises(scheduler.TaskGraphError):
+        task_graph.add('b', lambda: None, outputs=('x', ))
+
+
+def test_cycle():
+    task_graph = scheduler.TaskGraph()
+    task_graph.add('a', lambda: None, inputs=('z', ), outputs=('x', ))
+    task_graph.add('b', lambda: None, inputs=('x', ), outputs=('y', ))
+    task_graph.add('c', lambda: None, inputs=('y', ), outputs=('z', ))
+    with pytest.raises(scheduler.TaskGraphError) as excinfo:
+        task_graph.get_topological_order()
+    assert 'cycle' in str(excinfo.value)
+    with pytest.raises(scheduler.TaskGraphError):
+        task_graph.run(2)
+
+
+@pytest.mark.parametrize('num_workers', (1, 4))
+def test_failure_cancels_dependents(num_workers):
+    calls = []
+    task_graph = _create_graph(calls)
+
+    def fail():
+        raise _TaskError('compile failed')
+
+    task_graph.tasks['compile'] = task_graph.tasks['compile']._replace(function=fail)
+    with pytest.raises(_TaskError):
+        task_graph.run(num_workers)
+    assert task_graph.records['copy_source'].status == scheduler.TASK_DONE
+    assert task_graph.records['compile'].status == scheduler.TASK_FAILED
+    assert task_graph.records['write_startup'].status == scheduler.TASK_CANCELLED
+    assert 'write_startup' not in calls
+
+
+def test_failure_stops_scheduling():
+    # With a single worker, the independent icon task has not started when compile fails and is not run anymore
+    calls = []
+    task_graph = _create_graph(calls)
+
+    def fail():
+        raise _TaskError('compile failed')
+
+    task_graph.tasks['compile'] = task_graph.tasks['compile']._replace(function=fail)
+    with pytest.raises(_TaskError):
+        task_graph.run(1)
+    assert task_graph.records['create_icon'].status == scheduler.TASK_CANCELLED
+    assert calls == ['copy_source']
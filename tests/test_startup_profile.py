@@ -0,0 +1,145 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import codecs
+import json
+import os
+import subprocess
+import sys
+import time
+import pytest
+from jinja2 import Template
+from shallow_appify.plugins import python
+from shallow_appify.plugins.util import startup_report
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def app_path(tmp_path):
+    # A startup script with profiling and a main module which imports a package
+    (tmp_path / 'app').mkdir()
+    (tmp_path / 'app' / 'pkg').mkdir()
+    (tmp_path / 'app' / 'pkg' / '__init__.py').write_bytes(b'import json\n')
+    (tmp_path / 'app' / 'main_module.py').write_bytes(b'import pkg\n\n\ndef main():\n    pass\n')
+    startup_script = Template(python.PY_STARTUP_SCRIPT).render(
+        main_module='main_module',
+        shebang='#!/usr/bin/env python',
+        cf_keys=None,
+        profile_log_dir=repr(str(tmp_path / 'logs')),
+        module_archives=[]
+    )
+    with codecs.open(str(tmp_path / 'app' / '__startup__.py'), 'w', 'utf-8') as f:
+        f.write(startup_script)
+    return tmp_path / 'app'
+
+
+def _launch(app_path, launch_time=None):
+    env = dict(os.environ)
+    env.pop('SHALLOW_APPIFY_LAUNCH_TIME', None)
+    if launch_time is not None:
+        env['SHALLOW_APPIFY_LAUNCH_TIME'] = launch_time
+    subprocess.check_call([sys.executable, str(app_path / '__startup__.py')], env=env)
+
+
+def _read_log(log_path):
+    with open(str(log_path)) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize(
+    'template, render_args', (
+        (python.PY_PRE_STARTUP_CONDA_SETUP, {}),
+        (python.PY_PRE_STARTUP_CONDA_FAST_SETUP, {'exports': []}),
+    )
+)
+def test_launcher_records_launch_time_without_epochrealtime(template, render_args):
+    # bash 3.2 (the default shell of macOS) has no EPOCHREALTIME
+    launcher_script = Template(template).render(profile_startup=True, **render_args)
+    profile_block = launcher_script.split('export SHALLOW_APPIFY_LAUNCH_TIME\n')[0]
+    launch_time = subprocess.check_output(
+        [
+            'bash', '-c', 'unset EPOCHREALTIME\n{block}export SHALLOW_APPIFY_LAUNCH_TIME\n'
+            'echo "${{SHALLOW_APPIFY_LAUNCH_TIME}}"'.format(block=profile_block)
+        ]
+    )
+    assert abs(float(launch_time) - time.time()) < 10
+
+
+def test_startup_profile(tmp_path, app_path):
+    launch_time = time.time()
+    _launch(app_path, '{:.6f}'.format(launch_time))
+    _launch(app_path)
+    first_profile, second_profile = _read_log(tmp_path / 'logs' / startup_report.PROFILE_LOG_FILENAME)
+    assert first_profile['interpreter_startup'] > 0
+    assert first_profile['time_to_main'] == pytest.approx(
+        first_profile['interpreter_startup'] + first_profile['setup'] + first_profile['import_main_module']
+    )
+    # Without a launch time, time to main starts with the startup script
+    assert second_profile['interpreter_startup'] is None
+    assert second_profile['time_to_main'] == pytest.approx(
+        second_profile['setup'] + second_profile['import_main_module']
+    )
+    imports = dict(
+        (name, (depth, self_time, cumulative_time))
+        for name, depth, self_time, cumulative_time in first_profile['imports']
+    )
+    assert imports['main_module'][0] == 0
+    assert imports['pkg'][0] == 1
+    assert imports['main_module'][2] >= imports['main_module'][1]
+    assert imports['main_module'][2] >= imports['pkg'][2]
+
+
+def test_startup_profile_log_rotation(tmp_path, app_path):
+    log_path = tmp_path / 'logs' / startup_report.PROFILE_LOG_FILENAME
+    (tmp_path / 'logs').mkdir()
+    log_path.write_bytes(b'{}\n' * (1024 * 1024 // 3 + 1))
+    for i, backup_name in enumerate(('newest', 'middle', 'oldest')):
+        (tmp_path / 'logs' / '{}.{}'.format(startup_report.PROFILE_LOG_FILENAME, i + 1)).write_text(
+            json.dumps({backup_name: True}) + '\n'
+        )
+    _launch(app_path)
+    assert len(_read_log(log_path)) == 1
+    assert os.path.getsize(str(log_path) + '.1') > 1024 * 1024
+    # The oldest backup is dropped, so at most three backups are kept
+    assert _read_log(str(log_path) + '.2') == [{'newest': True}]
+    assert _read_log(str(log_path) + '.3') == [{'middle': True}]
+    assert not os.path.exists(str(log_path) + '.4')
+
+
+def test_summarize_phases():
+    profiles = [
+        {'interpreter_startup': 0.1, 'setup': 0.01, 'import_main_module': 0.3, 'time_to_main': 0.41},
+        {'interpreter_startup': None, 'setup': 0.03, 'import_main_module': 0.5, 'time_to_main': 0.53},
+        {'interpreter_startup': 0.3, 'setup': 0.02, 'import_main_module': 0.4, 'time_to_main': 0.72},
+    ]
+    summary = startup_report.summarize_phases(profiles)
+    assert list(summary) == list(startup_report.PHASES)
+    assert summary['interpreter_startup'] == pytest.approx((0.2, 0.3))
+    assert summary['setup'] == pytest.approx((0.02, 0.03))
+    assert summary['time_to_main'] == pytest.approx((0.53, 0.72))
+    assert startup_report.summarize_phases([{}])['setup'] == (None, None)
+
+
+def test_summarize_imports():
+    profiles = [
+        {'imports': [['pkg', 1, 0.1, 0.2], ['main_module', 0, 0.05, 0.25]]},
+        {'imports': [['main_module', 0, 0.15, 0.35]]},
+    ]
+    statistics = dict((entry.name, entry) for entry in startup_report.summarize_imports(profiles))
+    assert statistics['pkg'] == startup_report.ImportStatistics('pkg', 1, 0.1, 0.2, 0.2)
+    assert statistics['main_module'].count == 2
+    assert statistics['main_module'].mean_self_time == pytest.approx(0.1)
+    assert statistics['main_module'].mean_cumulative_time == pytest.approx(0.3)
+    assert statistics['main_module'].max_cumulative_time == 0.35
+
+
+def test_read_profiles_with_rotated_logs(tmp_path):
+    (tmp_path / startup_report.PROFILE_LOG_FILENAME).write_bytes(b'{"setup": 1}\n{"setup": 2')
+    (tmp_path / (startup_report.PROFILE_LOG_FILENAME + '.1')).write_bytes(b'{"setup": 0}\n')
+    assert startup_report.read_profiles([str(tmp_path)]) == [{'setup': 1}, {'setup': 0}]
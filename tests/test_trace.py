@@ -0,0 +1,60 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import json
+import threading
+import time
+import pytest
+from shallow_appify import trace
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def tracer():
+    trace.enable()
+    yield trace.get_tracer()
+    trace._local.tracer = None
+
+
+def _busy_loop(stop_event):
+    while not stop_event.is_set():
+        sum(range(1000))
+
+
+def test_stage_records_thread_cpu_time(tracer):
+    # Another busy thread must not be accounted to the traced stage
+    stop_event = threading.Event()
+    busy_thread = threading.Thread(target=_busy_loop, args=(stop_event, ))
+    busy_thread.start()
+    try:
+        with trace.stage('sleep'):
+            time.sleep(0.3)
+    finally:
+        stop_event.set()
+        busy_thread.join()
+    event_args = tracer.events[0]['args']
+    assert event_args['wall_time'] >= 0.3
+    if hasattr(time, 'thread_time'):
+        assert event_args['cpu_time_scope'] == 'thread'
+        assert event_args['cpu_time'] < 0.15
+    assert 'peak_rss_process' in event_args
+    assert 'peak_children_rss_process' in event_args
+    assert not event_args['failed']
+
+
+def test_write(tmp_path, tracer):
+    with trace.stage('copy', output_path=str(tmp_path / 'output')):
+        (tmp_path / 'output').write_bytes(b'data')
+    trace_path = str(tmp_path / 'trace.json')
+    trace.write(trace_path)
+    assert not trace.is_enabled()
+    with open(trace_path) as f:
+        events = json.load(f)['traceEvents']
+    assert [event['name'] for event in events] == ['process_name', 'copy']
+    assert (events[1]['args']['bytes_written'], events[1]['args']['files_written']) == (4, 1)
@@ -0,0 +1,81 @@
+# coding: utf-8
+
+from __future__ import print_function
+from __future__ import unicode_literals
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import sys
+import pytest
+from shallow_appify import plugins
+from shallow_appify import shallow_appify
+from shallow_appify.plugins import python
+from shallow_appify.plugins.util import precompile
+
+__author__ = 'Ingo Heimbach'
+__email__ = 'i.heimbach@fz-juelich.de'
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'app.py').write_bytes(b'import module\n\n\ndef main():\n    pass\n')
+    (tmp_path / 'src' / 'module.py').write_bytes(b'value = 1\n')
+    (tmp_path / 'src' / 'module.c').write_bytes(b'int value = 1;\n')
+    (tmp_path / 'src' / 'Makefile').write_bytes(b'all:\n')
+    (tmp_path / 'requirements.txt').write_bytes(b'python\n')
+    return tmp_path / 'src'
+
+
+def test_update_passes_changed_paths_to_plugin(monkeypatch, tmp_path, source_path):
+    update_calls = []
+
+    def update_app(file_ext, app_path, macos_path, resources_path, changed_paths, **kwargs):
+        update_calls.append(changed_paths)
+
+    monkeypatch.setattr(plugins, 'update_app', update_app)
+    config = {
+        'executable': str(source_path / 'app.py'),
+        'executable-directory': str(source_path),
+        'output': str(tmp_path / 'App.app'),
+        'update': True
+    }
+    shallow_appify.build_app(config)
+    (source_path / 'module.py').write_bytes(b'value = 2\n')
+    assert shallow_appify.build_app(config) is None
+    assert update_calls == [['module.py']]
+    assert (tmp_path / 'App.app' / 'Contents' / 'MacOS' / 'module.py').read_bytes() == b'value = 2\n'
+
+
+def test_extension_makefile_disables_incremental_updates(tmp_path, source_path):
+    args = shallow_appify.parse_args(
+        [
+            '--conda',
+            str(tmp_path / 'requirements.txt'), '--extension-makefile',
+            str(source_path / 'Makefile'),
+            str(source_path / 'app.py')
+        ], shallow_appify.ConfigArgumentParser
+    )
+    assert args.incremental_update_unsupported
+
+
+def test_changed_files_are_precompiled(tmp_path, source_path):
+    # The bundled conda environment is replaced with the running interpreter
+    macos_path = tmp_path / 'App.app' / 'Contents' / 'MacOS'
+    resources_path = tmp_path / 'App.app' / 'Contents' / 'Resources'
+    (resources_path / 'conda_env' / 'bin').mkdir(parents=True)
+    os.symlink(sys.executable, str(resources_path / 'conda_env' / 'bin' / 'python'))
+    macos_path.mkdir()
+    (macos_path / 'module.py').write_bytes(b'value = 2\n')
+    (macos_path / 'app.py').write_bytes(b'import module\n')
+    python.update_app(
+        str(tmp_path / 'App.app'),
+        str(macos_path),
+        str(resources_path), ['module.py', 'module.c'],
+        python_conda=str(tmp_path / 'requirements.txt')
+    )
+    module_path = str(macos_path / 'module.py')
+    assert precompile.is_pyc_current(module_path, precompile.cache_from_source(module_path))
+    # Unchanged files are not compiled
+    assert not os.path.exists(precompile.cache_from_source(str(macos_path / 'app.py')))